@@ -1,15 +1,28 @@
 from fastapi import APIRouter, status, Security
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Path, Query, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from app.db import crud, schemas, database
+from app.db import crud, schemas, database, models
 from sqlalchemy.orm import Session
-from app.services import auth, email_helper
-from app.celery.tasks import create_course_for_topic
-from fastapi.responses import JSONResponse
+from app.services import (
+    auth,
+    collaborative_filtering,
+    course_blob,
+    course_store,
+    dashboard_rollups,
+    email_templates,
+    markdown_render,
+    otp_store,
+    pool_stats,
+    quiz_cache,
+    recommendation_cache,
+)
+from app.services.semantic_index import semantic_index
+from app.celery import producer
+from fastapi.responses import JSONResponse, Response
 from typing import Annotated, List
 import random
-from datetime import datetime, timedelta
-from app.db.mongo_db import mongodb_client
+from datetime import datetime, timedelta, timezone
+from app.db.mongo_db import get_mongo_db
 from app.services.password_helper import get_password_hash , verify_password
 
 
@@ -136,16 +149,17 @@ async def send_registration_code(
     expiry_time = datetime.now() + timedelta(minutes=10)
 
     try:
-        email_helper.send_registration_email(email, code, "New User Registration")
-
-        crud.insert_log_in_code(
+        crud.issue_verification_code(
             db=db,
+            purpose=otp_store.REGISTRATION,
+            email=email,
             code=code,
-            user_id=None,  
             expiry_time=expiry_time,
-            email=email,  
         )
 
+        # ✅ Delivery happens on the email worker; respond as soon as the code is stored
+        producer.send_email(email, *email_templates.registration_message(code, "New User Registration"))
+
         return {"message": "Verification code sent to your email address."}
     
     except Exception as e:
@@ -161,17 +175,15 @@ async def verify_registration_code(
     email = request.email
     code = request.code
 
-    reset_entry = crud.get_pending_code_by_email(db=db, email=email)
-    if not reset_entry:
+    result = crud.verify_verification_code(
+        db=db, purpose=otp_store.REGISTRATION, email=email, code=code
+    )
+    if result == otp_store.EXPIRED:
         raise HTTPException(status_code=404, detail="No pending registration code found for this email.")
-    
-    if reset_entry.code != code:
+    if result == otp_store.LOCKED:
+        raise HTTPException(status_code=429, detail="Too many attempts. Please request a new code.")
+    if result == otp_store.INVALID:
         raise HTTPException(status_code=400, detail="Invalid code.")
-    
-    if reset_entry.expiry_time < datetime.now():
-        raise HTTPException(status_code=400, detail="Code expired.")
-    
-    crud.accept_reset_code(db=db, reset_entry=reset_entry)
 
 
     return {"message": "Code verified successfully. Proceed with your registration."}
@@ -210,7 +222,7 @@ async def create_topic(
             detail="You do not have admin permissions",
         )
     topic = crud.create_topic(db=db, topic=topic, user_id= current_user.id)
-    create_course_for_topic.delay(topic.id, topic.title, topic.description) ## add background process for courses
+    producer.create_courses_for_topic(topic.id, topic.title, topic.description) ## add background process for courses
     return topic
 
 
@@ -337,17 +349,18 @@ async def send_forgot_password_code(
     user = crud.get_user_by_email(db = db, email=email)
     if not user:
         raise HTTPException(status_code=404, detail="No active user found with this email.")
-    crud.delete_old_pending_code(db=db, user_id=user.id)
     expiry_time =  datetime.now() + timedelta(minutes=10)
     user_name = f'{user.first_name} {user.last_name}'
     try:
-        email_helper.send_email(email, code , user_name)
-        crud.insert_log_in_code_forgot_password(
+        crud.issue_verification_code(
             db=db,
+            purpose=otp_store.PASSWORD_RESET,
+            email=email,
             code=code,
-            user_id=user.id,
             expiry_time=expiry_time,
+            user_id=user.id,
         )
+        producer.send_email(email, *email_templates.reset_message(code, user_name))
         return {"message": "Reset code sent to your email address."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to send reset code: {str(e)}")
@@ -363,12 +376,13 @@ async def verify_reset_code(
     user = crud.get_user_by_email(db=db, email=email)
     if not user:
         raise HTTPException(status_code=404, detail="No active user found with this email.")
-    reset_entry = crud.get_pending_code_by_user(db=db, user_id=user.id)
-    if not reset_entry or reset_entry.code != code:
+    result = crud.verify_verification_code(
+        db=db, purpose=otp_store.PASSWORD_RESET, email=email, code=code, user_id=user.id
+    )
+    if result == otp_store.LOCKED:
+        raise HTTPException(status_code=429, detail="Too many attempts. Please request a new code.")
+    if result != otp_store.VERIFIED:
         raise HTTPException(status_code=400, detail="Invalid code.")
-    if reset_entry.expiry_time < datetime.now():
-        raise HTTPException(status_code=400, detail="Code expired.")
-    crud.accept_reset_code(db=db, reset_entry=reset_entry)  # mark as accepted
     return {"message": "Reset code verified successfully."}
 
 
@@ -387,29 +401,95 @@ async def reset_password(request: schemas.ResetPasswordRequest, db: Session = De
     return {"message": "Password reset successfully."}
 
 
+def _user_course_fields(db: Session, user_id: int, course_id: int, total_sections: int):
+    quiz_status = {str(i): False for i in range(total_sections)}   # "0": False, "1": False …
+    passed_rows = crud.get_passed_quiz_section(db=db, user_id=user_id, course_id=course_id)
+    for row in passed_rows:
+        quiz_status[str(row.section_index)] = True                 # flip to True
+    course_interaction_detail = crud.get_course_interaction(db, course_id, user_id)
+    return quiz_status, course_interaction_detail.get('course_progress', 0)
+
+
+def _text_field(format: schemas.ContentFormat) -> str:
+    if format == schemas.ContentFormat.html:
+        return course_store.HTML
+    return course_store.CONTENT
+
+
+@router.get("/content/highlight.css", include_in_schema=False)
+def get_highlight_stylesheet():
+    """
+    CSS for the syntax-highlighted code blocks in ``format=html`` content.
+    """
+    return Response(
+        content=markdown_render.stylesheet(),
+        media_type="text/css",
+        headers={"Cache-Control": "public, max-age=86400"},
+    )
+
+
 @router.get("/courses/{course_id}")
 def get_full_course(
     course_id: int, 
+    request: Request,
+    format: schemas.ContentFormat = schemas.ContentFormat.markdown,
     current_user: schemas.UserOut = Depends(auth.get_current_active_user), 
     db: Session = Depends(database.get_db)            
     ):
     """
-    Fetch the full course content from MongoDB by course_id.
+    Fetch the full course content by course_id.
+
+    Built courses are served from the pre-compressed blob; only the per-user
+    fields are encoded per request. ``format=html`` returns each subsection's
+    sanitized HTML, rendered when the course was built, instead of markdown.
     """
-    course_doc = mongodb_client.courses.find_one({"course_id": course_id})
     user_id=current_user.id
-    course_interaction_detail = crud.get_course_interaction(db, course_id, user_id)
-    if not course_doc:
+    blob = None
+    if format == schemas.ContentFormat.markdown:
+        blob = course_blob.load_course_blob(get_mongo_db(), course_id)
+    if blob:
+        quiz_status, course_progress = _user_course_fields(db, user_id, course_id, blob["section_count"])
+        suffix = course_blob.user_fields_suffix(quiz_status, course_progress)
+        if course_blob.accepts_gzip(request.headers.get("accept-encoding", "")):
+            return Response(
+                content=course_blob.gzip_body(blob, suffix),
+                media_type="application/json",
+                headers={"Content-Encoding": course_blob.CONTENT_ENCODING, "Vary": "Accept-Encoding"},
+            )
+        return Response(content=course_blob.plain_body(blob, suffix), media_type="application/json")
+
+    course_details = course_store.load_course(get_mongo_db(), course_id, _text_field(format))
+    if not course_details:
         raise HTTPException(status_code=404, detail="Course not found")
-    total_sections = len(course_doc['course_details']["sections"])
-    quiz_status = {str(i): False for i in range(total_sections)}   # "0": False, "1": False …
+    total_sections = len(course_details["sections"])
+    quiz_status, course_progress = _user_course_fields(db, user_id, course_id, total_sections)
+    course_details["quiz_status"] = quiz_status
+    course_details['course_progress'] = course_progress
+    return course_details
+
+
+@router.get("/courses/{course_id}/sections/{section_index}")
+def get_course_section(
+    course_id: int,
+    section_index: int = Path(..., ge=0),
+    format: schemas.ContentFormat = schemas.ContentFormat.markdown,
+    current_user: schemas.UserOut = Depends(auth.get_current_active_user),
+    db: Session = Depends(database.get_db),
+):
+    """
+    One section's content, for clients that load a course section by section.
+    """
+    section = course_store.load_section(get_mongo_db(), course_id, section_index, _text_field(format))
+    if not section:
+        raise HTTPException(status_code=404, detail="Section not found")
     passed_rows = crud.get_passed_quiz_section(db=db, user_id=current_user.id, course_id=course_id)
-    for row in passed_rows:
-        quiz_status[str(row.section_index)] = True                 # flip to True
-    course_doc['course_details']["quiz_status"] = quiz_status
-    course_doc["_id"] = str(course_doc["_id"])
-    course_doc['course_details']['course_progress'] = course_interaction_detail.get('course_progress', 0)
-    return course_doc['course_details']
+    passed = {row.section_index for row in passed_rows}
+    return {
+        "course_id": course_id,
+        "section_index": section_index,
+        **section,
+        "quiz_passed": section_index in passed,
+    }
 
 
 @router.get("/courses", response_model=List[schemas.CourseOut])
@@ -420,6 +500,42 @@ def get_ai_generated_courses(
     return  crud.get_all_courses(db=db)
 
 
+@router.get("/courses/{course_id}/similar", response_model=List[schemas.CourseOut])
+def get_similar_courses(
+    course_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(database.get_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_active_user),
+):
+    """
+    Courses whose content is closest to ``course_id``, from the in-process semantic index.
+    """
+    neighbours = semantic_index.similar(course_id, k=limit)
+    return crud.get_built_courses_by_ids(db, [similar_id for similar_id, _ in neighbours])
+
+
+@router.get("/search", response_model=schemas.SearchResponse)
+def search_courses(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(database.get_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_active_user),
+):
+    """
+    Ranked full-text search over course titles, descriptions, topics and generated content.
+    """
+    rows, has_more = crud.search_courses(db, q, limit=limit, offset=offset)
+    return {
+        "query": q,
+        "results": [
+            {**schemas.CourseOut.model_validate(course).model_dump(), "rank": rank}
+            for course, rank in rows
+        ],
+        "has_more": has_more,
+    }
+
+
 @router.get("/topics/{topic_id}/courses")
 def get_courses_by_topic(
     topic_id: int,
@@ -475,67 +591,55 @@ def get_enrolled_courses(
 
 
 
+def _compute_recommendations(db: Session, user_id: int, size: int) -> list:
+    # ✅ Precomputed collaborative-filtering list: a single Redis lookup
+    cf_course_ids = collaborative_filtering.lookup(user_id)
+    if cf_course_ids:
+        # The list is only rebuilt periodically: drop courses enrolled in since
+        enrolled = set(crud.get_user_course_ids(db, user_id))
+        cf_course_ids = [course_id for course_id in cf_course_ids if course_id not in enrolled]
+    if cf_course_ids:
+        return crud.get_built_courses_by_ids(db, cf_course_ids[:size])
+
+    # ✅ Interests, enrollments, exclusions and the interest/related split
+    #    resolved in a single SQL statement
+    courses = crud.get_recommended_courses(db, user_id=user_id, limit=size)
+    if len(courses) >= size:
+        return courses
+
+    # ✅ Small catalogs run out of interest/related candidates: top up with the
+    #    courses closest in content to the user's enrollments
+    enrolled = crud.get_user_course_ids(db, user_id)
+    neighbours = semantic_index.similar_to_many(
+        enrolled, k=size - len(courses), exclude=[course.id for course in courses]
+    )
+    return courses + crud.get_built_courses_by_ids(db, [course_id for course_id, _ in neighbours])
+
+
 @router.get("/recommendations",response_model=List[schemas.CourseOut])
 def get_recommendations_for_user(
     user_id: int,
-    limit: int = 48,
+    limit: int = Query(48, ge=1, le=recommendation_cache.CACHE_SIZE),
+    offset: int = Query(0, ge=0, le=recommendation_cache.CACHE_SIZE),
     db: Session = Depends(database.get_db), 
     current_user: schemas.UserOut = Depends(auth.get_current_active_user),
     ):
-  
-    user_interests = crud.get_user_interested_topics(db, user_id)
-    enrolled_course_tuples = crud.get_enrolled_courses(db=db, user_id=user_id)
-    enrolled_course_ids = [course.id for course, _ in enrolled_course_tuples]    
-
-
-    # 3️⃣ Get topics of enrolled courses
-    enrolled_topics = crud.get_topic_ids_from_enrolled_courses(db, user_id)
-    courses = []
-    strategy = ""
-
-    # ✅ SCENARIO 1: No interests + no enrollments
-    if not user_interests and not enrolled_topics:
-        strategy = "random_trending"
-        print(strategy)
-        courses = crud.get_random_courses(db, limit=limit)
-
-    # ✅ SCENARIO 2: No interests + has enrollments
-    elif not user_interests and enrolled_topics:
-        strategy = "related_to_enrollments"
-        courses = crud.get_courses_by_topics(
-            db,
-            topic_ids=enrolled_topics,
-            exclude_course_ids=enrolled_course_ids,  # Just in case, though no enrollments.
-            limit=limit
-        )
-
-    # ✅ SCENARIO 3: Has interests + no enrollments
-    elif user_interests and not enrolled_topics:
-        strategy = "interest_based"
-        courses = crud.get_courses_by_topics(
-            db,
-            topic_ids=user_interests,
-            exclude_course_ids=enrolled_course_ids,  # Just in case, though no enrollments.
-            limit=limit
-        )
+    """
+    Page over the user's cached recommendation list.
 
-    # ✅ SCENARIO 4: Has interests + has enrollments
-    else:
-        strategy = "hybrid_interest_and_enrollment"
-        interest_courses = crud.get_courses_by_topics(
-            db,
-            topic_ids=user_interests,
-            exclude_course_ids=enrolled_course_ids,
-            limit=limit // 2
-        )
-        related_courses = crud.get_courses_by_topics(
-            db,
-            topic_ids=enrolled_topics,
-            exclude_course_ids=enrolled_course_ids,
-            limit=limit - len(interest_courses)
-        )
-        courses = interest_courses + related_courses
-    return courses
+    The list is computed once (``CACHE_SIZE`` entries, or ``offset + limit`` if
+    larger) and reused until it expires, or until an enrollment, preference
+    change or catalog change invalidates it. Paging is stable between requests.
+    """
+    courses, generation = recommendation_cache.get(user_id)
+    if courses is None:
+        size = max(recommendation_cache.CACHE_SIZE, offset + limit)
+        courses = [
+            schemas.CourseOut.model_validate(course).model_dump()
+            for course in _compute_recommendations(db, user_id, size)
+        ]
+        recommendation_cache.put(user_id, courses, generation)
+    return courses[offset:offset + limit]
 
 
 
@@ -552,7 +656,7 @@ def enroll_in_course(
     return {"status": "success"}
 
 
-@router.put("/courses/update_progress")
+@router.put("/courses/update_progress", response_model=schemas.CourseProgressOut)
 def update_course_progress(
     payload: schemas.CourseProgressUpdate,
     db: Session = Depends(database.get_db),
@@ -568,6 +672,34 @@ def update_course_progress(
     )
 
 
+def _course_quiz_sections(db: Session, course_id: int) -> dict:
+    sections = quiz_cache.load(course_id)
+    if sections is not None:
+        return sections
+
+    sections = {
+        str(index): quizzes
+        for index, quizzes in crud.get_course_quiz_sections(db, course_id).items()
+    }
+    if sections:
+        quiz_cache.store(course_id, sections)
+    elif not crud.course_exists(db, course_id):
+        raise HTTPException(status_code=404, detail="Course not found")
+    return sections
+
+
+@router.get("/courses/{course_id}/quizzes")
+def get_course_quizzes(
+    course_id: int,
+    db: Session = Depends(database.get_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_active_user),
+):
+    """
+    Every section's quizzes for a course, keyed by section_index.
+    """
+    return {"course_id": course_id, "sections": _course_quiz_sections(db, course_id)}
+
+
 @router.get("/section-quizzes")
 def get_section_quizzes(
     course_id: int,
@@ -576,17 +708,7 @@ def get_section_quizzes(
     current_user: schemas.UserOut = Depends(auth.get_current_active_user),
 
 ):
-    quizzes = crud.get_quizes(db=db, course_id=course_id, section_index=section_index)
-    return [
-        {
-            "id": q.id,
-            "question": q.data.get("question"),
-            "options": q.data.get("options"),
-            "correctAnswer": q.data.get("correctAnswer"),
-            "hint": q.data.get("hint")
-        }
-        for q in quizzes
-    ]
+    return _course_quiz_sections(db, course_id).get(str(section_index), [])
 
 
 @router.post("/courses/{course_id}/sections/{section_index}/quiz-complete", status_code=200)
@@ -613,6 +735,17 @@ def get_dashboard_stats(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You do not have admin permissions",
         )
+
+    # ✅ Precomputed rollups; SQL below only runs until the first reconciliation
+    rollups = dashboard_rollups.snapshot(today=datetime.now(timezone.utc).date())
+    if rollups is not None:
+        rollups["most_attempted"] = [
+            {"title": title, "user_count": count} for _, title, count in rollups["most_attempted"]
+        ]
+        rollups["least_attempted"] = [
+            {"title": title, "user_count": count} for _, title, count in rollups["least_attempted"]
+        ]
+        return rollups
     
     user_count = crud.get_users_count(db)
     topic_count = crud.get_topics_count(db)
@@ -642,4 +775,65 @@ def get_dashboard_stats(
         "daily_new_users": daily_new_users
 
         
-    }
\ No newline at end of file
+    }
+
+
+# Points per response; hourly series over long ranges must be narrowed
+MAX_TIMESERIES_POINTS = 24 * 93
+
+
+@router.get("/analytics/timeseries", response_model=schemas.TimeSeriesResponse)
+def get_analytics_timeseries(
+    metric: models.AnalyticsMetric,
+    start: datetime,
+    end: datetime,
+    granularity: schemas.TimeSeriesGranularity = schemas.TimeSeriesGranularity.day,
+    db: Session = Depends(database.get_db),
+    current_user: schemas.UserOut = Depends(auth.get_current_active_user),
+):
+    """
+    Event counts per hour/day/week/month, served from the aggregate tables.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have admin permissions",
+        )
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+
+    span = end - start
+    if granularity == schemas.TimeSeriesGranularity.hour:
+        points = span.total_seconds() / 3600
+    else:
+        points = span.days
+        start, end = start.date(), end.date()
+    if points > MAX_TIMESERIES_POINTS:
+        raise HTTPException(status_code=400, detail="Date range too large for this granularity")
+
+    return {
+        "metric": metric.value,
+        "granularity": granularity,
+        "points": crud.get_metric_series(
+            db, metric, start=start, end=end, granularity=granularity.value
+        ),
+    }
+
+
+@router.get("/admin/pool-stats")
+def get_pool_stats(
+    current_user: schemas.UserOut = Depends(auth.get_current_active_user),
+):
+    """
+    Postgres and Mongo pool utilization of every live web and worker process.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You do not have admin permissions",
+        )
+    return pool_stats.collect()
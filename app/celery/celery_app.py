@@ -1,14 +1,19 @@
 from celery import Celery
-from config import get_celery_cred
+from celery.schedules import crontab
+from config import get_celery_cred, get_progress_buffer_settings
 
 
 celery_cred = get_celery_cred()
 
+# Email delivery runs on its own queue and worker so slow Gmail calls never
+# hold up course generation (and vice versa)
+EMAIL_QUEUE = "email"
+
 celery_app = Celery(
     "worker",
     broker=celery_cred.CELERY_BROKER_URL,
     backend=celery_cred.CELERY_RESULT_BACKEND,
-    include=["app.celery.tasks"],
+    include=["app.celery.tasks", "app.celery.email_tasks", "app.celery.monitoring"],
     task_serializer='json',
     result_serializer='json',
     accept_content=['json'],
@@ -18,4 +23,43 @@ celery_app = Celery(
     }
 )
 
+celery_app.conf.task_routes = {
+    "app.celery.email_tasks.*": {"queue": EMAIL_QUEUE},
+}
+
+celery_app.conf.beat_schedule = {
+    "rebuild-recommendation-pools": {
+        "task": "app.celery.tasks.rebuild_recommendation_pools",
+        "schedule": 60 * 60,
+    },
+    "build-collaborative-recommendations": {
+        "task": "app.celery.tasks.build_collaborative_recommendations",
+        "schedule": 6 * 60 * 60,
+    },
+    # Full scan of course_interactions; the rollups are kept current incrementally
+    "reconcile-dashboard-rollups": {
+        "task": "app.celery.tasks.reconcile_dashboard_rollups",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    "build-semantic-index": {
+        "task": "app.celery.tasks.build_semantic_index",
+        "schedule": 60 * 60,
+    },
+    "flush-analytics-counters": {
+        "task": "app.celery.tasks.flush_analytics_counters",
+        "schedule": 60,
+        "options": {"expires": 60},
+    },
+    "purge-verification-codes": {
+        "task": "app.celery.tasks.purge_verification_codes",
+        "schedule": 60 * 60,
+    },
+}
 
+progress_settings = get_progress_buffer_settings()
+if progress_settings.PROGRESS_WRITE_BEHIND:
+    celery_app.conf.beat_schedule["flush-course-progress"] = {
+        "task": "app.celery.tasks.flush_course_progress",
+        "schedule": progress_settings.PROGRESS_FLUSH_INTERVAL_SECONDS,
+        "options": {"expires": progress_settings.PROGRESS_FLUSH_INTERVAL_SECONDS},
+    }
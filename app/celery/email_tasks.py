@@ -0,0 +1,36 @@
+from celery.signals import worker_process_init
+from loguru import logger
+
+from .celery_app import celery_app
+from app.services import email_helper
+
+
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 10 * 60
+
+
+def _backoff(retries: int) -> int:
+    return min(BACKOFF_BASE_SECONDS * 2 ** retries, BACKOFF_MAX_SECONDS)
+
+
+@worker_process_init.connect
+def reset_gmail_client(**kwargs):
+    # A client built before the fork would share its socket across children
+    email_helper.reset_service()
+
+
+@celery_app.task(bind=True, max_retries=MAX_RETRIES, acks_late=True)
+def send_email(self, to_email: str, subject: str, body: str):
+    """
+    Deliver one email, retrying rate limits and transient Gmail/network errors
+    with exponential backoff.
+    """
+    try:
+        return email_helper.deliver(to_email, subject, body)
+    except Exception as exc:
+        if not email_helper.is_transient(exc):
+            logger.error(f"❌ Email to {to_email} failed permanently: {exc}")
+            raise
+        logger.warning(f"⚠️ Email to {to_email} failed, retry {self.request.retries + 1}: {exc}")
+        raise self.retry(exc=exc, countdown=_backoff(self.request.retries))
@@ -0,0 +1,41 @@
+import os
+import time
+
+from celery.signals import task_postrun, task_prerun, worker_process_shutdown, worker_ready
+from loguru import logger
+from prometheus_client import start_http_server
+
+from app.services import metrics
+from config import get_metrics_settings
+
+
+# task_id -> start time, per process (a task runs start to finish in one child)
+_started_at = {}
+
+
+@task_prerun.connect
+def start_task_timer(task_id=None, **kwargs):
+    _started_at[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def observe_task_duration(task_id=None, task=None, state=None, **kwargs):
+    started_at = _started_at.pop(task_id, None)
+    if started_at is not None and task is not None:
+        metrics.observe_task(task.name, state, time.perf_counter() - started_at)
+
+
+@worker_process_shutdown.connect
+def drop_child_gauges(pid=None, **kwargs):
+    metrics.mark_process_dead(pid or os.getpid())
+
+
+@worker_ready.connect
+def serve_metrics(**kwargs):
+    # Tasks run in prefork children; only the multiprocess registry sees their metrics
+    if not metrics.MULTIPROC_DIR:
+        logger.warning("PROMETHEUS_MULTIPROC_DIR is not set, worker task metrics are not exported")
+        return
+    port = get_metrics_settings().CELERY_METRICS_PORT
+    start_http_server(port, registry=metrics.registry())
+    logger.info(f"📈 Serving worker metrics on :{port}")
@@ -0,0 +1,29 @@
+"""
+Enqueue tasks by name.
+
+The web tier only needs to publish messages, so it goes through these helpers
+instead of importing the task modules and, with them, the generation and
+delivery stack (openai, tqdm, loguru, scipy, the Gmail client). Celery itself
+is imported on the first enqueue rather than at web process startup.
+"""
+
+from functools import lru_cache
+
+CREATE_COURSES_TASK = "app.celery.tasks.create_course_for_topic"
+SEND_EMAIL_TASK = "app.celery.email_tasks.send_email"
+
+
+@lru_cache
+def _celery_app():
+    from .celery_app import celery_app
+
+    return celery_app
+
+
+def create_courses_for_topic(topic_id: int, topic_name: str, description: str):
+    return _celery_app().send_task(CREATE_COURSES_TASK, args=(topic_id, topic_name, description))
+
+
+def send_email(to_email: str, subject: str, body: str):
+    # task_routes sends it to the email queue
+    return _celery_app().send_task(SEND_EMAIL_TASK, args=(to_email, subject, body))
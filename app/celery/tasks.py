@@ -1,16 +1,35 @@
+from celery.signals import worker_init, worker_ready
 from .celery_app import celery_app
-from app.services import ai_helper
-from app.db import crud
-from app.db.database import SessionLocal  # your sessionmaker
-from app.db.mongo_db import mongodb_client
+from app.services import (
+    ai_helper,
+    collaborative_filtering,
+    course_blob,
+    course_store,
+    dashboard_rollups,
+    markdown_render,
+    metric_counters,
+    pool_stats,
+    progress_buffer,
+    quiz_cache,
+    recommendation_cache,
+    recommendation_pool,
+    semantic_index,
+)
+from app.db import crud, database, redis_db
+from app.db.database import BatchSessionLocal as SessionLocal  # no statement_timeout
+from app.db.mongo_db import get_mongo_db
+from datetime import datetime, timezone
 from tqdm import tqdm
 from loguru import logger
 
 
-db = SessionLocal() 
-
 @celery_app.task
 def create_course_for_topic(topic_id: int, topic_name: str, description: str):
+    with SessionLocal() as db:
+        _create_courses(db, topic_id, topic_name, description)
+
+
+def _create_courses(db, topic_id: int, topic_name: str, description: str):
     courses = ai_helper.generate_courses(topic_name, description)
     logger.info("====== Fetch course done =====")
 
@@ -105,11 +124,20 @@ def create_course_for_topic(topic_id: int, topic_name: str, description: str):
 
 
             if len(full_course.get('sections', [])) > 0:
-                mongo_doc = {'course_id': course_id, 'course_details': full_course}
-                mongodb_client.courses.insert_one(mongo_doc)
+                # 3️⃣ Render every subsection to HTML once, instead of on every view
+                rendered_course = markdown_render.render_course(full_course)
+                logger.info(f"✅ Content pre-rendered to HTML (course_id: {course_id})")
+
+                course_store.save_course(get_mongo_db(), course_id, rendered_course)
                 logger.info(f"✅ Full course saved to MongoDB (course_id: {course_id})")
 
-                crud.mark_course_as_built(db, course_id=course_id)
+                course_blob.save_course_blob(get_mongo_db(), course_id, full_course)
+                logger.info(f"✅ Pre-rendered course blob stored (course_id: {course_id})")
+
+                quiz_cache.store(course_id, crud.get_course_quiz_sections(db, course_id))
+                logger.info(f"✅ Quizzes cached (course_id: {course_id})")
+
+                crud.mark_course_as_built(db, course_id=course_id, course_details=full_course)
                 logger.info(f"✅ Course marked as built in SQL (course_id: {course_id})")
             else: 
                 logger.info(f"Error generate subsection {course})")
@@ -118,3 +146,204 @@ def create_course_for_topic(topic_id: int, topic_name: str, description: str):
             logger.error(f"🔥 Unexpected error while processing course '{course_title}': {e}")
             # Do NOT mark as complete, just continue to next course
             continue
+
+
+
+@celery_app.task
+def backfill_course_blobs():
+    """
+    Render blobs for courses that were built before blobs existed.
+    """
+    built = 0
+    for course_id, course_details in course_store.iter_courses(get_mongo_db()):
+        if course_blob.load_course_blob(get_mongo_db(), course_id):
+            continue
+        course_blob.save_course_blob(get_mongo_db(), course_id, course_details)
+        built += 1
+    logger.info(f"✅ Backfilled {built} course blobs")
+    return built
+
+
+@celery_app.task
+def rebuild_recommendation_pools():
+    """
+    Reload the per-topic and global candidate pools from the built catalog.
+    """
+    with SessionLocal() as db:
+        rows = crud.get_built_course_topic_pairs(db)
+        total = recommendation_pool.rebuild(rows)
+        logger.info(f"✅ Recommendation pools rebuilt with {total} courses")
+        return total
+
+
+
+@celery_app.task
+def build_collaborative_recommendations():
+    """
+    Recompute the item-item top-K course list for every user.
+    """
+    with SessionLocal() as db:
+        recommendations = collaborative_filtering.compute_recommendations(
+            interactions=crud.get_interaction_rows(db),
+            preferences=crud.get_topic_preference_rows(db),
+            course_topics=crud.get_built_course_topic_pairs(db),
+        )
+        collaborative_filtering.store(recommendations, built_at=datetime.now(timezone.utc).isoformat())
+        recommendation_cache.invalidate_all()
+        logger.info(f"✅ Collaborative recommendations stored for {len(recommendations)} users")
+        return len(recommendations)
+
+
+
+@celery_app.task
+def reconcile_dashboard_rollups():
+    """
+    Recompute every dashboard counter from SQL and replace the Redis rollups.
+    """
+    dashboard_rollups.begin_reconcile()
+    with SessionLocal() as db:
+        dashboard_rollups.replace_all(
+            counters={
+                dashboard_rollups.USERS: crud.get_users_count(db),
+                dashboard_rollups.TOPICS: crud.get_topics_count(db),
+                dashboard_rollups.QUIZZES: crud.get_quizzes_count(db),
+                dashboard_rollups.PASSED_QUIZZES: crud.get_quizzes_completion_stats(db)[0],
+            },
+            topic_titles=crud.get_topic_titles(db),
+            topic_user_pairs=crud.get_topic_user_pairs(db),
+            signups=crud.get_daily_new_users(db),
+        )
+        logger.info("✅ Dashboard rollups reconciled")
+
+
+
+@celery_app.task
+def backfill_analytics():
+    """
+    One-off rebuild of the analytics tables from raw history.
+    """
+    with SessionLocal() as db:
+        crud.backfill_metrics(db)
+        logger.info("✅ Analytics tables backfilled")
+
+
+
+@celery_app.task
+def flush_analytics_counters():
+    """
+    Fold the Redis event counters into the analytics tables.
+    """
+    claimed = metric_counters.take_for_flush()
+    if claimed is None:
+        return 0  # another worker is flushing
+    token, counts = claimed
+    with SessionLocal() as db:
+        try:
+            crud.fold_metric_counts(db, counts, lock_token=token)
+            db.commit()
+        except Exception:
+            db.rollback()
+            metric_counters.flush_failed(token)
+            raise
+    metric_counters.flush_done(token)
+    return len(counts)
+
+
+
+@celery_app.task
+def flush_course_progress():
+    """
+    Write buffered progress pings to Postgres in one batched upsert.
+    """
+    entries = progress_buffer.take_for_flush()
+    if entries is None:
+        return 0  # another worker is flushing
+    with SessionLocal() as db:
+        try:
+            written = crud.flush_course_progress(db, entries)
+        except Exception:
+            db.rollback()
+            progress_buffer.flush_failed()
+            raise
+    progress_buffer.flush_done()
+    if entries:
+        logger.info(f"✅ Flushed {len(entries)} buffered progress updates ({written} rows changed)")
+    return written
+
+
+
+@celery_app.task
+def reindex_course_search():
+    """
+    Rebuild the search documents of every course stored in Mongo.
+    """
+    with SessionLocal() as db:
+        indexed = 0
+        for course_id, course_details in course_store.iter_courses(get_mongo_db()):
+            crud.index_course_for_search(db, course_id, course_details)
+            db.commit()
+            indexed += 1
+        logger.info(f"✅ Search index rebuilt for {indexed} courses")
+        return indexed
+
+
+
+@celery_app.task
+def build_semantic_index():
+    """
+    Vectorise every built course and publish the matrix for the web processes.
+    """
+    with SessionLocal() as db:
+        summaries = crud.get_built_course_summaries(db)
+
+    course_ids, texts = [], []
+    for course_id, course_details in course_store.iter_courses(get_mongo_db()):
+        if course_id not in summaries:
+            continue
+        title, description = summaries[course_id]
+        course_ids.append(course_id)
+        texts.append(semantic_index.course_text(title, description, course_details))
+
+    vectors = semantic_index.build_vectors(texts)
+    semantic_index.publish(course_ids, vectors, version=datetime.now(timezone.utc).isoformat())
+    logger.info(f"✅ Semantic index built for {len(course_ids)} courses")
+    return len(course_ids)
+
+
+@celery_app.task
+def purge_verification_codes():
+    """
+    Drop expired and used codes from the Postgres fallback tables.
+    """
+    with SessionLocal() as db:
+        purged = crud.purge_verification_codes(db)
+        if purged:
+            logger.info(f"✅ Purged {purged} verification codes")
+        return purged
+
+
+@worker_init.connect
+def publish_pool_stats(**kwargs):
+    # Before the pool forks, so every child inherits the listener
+    pool_stats.install(database.engine)
+
+
+# One warm-up per deploy: set by the first default-queue worker that starts
+WARMUP_KEY = "worker:warmup"
+WARMUP_SECONDS = 10 * 60
+
+
+@worker_ready.connect
+def warm_recommendation_pools(sender=None, **kwargs):
+    # Pools, rollups and the semantic index serve nothing until the first full rebuild, so do one at startup
+    if celery_app.conf.task_default_queue not in sender.app.amqp.queues.consume_from:
+        return  # the email worker
+    try:
+        if not redis_db.get_redis_client().set(WARMUP_KEY, 1, nx=True, ex=WARMUP_SECONDS):
+            return  # another worker (or this one, before a restart) already queued it
+    except redis_db.RedisError as exc:
+        logger.warning(f"Skipping startup rebuilds, Redis unavailable: {exc}")
+        return
+    rebuild_recommendation_pools.delay()
+    reconcile_dashboard_rollups.delay()
+    build_semantic_index.delay()
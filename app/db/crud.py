@@ -1,16 +1,33 @@
+import logging
+import random
 from datetime import datetime, timedelta, timezone
 from functools import lru_cache
 from typing import Optional
 
 from fastapi import HTTPException
+from sqlalchemy import Integer, and_, case, exists, literal, literal_column, or_, select, true, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.sql.expression import cast, func
 from sqlalchemy.sql.sqltypes import DATE
 
-from app.db import models, schemas
+from app.db import models, redis_db, schemas
+from config import get_progress_buffer_settings
+from app.services import (
+    dashboard_rollups,
+    metric_counters,
+    otp_store,
+    progress_buffer,
+    quiz_cache,
+    recommendation_cache,
+    recommendation_pool,
+)
 from app.services.password_helper import get_password_hash, verify_password
 
+log = logging.getLogger(__name__)
+
 
 def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
@@ -39,6 +56,8 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    count_metric(db, models.AnalyticsMetric.signups)
+    dashboard_rollups.user_created(db_user.created_at.astimezone(timezone.utc).date())
     return db_user
 
 
@@ -79,6 +98,7 @@ def get_user_selected_topics(db: Session, user_id: int):
 def delete_user(db: Session, user: models.User):
     db.delete(user)
     db.commit()
+    dashboard_rollups.user_deleted()
     return {"detail": "User deleted successfully"}
 
 
@@ -96,11 +116,18 @@ def create_topic(db: Session, topic: schemas.TopicCreate, user_id: int):
     db.add(new_topic)
     db.commit()
     db.refresh(new_topic)
+    dashboard_rollups.topic_saved(new_topic.id, new_topic.title, created=True)
     return new_topic
 
 @lru_cache(maxsize=128, typed=False)
 def get_all_topics(db: Session):
-    return db.query(models.Topic).order_by(models.Topic.id.desc()).all()
+    # GET /topics serializes each topic's creator and courses
+    return (
+        db.query(models.Topic)
+        .options(selectinload(models.Topic.creator), selectinload(models.Topic.courses))
+        .order_by(models.Topic.id.desc())
+        .all()
+    )
 
 @lru_cache(maxsize=128, typed=False)
 def get_all_courses(db: Session):
@@ -118,14 +145,22 @@ def get_topic_by_id(db: Session, topic_id: int):
 def update_topic(db: Session, db_topic: models.Topic, updated: schemas.TopicCreate):
     db_topic.title = updated.title
     db_topic.description = updated.description
+    refresh_topic_search(db, db_topic)
     db.commit()
     db.refresh(db_topic)
+    dashboard_rollups.topic_saved(db_topic.id, db_topic.title)
     return db_topic
 
 
 def delete_topic(db: Session, topic: models.Topic):
+    topic_id = topic.id
+    course_ids = [course.id for course in topic.courses]
     db.delete(topic)
     db.commit()
+    recommendation_pool.remove_topic(topic_id, course_ids)
+    recommendation_cache.invalidate_all()
+    dashboard_rollups.topic_deleted(topic_id)
+    quiz_cache.delete(course_ids)
 
 
 def insert_log_in_code_forgot_password(
@@ -198,37 +233,46 @@ def get_user_interests(db: Session, user_id: int):
 
 
 def add_user_topic_preferences(db: Session, user_id: int, topic_ids: list):
-    preferences = []
-    for topic_id in topic_ids:
-        existing_preference = (
-            db.query(models.UserTopicPreference)
-            .filter(
-                models.UserTopicPreference.user_id == user_id,
-                models.UserTopicPreference.topic_id == topic_id,
-            )
-            .first()
-        )
-
-        if not existing_preference:
-            user_topic_preference = models.UserTopicPreference(
-                user_id=user_id, topic_id=topic_id
-            )
-            db.add(user_topic_preference)
-            preferences.append(user_topic_preference)
+    """
+    Insert the new preferences in one multi-row statement; existing ones are skipped.
+    """
+    topic_ids = list(dict.fromkeys(topic_ids))
+    if not topic_ids:
+        return []
 
+    stmt = (
+        pg_insert(models.UserTopicPreference)
+        .values([{"user_id": user_id, "topic_id": topic_id} for topic_id in topic_ids])
+        .on_conflict_do_nothing(constraint="uix_user_topic")
+        .returning(models.UserTopicPreference)
+    )
+    preferences = db.scalars(stmt).all()
     db.commit()
-
-    for preference in preferences:
-        db.refresh(preference)
+    recommendation_cache.invalidate_user(user_id)
     return preferences
 
 
-def mark_course_as_built(db: Session, course_id: int):
+def mark_course_as_built(db: Session, course_id: int, course_details: dict = None):
     db.query(models.Course).filter(models.Course.id == course_id).update(
         {"is_detail_created_by_ai": True}
     )
+    if course_details is not None:
+        # A failed index must not roll back the built flag of a generated course:
+        # index in a savepoint and leave failures to reindex_course_search
+        try:
+            with db.begin_nested():
+                index_course_for_search(db, course_id, course_details)
+        except Exception as exc:
+            log.warning("Search indexing failed for course %s, left to reindex_course_search: %s", course_id, exc)
     db.commit()
 
+    topic_id = (
+        db.query(models.Course.topic_id).filter(models.Course.id == course_id).scalar()
+    )
+    if topic_id is not None:
+        recommendation_pool.add_course(course_id, topic_id)
+    recommendation_cache.invalidate_all()
+
 
 def mark_topic_published(db: Session, topic_id: int):
     db.query(models.Topic).filter(models.Topic.id == topic_id).update(
@@ -253,7 +297,23 @@ def get_enrolled_courses(db: Session, user_id: int) -> list[tuple]:
         .order_by(models.CourseInteraction.updated_at.desc())
         .all()
     )
-    return enrolled_courses
+    if not get_progress_buffer_settings().PROGRESS_WRITE_BEHIND:
+        return enrolled_courses
+
+    # Merge progress that is still buffered in Redis
+    buffered = progress_buffer.pending_progress(
+        (user_id, course.id) for course, _ in enrolled_courses
+    )
+    for course, interaction in enrolled_courses:
+        progress = buffered.get((user_id, course.id))
+        if progress is not None and progress > interaction.course_progress:
+            # Not a pending change: the flush job owns writing it
+            set_committed_value(interaction, "course_progress", progress)
+    return [
+        (course, interaction)
+        for course, interaction in enrolled_courses
+        if interaction.course_progress < 100
+    ]
 
 
 def get_user_interested_topics(db: Session, user_id: int) -> list:
@@ -284,38 +344,147 @@ def get_topic_ids_from_enrolled_courses(db: Session, user_id: int) -> list:
     return [topic_id for (topic_id,) in topic_ids]
 
 
-def get_random_courses(db: Session, limit: int = 10):
+def get_built_courses_by_ids(db: Session, course_ids: list) -> list:
     """
-    Fetch a random list of published courses from the database.
+    Fetch built courses by primary key, keeping the order of ``course_ids``.
     """
-    # Get total count of available courses
-    total_courses = (
+    if not course_ids:
+        return []
+    courses = (
         db.query(models.Course)
+        .filter(
+            models.Course.id.in_(course_ids),
+            models.Course.is_detail_created_by_ai == True,
+        )
+        .all()
+    )
+    by_id = {course.id: course for course in courses}
+    return [by_id[course_id] for course_id in course_ids if course_id in by_id]
+
+
+def get_built_course_topic_pairs(db: Session) -> list:
+    return (
+        db.query(models.Course.id, models.Course.topic_id)
         .filter(models.Course.is_detail_created_by_ai == True)
-        .count()
+        .all()
     )
 
-    if total_courses == 0:
-        return []
 
-    # If fewer courses than the limit, return all
-    if total_courses <= limit:
+def get_built_course_summaries(db: Session) -> dict:
+    """
+    ``{course_id: (title, description)}`` for every built course.
+    """
+    rows = (
+        db.query(models.Course.id, models.Course.course_title, models.Course.course_description)
+        .filter(models.Course.is_detail_created_by_ai == True)
+    )
+    return {course_id: (title, description) for course_id, title, description in rows}
+
+
+def get_user_course_ids(db: Session, user_id: int) -> list:
+    """
+    Every course the user is enrolled in, most recently active first.
+    """
+    return [
+        course_id
+        for (course_id,) in db.query(models.CourseInteraction.course_id)
+        .filter(models.CourseInteraction.user_id == user_id)
+        .order_by(models.CourseInteraction.updated_at.desc().nullslast())
+    ]
+
+
+def get_interaction_rows(db: Session, batch_size: int = 10000):
+    """
+    Stream (user_id, course_id, course_progress) for every interaction.
+    """
+    return (
+        db.query(
+            models.CourseInteraction.user_id,
+            models.CourseInteraction.course_id,
+            models.CourseInteraction.course_progress,
+        )
+        .yield_per(batch_size)
+    )
+
+
+def get_topic_preference_rows(db: Session, batch_size: int = 10000):
+    return (
+        db.query(models.UserTopicPreference.user_id, models.UserTopicPreference.topic_id)
+        .yield_per(batch_size)
+    )
+
+
+def _topic_samples(topic_ids, k: int, *criteria):
+    """
+    Select up to ``k`` built course ids per topic in ``topic_ids`` (a select
+    of ``topic_id``), as a run in id order from a random point of the topic's
+    id range, wrapping around to its start.
+
+    Each run is a ``LIMIT k`` walk of ``index_course_topic_built``, so the cost
+    depends on the number of topics and ``k``, not on the size of the catalog
+    as with ``ORDER BY random()``. Callers shuffle the combined runs.
+    """
+    Course = models.Course
+    topics = topic_ids.subquery("topics")
+    in_topic = (Course.topic_id == topics.c.topic_id, Course.is_detail_created_by_ai == True)
+
+    lo, hi = func.min(Course.id), func.max(Course.id)
+    pivot = (
+        select(cast(lo + func.floor(func.random() * (hi - lo + 1)), Integer).label("id"))
+        .where(*in_topic)
+        .lateral("pivot")
+    )
+
+    def run(bound):
         return (
-            db.query(models.Course)
-            .filter(models.Course.is_detail_created_by_ai == True)
-            .all()
+            select(Course.id)
+            .where(*in_topic, bound, *criteria)
+            .order_by(Course.id)
+            .limit(k)
+            .correlate(topics, pivot)
         )
 
-    # Get random offset indices (option 1 - efficient for small datasets)
-    random_courses = (
-        db.query(models.Course)
-        .filter(models.Course.is_detail_created_by_ai == True)
-        .order_by(func.random())
-        .limit(limit)
-        .all()
+    runs = union_all(run(Course.id >= pivot.c.id), run(Course.id < pivot.c.id)).subquery()
+    picked = select(runs.c.id).limit(k).lateral("picked")
+    return (
+        select(picked.c.id.label("course_id"))
+        .select_from(topics)
+        .join(pivot, true())
+        .join(picked, true())
+    )
+
+
+def get_random_courses(db: Session, limit: int = 10):
+    """
+    Fetch a random list of published courses from the database.
+    """
+    sampled_ids = recommendation_pool.sample(limit)
+    if sampled_ids is not None:
+        return get_built_courses_by_ids(db, sampled_ids)
+
+    # Pools not ready yet: fall back to sampling in SQL
+    Course = models.Course
+    lo, hi = func.min(Course.id), func.max(Course.id)
+    pivot = (
+        select(cast(lo + func.floor(func.random() * (hi - lo + 1)), Integer).label("id"))
+        .where(Course.is_detail_created_by_ai == True)
+        .cte("pivot")
     )
+    start = select(pivot.c.id).scalar_subquery()
 
-    return random_courses
+    def run(bound):
+        return (
+            select(Course.id)
+            .where(Course.is_detail_created_by_ai == True, bound)
+            .order_by(Course.id)
+            .limit(limit)
+        )
+
+    picked = union_all(run(Course.id >= start), run(Course.id < start)).subquery()
+    # The run is contiguous in id order, so shuffle it like SRANDMEMBER would
+    sampled_ids = list(db.scalars(select(picked.c.id).limit(limit)))
+    random.shuffle(sampled_ids)
+    return get_built_courses_by_ids(db, sampled_ids)
 
 
 def get_courses_by_topics(
@@ -324,32 +493,140 @@ def get_courses_by_topics(
     exclude_course_ids: list,
     limit: int = 10,
 ) -> list:
-    query = db.query(models.Course).filter(
-        models.Course.topic_id.in_(topic_ids),
-        models.Course.is_detail_created_by_ai == True,
+    sampled_ids = recommendation_pool.sample(
+        limit, topic_ids=topic_ids, exclude_ids=exclude_course_ids
     )
-    if exclude_course_ids:
-        query = query.filter(~models.Course.id.in_(exclude_course_ids))
-    return query.order_by(func.random()).limit(limit).all()
+    if sampled_ids is not None:
+        return get_built_courses_by_ids(db, sampled_ids)
 
+    topics = select(models.Topic.id.label("topic_id")).where(models.Topic.id.in_(topic_ids))
+    criteria = [models.Course.id.not_in(exclude_course_ids)] if exclude_course_ids else []
+    candidates = _topic_samples(topics, limit, *criteria).subquery()
+    sampled_ids = db.scalars(
+        select(candidates.c.course_id).order_by(func.random()).limit(limit)
+    ).all()
+    return get_built_courses_by_ids(db, sampled_ids)
 
-def create_course_interaction(db: Session, user_id: int, course_id: int):
-    existing = (
-        db.query(models.CourseInteraction)
-        .filter_by(user_id=user_id, course_id=course_id)
-        .first()
+
+def get_recommended_courses(db: Session, user_id: int, limit: int = 48) -> list:
+    """
+    Interest/enrollment recommendations resolved in a single statement.
+
+    Mirrors the multi-query strategy of the /recommendations view:
+      - no interests, no enrollments -> ``get_random_courses`` (Redis pools)
+      - only one of them             -> ``limit`` courses from those topics
+      - both                         -> ``limit // 2`` interest courses, the rest
+                                        from the topics of enrolled courses
+    In-progress enrollments are excluded, and so are the interest courses
+    already picked from the related bucket. Each bucket shuffles at most
+    ``limit`` candidates per topic from ``_topic_samples``, so the statement
+    never sorts every matching course.
+    """
+    Course = models.Course
+    Interaction = models.CourseInteraction
+    Preference = models.UserTopicPreference
+
+    interests = (
+        select(Preference.topic_id)
+        .where(Preference.user_id == user_id)
+        .distinct()
+        .cte("interests")
+    )
+    enrolled = (
+        select(Interaction.course_id, Interaction.course_progress, Course.topic_id)
+        .join(Course, Course.id == Interaction.course_id)
+        .where(Interaction.user_id == user_id)
+        .cte("enrolled")
     )
+    has_enrollments = exists(select(enrolled.c.course_id))
+    excluded_ids = select(enrolled.c.course_id).where(enrolled.c.course_progress < 100)
+    enrolled_topic_ids = select(enrolled.c.topic_id).distinct()
+    interest_topic_ids = select(interests.c.topic_id)
+    interest_quota = case((has_enrollments, limit // 2), else_=limit)
+
+    def branch(bucket: str, topic_ids, *criteria):
+        candidates = _topic_samples(
+            topic_ids, limit, Course.id.not_in(excluded_ids), *criteria
+        ).subquery()
+        return select(
+            candidates.c.course_id,
+            literal(bucket).label("bucket"),
+            func.row_number().over(order_by=func.random()).label("rn"),
+        )
 
-    if not existing:
-        new_interaction = models.CourseInteraction(
-            user_id=user_id,
-            course_id=course_id,
-            course_progress=0,  # starts at 0%
+    interest = branch("interest", interest_topic_ids).cte("interest")
+    interest_picked = select(interest.c.course_id).where(interest.c.rn <= interest_quota)
+    ranked = union_all(
+        select(interest).where(interest.c.rn <= interest_quota),
+        branch("related", enrolled_topic_ids, Course.id.not_in(interest_picked)),
+    ).cte("ranked")
+
+    interest_taken = select(func.count()).select_from(interest_picked.subquery()).scalar_subquery()
+    courses = (
+        db.query(Course)
+        .join(ranked, ranked.c.course_id == Course.id)
+        .filter(
+            or_(
+                ranked.c.bucket == "interest",
+                and_(ranked.c.bucket == "related", ranked.c.rn <= limit - interest_taken),
+            )
         )
-        db.add(new_interaction)
-        db.commit()
-        db.refresh(new_interaction)
-        return new_interaction
+        .order_by(case((ranked.c.bucket == "interest", 0), else_=1), ranked.c.rn)
+        .all()
+    )
+    if courses:
+        return courses
+
+    # Cold start: sample the Redis pools instead of sorting the whole catalog
+    has_profile = db.query(
+        or_(
+            exists().where(Preference.user_id == user_id),
+            exists().where(Interaction.user_id == user_id),
+        )
+    ).scalar()
+    return [] if has_profile else get_random_courses(db, limit=limit)
+
+
+def _record_enrollment(db: Session, user_id: int, course_id: int) -> None:
+    topic_id = (
+        db.query(models.Course.topic_id).filter(models.Course.id == course_id).scalar()
+    )
+    if topic_id is not None:
+        dashboard_rollups.enrollment(user_id, topic_id)
+
+
+def _progress_upsert(rows: list):
+    """
+    INSERT ... ON CONFLICT for interactions that only ever moves progress forward.
+
+    RETURNING yields the written rows plus an ``inserted`` flag (true for new
+    enrollments); rows whose progress did not increase are not returned.
+    """
+    table = models.CourseInteraction
+    stmt = pg_insert(table).values(rows)
+    return stmt.on_conflict_do_update(
+        constraint="uix_user_course",
+        set_={"course_progress": stmt.excluded.course_progress, "updated_at": func.now()},
+        where=table.course_progress < stmt.excluded.course_progress,
+    ).returning(table, literal_column("xmax = 0").label("inserted"))
+
+
+def create_course_interaction(db: Session, user_id: int, course_id: int):
+    stmt = (
+        pg_insert(models.CourseInteraction)
+        .values(user_id=user_id, course_id=course_id, course_progress=0)  # starts at 0%
+        .on_conflict_do_nothing(constraint="uix_user_course")
+        .returning(models.CourseInteraction)
+    )
+    new_interaction = db.scalars(stmt).first()
+    if new_interaction is None:
+        return None  # already enrolled
+
+    db.commit()
+    count_metric(db, models.AnalyticsMetric.enrollments)
+    recommendation_cache.invalidate_user(user_id)
+    _record_enrollment(db, user_id, course_id)
+    return new_interaction
 
 
 def get_course_interaction(db: Session, course_id: int, user_id: int) -> dict:
@@ -359,7 +636,15 @@ def get_course_interaction(db: Session, course_id: int, user_id: int) -> dict:
         .first()
     )
 
+    buffered = None
+    if get_progress_buffer_settings().PROGRESS_WRITE_BEHIND:
+        buffered = progress_buffer.pending_progress([(user_id, course_id)]).get(
+            (user_id, course_id)
+        )
+
     if not interaction:
+        if buffered is not None:
+            return {"user_id": user_id, "course_id": course_id, "course_progress": buffered}
         return {
             "user_id": user_id,
             "course_id": course_id,
@@ -370,7 +655,7 @@ def get_course_interaction(db: Session, course_id: int, user_id: int) -> dict:
     return {
         "user_id": interaction.user_id,
         "course_id": interaction.course_id,
-        "course_progress": interaction.course_progress,
+        "course_progress": max(interaction.course_progress, buffered or 0),
         "created_at": interaction.created_at,
         "updated_at": interaction.updated_at,
     }
@@ -378,31 +663,113 @@ def get_course_interaction(db: Session, course_id: int, user_id: int) -> dict:
 
 def update_course_progress(
     db: Session, user_id: int, course_id: int, new_progress: int
-):
-    interaction = (
-        db.query(models.CourseInteraction)
-        .filter_by(user_id=user_id, course_id=course_id)
-        .first()
-    )
-
-    if interaction:
-        if new_progress > interaction.course_progress:
-            interaction.course_progress = new_progress
-            db.commit()
-            db.refresh(interaction)
-    else:
-        # Create a new record
-        interaction = models.CourseInteraction(
-            user_id=user_id, course_id=course_id, course_progress=new_progress
+) -> dict:
+    """
+    Record a progress ping; returns ``{"user_id", "course_id", "course_progress"}``
+    with the progress now in effect, in both write-through and write-behind mode.
+    """
+    if get_progress_buffer_settings().PROGRESS_WRITE_BEHIND:
+        stored = (
+            db.query(models.CourseInteraction.course_progress)
+            .filter_by(user_id=user_id, course_id=course_id)
+            .scalar()
         )
-        db.add(interaction)
+        if stored is None and not course_exists(db, course_id):
+            raise HTTPException(status_code=404, detail="Course not found")
         try:
-            db.commit()
-            db.refresh(interaction)
-        except IntegrityError:
-            db.rollback()
+            buffered = progress_buffer.record(user_id, course_id, new_progress)
+            # Progress never goes back: report the stored value if it is higher
+            return _progress_result(user_id, course_id, max(buffered, stored or 0))
+        except redis_db.RedisError as exc:
+            log.warning("Progress buffer unavailable, writing through: %s", exc)
+
+    try:
+        row = db.execute(
+            _progress_upsert(
+                [{"user_id": user_id, "course_id": course_id, "course_progress": new_progress}]
+            )
+        ).first()
+    except IntegrityError:
+        # The course does not exist (or was deleted): no interaction to create
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Course not found")
+    if row is None:
+        # Progress did not move forward; nothing was written
+        stored = (
+            db.query(models.CourseInteraction.course_progress)
+            .filter_by(user_id=user_id, course_id=course_id)
+            .scalar()
+        )
+        return _progress_result(user_id, course_id, stored)
+
+    # A returned row means new_progress was written
+    _, inserted = row
+    db.commit()
+    count_metric(db, models.AnalyticsMetric.progress_updates)
+    if inserted:
+        count_metric(db, models.AnalyticsMetric.enrollments)
+        recommendation_cache.invalidate_user(user_id)
+        _record_enrollment(db, user_id, course_id)
+    return _progress_result(user_id, course_id, new_progress)
+
+
+def _progress_result(user_id: int, course_id: int, course_progress: int) -> dict:
+    return {"user_id": user_id, "course_id": course_id, "course_progress": course_progress}
+
+
+def flush_course_progress(db: Session, entries: dict, batch_size: int = 1000) -> int:
+    """
+    Persist buffered ``{(user_id, course_id): progress}`` with batched upserts.
 
-    return interaction
+    Progress only ever moves forward: rows are updated only when the buffered
+    value is higher. Entries for users or courses that no longer exist are
+    dropped, since one such row would fail the whole flush on every retry.
+    Returns the number of rows written.
+    """
+    if not entries:
+        return 0
+    existing_users = set(db.scalars(
+        select(models.User.id).where(models.User.id.in_({user_id for user_id, _ in entries}))
+    ))
+    existing_courses = set(db.scalars(
+        select(models.Course.id).where(models.Course.id.in_({course_id for _, course_id in entries}))
+    ))
+    items = [
+        ((user_id, course_id), progress)
+        for (user_id, course_id), progress in entries.items()
+        if user_id in existing_users and course_id in existing_courses
+    ]
+    if len(items) < len(entries):
+        log.warning("Dropped %d buffered progress updates for deleted users or courses", len(entries) - len(items))
+    written, enrolled = 0, []
+
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        rows = db.execute(
+            _progress_upsert(
+                [
+                    {"user_id": user_id, "course_id": course_id, "course_progress": progress}
+                    for (user_id, course_id), progress in batch
+                ]
+            )
+        ).all()
+        written += len(rows)
+        enrolled.extend(
+            (interaction.user_id, interaction.course_id)
+            for interaction, inserted in rows
+            if inserted
+        )
+
+    db.commit()
+    if written:
+        count_metric(db, models.AnalyticsMetric.progress_updates, amount=written)
+    if enrolled:
+        count_metric(db, models.AnalyticsMetric.enrollments, amount=len(enrolled))
+
+    for user_id, course_id in enrolled:
+        recommendation_cache.invalidate_user(user_id)
+        _record_enrollment(db, user_id, course_id)
+    return written
 
 
 def get_passed_quiz_section(db: Session, user_id: int, course_id: int):
@@ -428,17 +795,35 @@ def insert_quiz_question(
     )
     db.add(record)
     db.commit()
+    dashboard_rollups.quizzes_added(1)
 
 
-def get_quizes(db: Session, course_id: int, section_index: int):
-    course = db.query(models.Course).filter_by(id=course_id).first()
-    if not course:
-        raise HTTPException(status_code=404, detail="Course not found")
-    return (
+def get_course_quiz_sections(db: Session, course_id: int) -> dict:
+    """
+    Every quiz of a course in one query, as ``{section_index: [quiz, ...]}``.
+    """
+    quizzes = (
         db.query(models.SectionQuiz)
-        .filter_by(course_id=course_id, section_index=section_index)
+        .filter(models.SectionQuiz.course_id == course_id)
+        .order_by(models.SectionQuiz.section_index, models.SectionQuiz.id)
         .all()
     )
+    sections = {}
+    for q in quizzes:
+        sections.setdefault(q.section_index, []).append(
+            {
+                "id": q.id,
+                "question": q.data.get("question"),
+                "options": q.data.get("options"),
+                "correctAnswer": q.data.get("correctAnswer"),
+                "hint": q.data.get("hint"),
+            }
+        )
+    return sections
+
+
+def course_exists(db: Session, course_id: int) -> bool:
+    return db.query(exists().where(models.Course.id == course_id)).scalar()
 
 @lru_cache(maxsize=256, typed=False)
 def get_course_by_id(db: Session, course_id: int):
@@ -467,25 +852,26 @@ def mark_quiz_passed(db: Session, user_id: int, course_id: int, section_index: i
     if not section_quiz:
         raise HTTPException(status_code=404, detail="Section quiz not found")
 
-    record = (
-        db.query(models.CourseSectionQuizProgress)
-        .filter_by(user_id=user_id, course_id=course_id, section_index=section_index)
-        .first()
+    progress = models.CourseSectionQuizProgress
+    stmt = pg_insert(progress).values(
+        user_id=user_id,
+        course_id=course_id,
+        section_index=section_index,
+        passed=True,
+        passed_at=func.now(),
     )
-    if record:
-        if not record.passed:  # idempotent
-            record.passed = True
-            record.passed_at = datetime.now()
-    else:
-        record = models.CourseSectionQuizProgress(
-            user_id=user_id,
-            course_id=course_id,
-            section_index=section_index,
-            passed=True,
-            passed_at=datetime.now(),
-        )
-        db.add(record)
-        db.commit()
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[progress.user_id, progress.course_id, progress.section_index],
+        set_={"passed": True, "passed_at": stmt.excluded.passed_at},
+        where=progress.passed == False,  # idempotent: an earlier pass is kept
+    ).returning(progress)
+    record = db.scalars(stmt).first()
+    if record is None:
+        return db.get(progress, (user_id, course_id, section_index))
+
+    db.commit()
+    count_metric(db, models.AnalyticsMetric.quiz_passes)
+    dashboard_rollups.quiz_passed()
     return record
 
 
@@ -520,6 +906,84 @@ def accept_reset_code(db: Session, reset_entry: models.PendingVerificationCode):
     return reset_entry
 
 
+def issue_verification_code(
+    db: Session, purpose: str, email: str, code: str, expiry_time: datetime, user_id: int = None
+) -> None:
+    """
+    Store a one-time code in Redis, or in the Postgres tables if Redis is down.
+    """
+    try:
+        otp_store.issue(purpose, email, code)
+        return
+    except redis_db.RedisError as exc:
+        log.warning("OTP store unavailable, falling back to Postgres: %s", exc)
+
+    if purpose == otp_store.PASSWORD_RESET:
+        delete_old_pending_code(db, user_id=user_id)
+        insert_log_in_code_forgot_password(db, code=code, user_id=user_id, expiry_time=expiry_time)
+    else:
+        insert_log_in_code(db, code=code, user_id=None, expiry_time=expiry_time, email=email)
+
+
+def verify_verification_code(
+    db: Session, purpose: str, email: str, code: str, user_id: int = None
+) -> str:
+    """
+    Check a code and burn it on success. Returns one of the ``otp_store`` statuses.
+    """
+    try:
+        return otp_store.verify(purpose, email, code)
+    except redis_db.RedisError as exc:
+        log.warning("OTP store unavailable, falling back to Postgres: %s", exc)
+
+    if purpose == otp_store.PASSWORD_RESET:
+        entry = get_pending_code_by_user(db, user_id=user_id)
+        if not entry:
+            return otp_store.EXPIRED
+        if entry.code != code:
+            return otp_store.INVALID
+        entry.status = "accepted"
+        db.commit()
+        return otp_store.VERIFIED
+
+    entry = get_pending_code_by_email(db, email=email)
+    if not entry or entry.expiry_time < datetime.now():
+        return otp_store.EXPIRED
+    if entry.code != code:
+        return otp_store.INVALID
+    accept_reset_code(db, reset_entry=entry)
+    return otp_store.VERIFIED
+
+
+def purge_verification_codes(db: Session) -> int:
+    """
+    Delete expired and used codes from the fallback tables.
+    """
+    now = datetime.now()
+    purged = (
+        db.query(models.PendingVerificationCode)
+        .filter(
+            or_(
+                models.PendingVerificationCode.expiry_time < now,
+                models.PendingVerificationCode.accepted == True,
+            )
+        )
+        .delete(synchronize_session=False)
+    )
+    purged += (
+        db.query(models.PasswordResetCode)
+        .filter(
+            or_(
+                models.PasswordResetCode.expiry_time < now,
+                models.PasswordResetCode.status != "pending",
+            )
+        )
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return purged
+
+
 def get_completed_courses(db: Session, user_id: int):
     return (
         db.query(models.Course)
@@ -594,25 +1058,305 @@ def get_quizzes_completion_stats(db: Session):
 def get_daily_new_users_last_7_days(db: Session):
     today = datetime.now(timezone.utc).date()
     seven_days_ago = today - timedelta(days=6)
+    series = get_metric_series(
+        db, models.AnalyticsMetric.signups, start=seven_days_ago, end=today, granularity="day"
+    )
+    return [{"date": point["period"], "count": point["count"]} for point in series]
 
-    results = (
-        db.query(
-            cast(models.User.created_at, DATE).label("date"),
-            func.count(models.User.id).label("user_count"),
+
+def get_topic_titles(db: Session) -> dict:
+    return {topic_id: title or "" for topic_id, title in db.query(models.Topic.id, models.Topic.title)}
+
+
+def get_topic_user_pairs(db: Session, batch_size: int = 10000):
+    """
+    Distinct (topic_id, user_id) pairs from enrollments, for rollup reconciliation.
+    """
+    return (
+        db.query(models.Course.topic_id, models.CourseInteraction.user_id)
+        .join(models.Course, models.Course.id == models.CourseInteraction.course_id)
+        .distinct()
+        .yield_per(batch_size)
+    )
+
+
+def get_daily_new_users(db: Session, days: int = 30) -> dict:
+    """
+    Signups per UTC day for the last ``days`` days, keyed by ISO date.
+    """
+    today = datetime.now(timezone.utc).date()
+    series = get_metric_series(
+        db,
+        models.AnalyticsMetric.signups,
+        start=today - timedelta(days=days - 1),
+        end=today,
+        granularity="day",
+    )
+    return {point["period"]: point["count"] for point in series if point["count"]}
+
+
+# =================================================================
+# Time-series analytics
+
+
+def record_metric(db: Session, metric: models.AnalyticsMetric, amount: int = 1, at: datetime = None):
+    """
+    Add ``amount`` to the daily and hourly buckets of ``metric`` in Postgres.
+
+    Only used when Redis is unavailable; events normally go through
+    ``count_metric``.
+    """
+    at = (at or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    hour = at.replace(minute=0, second=0, microsecond=0)
+    fold_metric_counts(db, {
+        (metric.value, metric_counters.DAY, hour.date()): amount,
+        (metric.value, metric_counters.HOUR, hour): amount,
+    })
+
+
+def count_metric(db: Session, metric: models.AnalyticsMetric, amount: int = 1):
+    """
+    Count events after the caller's commit, in Redis (``metric_counters``),
+    so requests do not hold locks on the shared analytics rows. Falls back to
+    writing Postgres directly when Redis is unavailable.
+    """
+    if metric_counters.record(metric.value, amount):
+        return
+    record_metric(db, metric, amount)
+    db.commit()
+
+
+def fold_metric_counts(db: Session, counts: dict, lock_token: Optional[str] = None) -> None:
+    """
+    Add ``{(metric, bucket, period): count}`` to the analytics tables, one
+    upsert per table. Runs in the caller's transaction.
+
+    With ``lock_token`` (a flush from ``metric_counters.take_for_flush``), the
+    flush lock is checked and renewed last, so the caller's commit fails
+    instead of counting twice when another flush has taken over.
+    """
+    for model, bucket in (
+        (models.DailyMetric, metric_counters.DAY),
+        (models.HourlyMetric, metric_counters.HOUR),
+    ):
+        rows = [
+            {"metric": metric, bucket: period, "count": count}
+            for (metric, row_bucket, period), count in counts.items()
+            if row_bucket == bucket and count
+        ]
+        if not rows:
+            continue
+        stmt = pg_insert(model).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[model.metric, getattr(model, bucket)],
+            set_={"count": model.count + stmt.excluded.count},
         )
-        .filter(cast(models.User.created_at, DATE) >= seven_days_ago)
-        .group_by("date")
-        .order_by("date")
+        db.execute(stmt)
+
+    if lock_token is not None and not metric_counters.hold_flush_lock(lock_token):
+        raise RuntimeError("Analytics flush lock expired; leaving the counts to the next flush")
+
+
+_SERIES_STEP = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+
+def _series_periods(start, end, granularity: str) -> list:
+    if granularity in _SERIES_STEP:
+        step, current, periods = _SERIES_STEP[granularity], start, []
+        while current <= end:
+            periods.append(current)
+            current += step
+        return periods
+
+    # week (ISO, starting Monday) and month buckets
+    if granularity == "week":
+        current = start - timedelta(days=start.weekday())
+    else:
+        current = start.replace(day=1)
+    periods = []
+    while current <= end:
+        periods.append(current)
+        if granularity == "week":
+            current += timedelta(days=7)
+        else:
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return periods
+
+
+def get_metric_series(
+    db: Session,
+    metric: models.AnalyticsMetric,
+    start,
+    end,
+    granularity: str = "day",
+) -> list:
+    """
+    Counts of ``metric`` per bucket between ``start`` and ``end`` (inclusive).
+
+    ``hour`` reads the hourly table (``start``/``end`` are UTC datetimes);
+    ``day``, ``week`` and ``month`` read the daily table (``start``/``end`` are
+    dates). Missing buckets are returned as zero.
+    """
+    if granularity == "hour":
+        start = start.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        end = end.astimezone(timezone.utc)
+        model, column = models.HourlyMetric, models.HourlyMetric.hour
+        bucket = column
+    else:
+        model, column = models.DailyMetric, models.DailyMetric.day
+        bucket = column if granularity == "day" else cast(func.date_trunc(granularity, column), DATE)
+
+    rows = (
+        db.query(bucket.label("period"), func.sum(model.count).label("count"))
+        .filter(model.metric == metric.value, column >= start, column <= end)
+        .group_by(bucket)
         .all()
     )
+    counts = {
+        (period.astimezone(timezone.utc) if granularity == "hour" else period): int(count)
+        for period, count in rows
+    }
+    return [
+        {"period": period.isoformat(), "count": counts.get(period, 0)}
+        for period in _series_periods(start, end, granularity)
+    ]
+
+
+def backfill_metrics(db: Session) -> None:
+    """
+    Rebuild the aggregate tables from the raw event tables.
+
+    ``progress_updates`` has no raw history and is left untouched. This is the
+    only analytics code path that scans raw tables; migration 6 runs it once,
+    the ``backfill_analytics`` task on demand.
+    """
+    sources = (
+        (models.AnalyticsMetric.signups, models.User.created_at),
+        (models.AnalyticsMetric.enrollments, models.CourseInteraction.created_at),
+        (models.AnalyticsMetric.quiz_passes, models.CourseSectionQuizProgress.passed_at),
+    )
+    for metric, timestamp in sources:
+        hour = func.date_trunc("hour", func.timezone("UTC", timestamp))
+        for model, bucket, expression in (
+            (models.HourlyMetric, "hour", func.timezone("UTC", hour)),
+            (models.DailyMetric, "day", cast(hour, DATE)),
+        ):
+            db.query(model).filter(model.metric == metric.value).delete()
+            rows = (
+                select(literal(metric.value), expression, func.count())
+                .where(timestamp.is_not(None))
+                .group_by(expression)
+            )
+            db.execute(
+                pg_insert(model).from_select(["metric", bucket, "count"], rows)
+            )
+    db.commit()
 
-    counts_by_date = {record.date.isoformat(): record.user_count for record in results}
 
-    daily_counts = []
-    for i in range(7):
-        day = seven_days_ago + timedelta(days=i)
-        daily_counts.append(
-            {"date": day.isoformat(), "count": counts_by_date.get(day.isoformat(), 0)}
+# =================================================================
+# Full-text search
+
+SEARCH_CONFIG = "english"
+
+
+def _weighted(text_value, weight: str):
+    return func.setweight(func.to_tsvector(SEARCH_CONFIG, func.coalesce(text_value, "")), weight)
+
+
+def _topic_vector(topic_title, topic_description):
+    return _weighted(topic_title, "B").op("||")(_weighted(topic_description, "C"))
+
+
+def index_course_for_search(db: Session, course_id: int, course_details: dict) -> None:
+    """
+    Upsert the search vector of a course from its SQL row and generated content.
+
+    Weights: course title A, description and topic title B, section titles and
+    topic description C, subsection titles and content D. Runs inside the
+    caller's transaction.
+    """
+    sections = course_details.get("sections", [])
+    section_titles = "\n".join(section.get("section_title", "") for section in sections)
+    body = "\n".join(
+        f"{sub.get('title', '')}\n{sub.get('content', '')}"
+        for section in sections
+        for sub in section.get("subsections", [])
+    )
+
+    content = (
+        _weighted(models.Course.course_title, "A")
+        .op("||")(_weighted(models.Course.course_description, "B"))
+        .op("||")(_weighted(literal(section_titles), "C"))
+        .op("||")(_weighted(literal(body), "D"))
+    )
+    topic = _topic_vector(models.Topic.title, models.Topic.description)
+    rows = (
+        select(
+            models.Course.id,
+            models.Course.topic_id,
+            content,
+            topic,
+            content.op("||")(topic),
+        )
+        .join(models.Topic, models.Topic.id == models.Course.topic_id)
+        .where(models.Course.id == course_id)
+    )
+    stmt = pg_insert(models.CourseSearchDocument).from_select(
+        ["course_id", "topic_id", "content_tsv", "topic_tsv", "document"], rows
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.CourseSearchDocument.course_id],
+            set_={
+                "topic_id": stmt.excluded.topic_id,
+                "content_tsv": stmt.excluded.content_tsv,
+                "topic_tsv": stmt.excluded.topic_tsv,
+                "document": stmt.excluded.document,
+                "updated_at": func.now(),
+            },
         )
+    )
+
+
+def refresh_topic_search(db: Session, topic: models.Topic) -> None:
+    """
+    Re-vectorize the topic part of every search document of ``topic``.
+    """
+    documents = models.CourseSearchDocument
+    topic_tsv = _topic_vector(literal(topic.title), literal(topic.description))
+    db.query(documents).filter(documents.topic_id == topic.id).update(
+        {
+            documents.topic_tsv: topic_tsv,
+            documents.document: documents.content_tsv.op("||")(topic_tsv),
+        },
+        synchronize_session=False,
+    )
+
+
+def search_courses(db: Session, query: str, limit: int = 20, offset: int = 0) -> tuple:
+    """
+    Ranked full-text search over built courses.
+
+    Accepts web-search syntax (quoted phrases, ``or``, ``-exclude``). Returns
+    ``([(Course, rank), ...], has_more)``.
+    """
+    documents = models.CourseSearchDocument
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+    rank = func.ts_rank_cd(documents.document, ts_query, 32).label("rank")
+    rows = (
+        db.query(models.Course, rank)
+        .join(documents, documents.course_id == models.Course.id)
+        .filter(
+            documents.document.op("@@")(ts_query),
+            models.Course.is_detail_created_by_ai == True,
+        )
+        .order_by(rank.desc(), models.Course.id)
+        .offset(offset)
+        .limit(limit + 1)
+        .all()
+    )
+    return rows[:limit], len(rows) > limit
 
-    return daily_counts
@@ -1,23 +1,71 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from config import get_settings
+from sqlalchemy.pool import NullPool, QueuePool
+from config import get_db_pool_settings, get_settings
 
 POSTGRESS_DB = get_settings()
 SQLALCHEMY_DATABASE_URL = f"postgresql://{POSTGRESS_DB.DB_USER}:{POSTGRESS_DB.DB_PASSWORD}@{'db'}/{POSTGRESS_DB.DB_NAME}"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL
-)
+POOL_SETTINGS = get_db_pool_settings()
+
+if POOL_SETTINGS.DB_PGBOUNCER:
+    # PgBouncer already pools server connections, and in transaction mode it
+    # rejects the `options` startup parameter: set statement_timeout on the
+    # database role instead (ALTER ROLE ... SET statement_timeout = ...)
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        poolclass=NullPool,
+        pool_pre_ping=POOL_SETTINGS.DB_POOL_PRE_PING,
+        connect_args={"connect_timeout": POOL_SETTINGS.DB_CONNECT_TIMEOUT},
+    )
+else:
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        poolclass=QueuePool,
+        pool_size=POOL_SETTINGS.DB_POOL_SIZE,
+        max_overflow=POOL_SETTINGS.DB_MAX_OVERFLOW,
+        pool_timeout=POOL_SETTINGS.DB_POOL_TIMEOUT,
+        pool_recycle=POOL_SETTINGS.DB_POOL_RECYCLE,
+        pool_pre_ping=POOL_SETTINGS.DB_POOL_PRE_PING,
+        connect_args={
+            "connect_timeout": POOL_SETTINGS.DB_CONNECT_TIMEOUT,
+            "options": f"-c statement_timeout={POOL_SETTINGS.DB_STATEMENT_TIMEOUT_MS}",
+        },
+    )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# statement_timeout guards web requests. Celery jobs (backfills, reindexing)
+# legitimately run longer, so their sessions lift it for each transaction.
+BatchSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@event.listens_for(BatchSessionLocal, "after_begin")
+def _lift_statement_timeout(session, transaction, connection):
+    connection.exec_driver_sql("SET LOCAL statement_timeout = 0")
+
+
 Base = declarative_base()
 
 
+def pool_status() -> dict:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"mode": "pgbouncer"}
+    return {
+        "mode": "pooled",
+        "size": pool.size(),
+        "max_overflow": POOL_SETTINGS.DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
+
 # Dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
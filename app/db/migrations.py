@@ -0,0 +1,287 @@
+"""
+Versioned schema migrations for Postgres, plus Mongo index bootstrap.
+
+Migrations are applied in order, each in its own transaction, and recorded in
+``schema_migrations``. They run as a deploy step (the ``migrate`` service in
+docker-compose) before the web and worker processes start; the web lifespan
+only checks the recorded version with ``check_current``. A Postgres advisory
+lock serialises concurrent runners, so each migration is applied exactly once.
+
+Usage:
+    python -m app.db.migrations           # apply pending migrations + Mongo indexes
+    python -m app.db.migrations status    # list applied / pending versions
+    python -m app.db.migrations course-layout sectioned [--drop-source]
+                                          # move Mongo course content to a layout
+    python -m app.db.migrations course-content
+                                          # re-encode it per CONTENT_COMPRESSION, pre-render HTML
+
+To add a migration, append ``(next_version, "name", function)`` to
+``MIGRATIONS``. The function receives a Connection inside a transaction and
+must be idempotent against databases created by the baseline (``create_all``
+creates tables with the current model's indexes already in place).
+
+The baseline only runs once per database, so a new model table or index needs
+its own migration. ``upgrade`` fails when a table or index declared in the
+models is still missing after the last migration.
+"""
+
+import logging
+import sys
+
+from sqlalchemy import inspect, text
+
+from app.db import models
+
+log = logging.getLogger(__name__)
+
+# Arbitrary constant shared by every runner
+MIGRATION_LOCK_ID = 724_310_001
+
+
+def _baseline(conn):
+    # Creates missing tables only; existing tables are left untouched
+    models.Base.metadata.create_all(bind=conn)
+
+
+def _section_quiz_lookup_index(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS index_section_quiz_course_section "
+        "ON section_quizzes (course_id, section_index)"
+    ))
+
+
+def _unique_user_topic_preference(conn):
+    # Keep the oldest row of each duplicate pair before adding the constraint
+    conn.execute(text(
+        "DELETE FROM user_topic_preference a "
+        "USING user_topic_preference b "
+        "WHERE a.user_id = b.user_id AND a.topic_id = b.topic_id AND a.id > b.id"
+    ))
+    conn.execute(text(
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uix_user_topic') THEN
+                ALTER TABLE user_topic_preference
+                    ADD CONSTRAINT uix_user_topic UNIQUE (user_id, topic_id);
+            END IF;
+        END
+        $$
+        """
+    ))
+
+
+def _verification_code_indexes(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_pending_verification_codes_email "
+        "ON pending_verification_codes (email)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_password_reset_codes_user_id "
+        "ON password_reset_codes (user_id)"
+    ))
+
+
+def _course_topic_built_index(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS index_course_topic_built "
+        "ON courses (topic_id, id) WHERE is_detail_created_by_ai = true"
+    ))
+
+
+def _analytics_backfill(conn):
+    # Databases whose baseline predates the analytics tables get them here;
+    # without the backfill the dashboard shows no signups before this deploy
+    from sqlalchemy.orm import Session
+
+    from app.db import crud
+
+    models.Base.metadata.create_all(
+        bind=conn, tables=[models.DailyMetric.__table__, models.HourlyMetric.__table__]
+    )
+    # The session joins this transaction; its commit does not end it
+    crud.backfill_metrics(Session(bind=conn))
+
+
+MIGRATIONS = [
+    (1, "baseline", _baseline),
+    (2, "section_quiz_lookup_index", _section_quiz_lookup_index),
+    (3, "unique_user_topic_preference", _unique_user_topic_preference),
+    (4, "verification_code_indexes", _verification_code_indexes),
+    (5, "course_topic_built_index", _course_topic_built_index),
+    (6, "analytics_backfill", _analytics_backfill),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """
+    ))
+
+
+def _applied_versions(conn) -> set:
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def upgrade(engine) -> list:
+    """
+    Apply pending migrations; returns the versions applied by this call.
+    """
+    applied_now = []
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        conn.commit()
+        try:
+            with conn.begin():
+                _ensure_version_table(conn)
+                done = _applied_versions(conn)
+
+            for version, name, migrate in MIGRATIONS:
+                if version in done:
+                    continue
+                with conn.begin():
+                    # Index builds and backfills may outlast the web statement_timeout
+                    conn.execute(text("SET LOCAL statement_timeout = 0"))
+                    migrate(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                        {"version": version, "name": name},
+                    )
+                log.info("Applied migration %04d_%s", version, name)
+                applied_now.append(version)
+            missing = missing_schema(conn)
+            conn.rollback()
+            if missing:
+                raise RuntimeError(
+                    f"Schema still lacks {', '.join(missing)} after the last migration: "
+                    "add a migration that creates them."
+                )
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+            conn.commit()
+    return applied_now
+
+
+def missing_schema(conn) -> list:
+    """
+    Tables and indexes declared in the models that the database lacks.
+    """
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    missing = []
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in existing:
+            missing.append(f"table {table.name}")
+            continue
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing += [
+            f"index {index.name} on {table.name}"
+            for index in table.indexes
+            if index.name not in indexes
+        ]
+    return missing
+
+
+def check_current(engine) -> None:
+    """
+    Refuse to start on a database that is behind the code; migrations are
+    applied by ``python -m app.db.migrations`` before the app starts.
+    """
+    with engine.connect() as conn:
+        exists = conn.execute(text("SELECT to_regclass('schema_migrations')")).scalar()
+        done = _applied_versions(conn) if exists else set()
+    pending = [f"{version:04d}_{name}" for version, name, _ in MIGRATIONS if version not in done]
+    if pending:
+        raise RuntimeError(
+            f"Pending migrations {', '.join(pending)}: run `python -m app.db.migrations` first."
+        )
+
+
+def status(engine) -> list:
+    """
+    ``[(version, name, applied), ...]`` for every known migration.
+    """
+    with engine.connect() as conn:
+        _ensure_version_table(conn)
+        conn.commit()
+        done = _applied_versions(conn)
+    return [(version, name, version in done) for version, name, _ in MIGRATIONS]
+
+
+# pymongo.ASCENDING; pymongo itself is only imported with the first Mongo client
+ASCENDING = 1
+
+# (collection, keys, options). create_index is a no-op when the index exists.
+MONGO_INDEXES = [
+    ("courses", [("course_id", ASCENDING)], {"name": "course_id_unique", "unique": True}),
+    ("course_blobs", [("course_id", ASCENDING)], {"name": "course_id_unique", "unique": True}),
+    ("course_headers", [("course_id", ASCENDING)], {"name": "course_id_unique", "unique": True}),
+    (
+        "course_sections",
+        [("course_id", ASCENDING), ("section_index", ASCENDING)],
+        {"name": "course_section_unique", "unique": True},
+    ),
+    ("content_dictionaries", [("dict_id", ASCENDING)], {"name": "dict_id_unique", "unique": True}),
+]
+
+DUPLICATE_KEY_CODE = 11000
+
+
+def ensure_mongo_indexes(mongo_db) -> None:
+    from pymongo.errors import OperationFailure
+
+    for collection, keys, options in MONGO_INDEXES:
+        try:
+            mongo_db[collection].create_index(keys, **options)
+        except OperationFailure as exc:
+            if exc.code != DUPLICATE_KEY_CODE:
+                raise
+            # Duplicates from before the index existed: still index the lookup path
+            log.error("Duplicate %s in %s, creating a non-unique index: %s", keys, collection, exc)
+            mongo_db[collection].create_index(keys, name=f"{options['name']}_lookup")
+
+
+def main(argv: list) -> int:
+    from app.db.database import engine
+    from app.db.mongo_db import get_mongo_db
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    command = argv[0] if argv else "upgrade"
+    if command == "status":
+        for version, name, applied in status(engine):
+            print(f"{version:04d}_{name}: {'applied' if applied else 'pending'}")
+        return 0
+    if command == "upgrade":
+        applied = upgrade(engine)
+        ensure_mongo_indexes(get_mongo_db())
+        print(f"Applied {len(applied)} migration(s); Mongo indexes ensured.")
+        return 0
+    if command == "course-layout" and len(argv) > 1:
+        from app.services import course_store
+
+        ensure_mongo_indexes(get_mongo_db())
+        migrated = course_store.migrate(get_mongo_db(), argv[1], drop_source="--drop-source" in argv[2:])
+        print(f"Moved {migrated} course(s) to the {argv[1]} layout.")
+        return 0
+    if command == "course-content":
+        from app.services import course_store
+
+        rewritten = course_store.rewrite(get_mongo_db())
+        print(f"Re-encoded and pre-rendered {rewritten} course(s).")
+        return 0
+    print(
+        f"Unknown command {command!r}; expected 'upgrade', 'status', 'course-layout <layout>'"
+        " or 'course-content'.",
+        file=sys.stderr,
+    )
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
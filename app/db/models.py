@@ -2,8 +2,10 @@ import enum
 from datetime import datetime
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
+    Date,
     DateTime,
     Enum,
     ForeignKey,
@@ -13,7 +15,7 @@ from sqlalchemy import (
     UniqueConstraint,
     func,
 )
-from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.dialects.postgresql import JSON, TSVECTOR
 from sqlalchemy.orm import relationship
 
 from app.db.database import Base
@@ -24,6 +26,13 @@ class UserRole(str, enum.Enum):
     user = "user"
 
 
+class AnalyticsMetric(str, enum.Enum):
+    signups = "signups"
+    enrollments = "enrollments"
+    progress_updates = "progress_updates"
+    quiz_passes = "quiz_passes"
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -83,6 +92,10 @@ class UserTopicPreference(Base):
     user = relationship("User", back_populates="topic_preferences")
     topic = relationship("Topic", back_populates="user_preferences")
 
+    __table_args__ = (
+        UniqueConstraint("user_id", "topic_id", name="uix_user_topic"),
+    )
+
 
 class Course(Base):
     __tablename__ = "courses"
@@ -104,14 +117,23 @@ class Course(Base):
         back_populates="course",
         cascade="all, delete-orphan",  # ✅ this line is essential
     )
-    __table_args__ = (Index("index_course_topic", "topic_id"),)
+    __table_args__ = (
+        Index("index_course_topic", "topic_id"),
+        # Ordered walks of a topic's built courses (recommendation sampling)
+        Index(
+            "index_course_topic_built",
+            "topic_id",
+            "id",
+            postgresql_where=is_detail_created_by_ai == True,
+        ),
+    )
 
 
 class PasswordResetCode(Base):
     __tablename__ = "password_reset_codes"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)  # 👈 foreign key
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)  # 👈 foreign key
     code = Column(String(6), nullable=False)
     expiry_time = Column(DateTime, nullable=False)
     status = Column(String(20), nullable=False, default="pending")
@@ -124,7 +146,7 @@ class PendingVerificationCode(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     code = Column(String(6), nullable=False)
-    email = Column(String, nullable=False)
+    email = Column(String, nullable=False, index=True)
     expiry_time = Column(DateTime, nullable=False)
     accepted = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -187,3 +209,55 @@ class SectionQuiz(Base):
     course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"))
     section_index = Column(Integer, nullable=False)
     data = Column(JSON, nullable=False)
+
+    __table_args__ = (
+        Index("index_section_quiz_course_section", "course_id", "section_index"),
+    )
+
+
+class DailyMetric(Base):
+    """
+    Per UTC day event counts, folded in from Redis by ``flush_analytics_counters``.
+    """
+
+    __tablename__ = "analytics_daily"
+
+    metric = Column(String(32), primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class HourlyMetric(Base):
+    __tablename__ = "analytics_hourly"
+
+    metric = Column(String(32), primary_key=True)
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+
+
+class CourseSearchDocument(Base):
+    """
+    Full-text search vector of a built course.
+
+    ``content_tsv`` covers the course and its generated sections, ``topic_tsv``
+    the topic, so a topic edit only rewrites the latter. ``document`` is their
+    concatenation and carries the GIN index.
+    """
+
+    __tablename__ = "course_search_documents"
+
+    course_id = Column(
+        Integer, ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True
+    )
+    topic_id = Column(
+        Integer, ForeignKey("topics.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    content_tsv = Column(TSVECTOR, nullable=False)
+    topic_tsv = Column(TSVECTOR, nullable=False)
+    document = Column(TSVECTOR, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("index_course_search_document", "document", postgresql_using="gin"),
+    )
+
@@ -1,17 +1,62 @@
+from functools import lru_cache
 
-from config import  get_mongo_cred
-from pymongo import MongoClient
-
-MONGO_CRED = get_mongo_cred()
-MONGO_USER = MONGO_CRED.MONGO_INITDB_ROOT_USERNAME
-MONGO_PASS = MONGO_CRED.MONGO_INITDB_ROOT_PASSWORD
-MONGO_DB = MONGO_CRED.MONGO_DB_NAME
+from config import get_mongo_cred, get_mongo_pool_settings
 
 MONGO_HOST = "mongo"  # This is the docker-compose service name
 MONGO_PORT = 27017
 
-MONGO_URI = f"mongodb://{MONGO_USER}:{MONGO_PASS}@{MONGO_HOST}:{MONGO_PORT}/{MONGO_DB}?authSource=admin"
 
-print(MONGO_URI)
-client = MongoClient(MONGO_URI)
-mongodb_client = client[MONGO_DB]
\ No newline at end of file
+@lru_cache
+def get_mongo_client():
+    """
+    Process-wide client, created on first use so importing this module never
+    imports pymongo, opens connections or starts pymongo's monitor threads.
+    """
+    from pymongo import MongoClient
+
+    from app.db.mongo_monitoring import command_timer, pool_usage
+
+    cred = get_mongo_cred()
+    pool_settings = get_mongo_pool_settings()
+    return MongoClient(
+        f"mongodb://{cred.MONGO_INITDB_ROOT_USERNAME}:{cred.MONGO_INITDB_ROOT_PASSWORD}"
+        f"@{MONGO_HOST}:{MONGO_PORT}/{cred.MONGO_DB_NAME}?authSource=admin",
+        maxPoolSize=pool_settings.MONGO_MAX_POOL_SIZE,
+        minPoolSize=pool_settings.MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=pool_settings.MONGO_MAX_IDLE_TIME_MS,
+        waitQueueTimeoutMS=pool_settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        connectTimeoutMS=pool_settings.MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=pool_settings.MONGO_SOCKET_TIMEOUT_MS,
+        serverSelectionTimeoutMS=pool_settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[pool_usage, command_timer],
+    )
+
+
+def get_mongo_db():
+    return get_mongo_client()[get_mongo_cred().MONGO_DB_NAME]
+
+
+def close_mongo_client() -> None:
+    if get_mongo_client.cache_info().currsize:
+        get_mongo_client().close()
+        get_mongo_client.cache_clear()
+
+
+def pool_status() -> dict:
+    status = {
+        "max_pool_size": get_mongo_pool_settings().MONGO_MAX_POOL_SIZE,
+        "open": 0,
+        "checked_out": 0,
+        "waiting": 0,
+        "checkout_failures": 0,
+    }
+    if get_mongo_client.cache_info().currsize:
+        from app.db.mongo_monitoring import pool_usage
+
+        status.update(
+            open=pool_usage.open,
+            checked_out=pool_usage.checked_out,
+            waiting=pool_usage.waiting,
+            checkout_failures=pool_usage.checkout_failures,
+        )
+    return status
@@ -0,0 +1,83 @@
+"""
+pymongo event listeners registered on the client by ``mongo_db.get_mongo_client``.
+
+Kept apart from ``mongo_db`` so that pymongo, which the listener base classes
+come from, is only imported together with the first client.
+"""
+
+import threading
+
+from pymongo import monitoring
+
+from app.services import metrics
+
+
+class PoolUsageListener(monitoring.ConnectionPoolListener):
+    """
+    Counts connections per process; pymongo has no public pool statistics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkout_failures = 0
+
+    def _add(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._add(open=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add(open=-1)
+
+    def connection_check_out_started(self, event):
+        self._add(waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._add(waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._add(waiting=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._add(checked_out=-1)
+
+
+class CommandTimer(monitoring.CommandListener):
+    """
+    Events carry their own duration, so nothing is kept between started and
+    finished.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        metrics.observe_mongo_command(event.command_name, event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        metrics.observe_mongo_command(event.command_name, event.duration_micros / 1_000_000, failed=True)
+
+
+pool_usage = PoolUsageListener()
+command_timer = CommandTimer()
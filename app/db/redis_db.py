@@ -0,0 +1,70 @@
+"""
+Redis clients, created on first use.
+
+Importing redis loads its asyncio and cluster clients too, which is a large
+share of the web tier's startup, so nothing here imports it before the first
+client is built. Lua scripts are registered on their first call for the same
+reason, and callers catch ``redis_db.RedisError``, which is only resolved
+when an exception is being matched.
+"""
+
+from functools import lru_cache
+
+from config import get_redis_client_settings, get_redis_cred
+
+
+@lru_cache
+def get_redis_client():
+    """
+    Process-wide client returning ``str``. Connections are opened lazily on
+    the first command.
+    """
+    import redis
+
+    return redis.Redis.from_url(get_redis_cred().REDIS_URL, decode_responses=True, **_timeouts())
+
+
+@lru_cache
+def get_redis_binary_client():
+    """
+    Same server, raw bytes in and out (numpy buffers and other binary payloads).
+    """
+    import redis
+
+    return redis.Redis.from_url(get_redis_cred().REDIS_URL, **_timeouts())
+
+
+def _timeouts() -> dict:
+    # Callers sit in request and checkout paths; a hung Redis must fail fast, not block them
+    settings = get_redis_client_settings()
+    return {
+        "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT,
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+    }
+
+
+class LazyScript:
+    """
+    Lua script registered with the ``str`` client on its first call.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._script = None
+
+    def __call__(self, keys=(), args=(), client=None):
+        if self._script is None:
+            self._script = get_redis_client().register_script(self.source)
+        return self._script(keys=list(keys), args=list(args), client=client)
+
+
+def register_script(source: str) -> LazyScript:
+    return LazyScript(source)
+
+
+def __getattr__(name):
+    if name == "RedisError":
+        from redis import RedisError
+
+        return RedisError
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
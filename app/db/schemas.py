@@ -1,3 +1,4 @@
+import enum
 from pydantic import BaseModel, EmailStr, Field, conint
 from typing import List, Union
 
@@ -151,3 +152,43 @@ class Enroll(BaseModel):
 class CourseProgressUpdate(BaseModel):
     course_id: int
     progress: conint(ge=0, le=100)
+
+
+class CourseProgressOut(BaseModel):
+    user_id: int
+    course_id: int
+    course_progress: int
+
+
+class ContentFormat(str, enum.Enum):
+    markdown = "markdown"
+    html = "html"
+
+
+class TimeSeriesGranularity(str, enum.Enum):
+    hour = "hour"
+    day = "day"
+    week = "week"
+    month = "month"
+
+
+class MetricPoint(BaseModel):
+    period: str
+    count: int
+
+
+class TimeSeriesResponse(BaseModel):
+    metric: str
+    granularity: TimeSeriesGranularity
+    points: List[MetricPoint]
+
+
+class CourseSearchResult(CourseOut):
+    rank: float
+
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[CourseSearchResult]
+    has_more: bool
+
@@ -1,12 +1,36 @@
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import router as api_router
 
-from app.db import  database, models
-models.Base.metadata.create_all(bind=database.engine)
+from app.db import  database, migrations
+from app.db.mongo_db import close_mongo_client
+from app.services import metrics, pool_stats
+from config import get_metrics_settings, get_sql_profiler_settings
+
+SQL_PROFILE = get_sql_profiler_settings().SQL_PROFILE
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Importing this module has no side effects; connections are made here, at startup.
+    # Migrations run as a deploy step before the web workers start; only check them here
+    migrations.check_current(database.engine)
+    pool_stats.install(database.engine)
+    metrics_server = metrics.serve(get_metrics_settings().API_METRICS_PORT)
+    yield
+    if metrics_server is not None:
+        metrics_server.shutdown()
+    close_mongo_client()
+    database.engine.dispose()
+    metrics.mark_process_dead(os.getpid())
+    if SQL_PROFILE:
+        sql_profiler.write_report()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost.tiangolo.com",
@@ -26,6 +50,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.PrometheusMiddleware)
+
+if SQL_PROFILE:
+    from app.services import sql_profiler
+
+    sql_profiler.install(database.engine)
+    app.add_middleware(sql_profiler.SqlProfilerMiddleware)
+
 app.include_router(api_router)
 
 
@@ -1,11 +1,21 @@
-from openai import OpenAI
 import json
 import re
-from config import get_open_ai_cred
+from functools import lru_cache
+from config import get_backend_settings, get_open_ai_cred
 
-API_KEY = get_open_ai_cred().OPEN_AI_API_KEY
 
-client = OpenAI(api_key=API_KEY)
+@lru_cache
+def get_client():
+    backends = get_backend_settings()
+    if backends.AI_BACKEND == "stub":
+        from app.services.ai_stub import StubOpenAI
+
+        return StubOpenAI(latency_ms=backends.STUB_LATENCY_MS)
+
+    # Imported and built on first use: the openai package alone takes ~0.5s to import
+    from openai import OpenAI
+
+    return OpenAI(api_key=get_open_ai_cred().OPEN_AI_API_KEY)
 
 
 def safe_parse_json(content: str) -> list:
@@ -49,7 +59,7 @@ def generate_courses(topic: str, description: str = "") -> list:
     user_msg = f"Generate 10 courses for the topic: {topic}"
 
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": system_msg},
@@ -79,7 +89,7 @@ def generate_course_structure(course_title: str, course_description: str) -> lis
         "in the dictionary always follow the structure  {section_title: generated from you, subsection_titles: [list of subtitles generated] }"
     )
 
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model="gpt-3.5-turbo",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.7,
@@ -120,7 +130,7 @@ def generate_section_content(course_title, course_level, section_title, subsecti
         f"```"
     )
 
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model="gpt-3.5-turbo",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.7,
@@ -146,7 +156,7 @@ def generate_quiz_from_text(section_title: str, raw_markdown: str):
         "Return **ONLY** JSON array; each object must include:"
         "   question, options (list), correctAnswer (exact option text), hint."
     )
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model="gpt-3.5-turbo",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.7,
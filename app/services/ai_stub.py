@@ -0,0 +1,140 @@
+"""
+Local stand-in for the OpenAI client, selected with ``AI_BACKEND=stub``.
+
+Answers the four prompts in ``ai_helper`` with well-formed, deterministic
+content of realistic size, so course generation can run in load tests and
+offline development without network calls or API cost. ``STUB_LATENCY_MS``
+adds a fixed delay per call to imitate the real API.
+"""
+
+import json
+import random
+import time
+from types import SimpleNamespace
+
+LEVELS = ("Beginner", "Intermediate", "Advanced")
+
+WORDS = (
+    "data model query index cache latency throughput request response schema "
+    "function module service worker queue event stream record table column "
+    "pattern example practice concept design system process network storage"
+).split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text.capitalize() + "."
+
+
+def _paragraphs(rng: random.Random, count: int) -> str:
+    return "\n\n".join(
+        " ".join(_sentence(rng, rng.randint(8, 16)) for _ in range(rng.randint(3, 6)))
+        for _ in range(count)
+    )
+
+
+def _courses(rng: random.Random) -> list:
+    return [
+        {
+            "title": f"{_sentence(rng, 3)[:-1]} {index + 1}",
+            "description": _sentence(rng, 20),
+            "course_level": LEVELS[index % len(LEVELS)],
+        }
+        for index in range(rng.randint(6, 10))
+    ]
+
+
+def _sections(rng: random.Random) -> list:
+    return [
+        {
+            "section_title": f"Section {index + 1}: {_sentence(rng, 3)[:-1]}",
+            "subsection_titles": [_sentence(rng, 4)[:-1] for _ in range(rng.randint(3, 6))],
+        }
+        for index in range(rng.randint(10, 12))
+    ]
+
+
+def _section_content(rng: random.Random) -> str:
+    return (
+        f"## {_sentence(rng, 4)[:-1]}\n\n{_paragraphs(rng, 3)}\n\n"
+        f"```python\nfor item in items:\n    process(item)\n```\n\n{_paragraphs(rng, 2)}"
+    )
+
+
+def _quiz(rng: random.Random) -> list:
+    quiz = []
+    for _ in range(rng.randint(10, 15)):
+        options = [_sentence(rng, 3)[:-1] for _ in range(4)]
+        quiz.append({
+            "question": _sentence(rng, 10)[:-1] + "?",
+            "options": options,
+            "correctAnswer": rng.choice(options),
+            "hint": _sentence(rng, 8),
+        })
+    return quiz
+
+
+def course_details(title: str, level: str, seed: int, sections: int, subsections: int,
+                   contents: list = None) -> dict:
+    """
+    A generated course document (the shape stored in Mongo) of a given size.
+    ``contents`` is an optional pool of subsection texts to draw from, much
+    faster than writing each one when generating thousands of courses.
+    """
+    rng = random.Random(seed)
+    return {
+        "course_title": title,
+        "course_level": level,
+        "sections": [
+            {
+                "section_title": f"Section {index + 1}: {_sentence(rng, 3)[:-1]}",
+                "subsections": [
+                    {
+                        "title": _sentence(rng, 4)[:-1],
+                        "content": rng.choice(contents) if contents else _section_content(rng),
+                    }
+                    for _ in range(subsections)
+                ],
+            }
+            for index in range(sections)
+        ],
+    }
+
+
+def section_content(seed: int) -> str:
+    return _section_content(random.Random(seed))
+
+
+def quiz_items(seed: int) -> list:
+    return _quiz(random.Random(seed))
+
+
+def _answer(prompt: str) -> str:
+    rng = random.Random(prompt)
+    if "course planner" in prompt:
+        return json.dumps(_courses(rng))
+    if "course designer" in prompt:
+        return json.dumps(_sections(rng))
+    if "AI tutor" in prompt:
+        return json.dumps(_quiz(rng))
+    return _section_content(rng)
+
+
+class _Completions:
+    def __init__(self, latency_ms: int):
+        self.latency_ms = latency_ms
+
+    def create(self, model: str, messages: list, **kwargs):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        content = _answer("\n".join(message["content"] for message in messages))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class StubOpenAI:
+    """
+    Implements the ``client.chat.completions.create`` surface used by ``ai_helper``.
+    """
+
+    def __init__(self, latency_ms: int = 0):
+        self.chat = SimpleNamespace(completions=_Completions(latency_ms))
@@ -0,0 +1,197 @@
+"""
+Offline item-item collaborative filtering.
+
+A periodic Celery job turns ``course_interactions`` into a sparse user x course
+matrix, derives cosine similarities between courses and keeps the top-K unseen
+courses per user in Redis. Topic preferences add a popularity-weighted boost
+for courses in the user's chosen topics, so users with interests but no
+enrollments still get a list. ``/recommendations`` then costs one Redis GET.
+"""
+
+import json
+import logging
+from typing import Iterable, Optional
+
+from app.db import redis_db
+
+log = logging.getLogger(__name__)
+
+CF_USER_KEY = "reco:cf:user:{user_id}"
+CF_BUILT_AT_KEY = "reco:cf:built_at"
+CF_TTL_SECONDS = 2 * 24 * 60 * 60
+
+TOP_K = 100
+PREFERENCE_WEIGHT = 0.5
+USER_CHUNK = 2048
+
+
+def _user_key(user_id: int) -> str:
+    return CF_USER_KEY.format(user_id=user_id)
+
+
+def build_matrices(
+    interactions: Iterable[tuple],
+    preferences: Iterable[tuple],
+    course_topics: Iterable[tuple],
+):
+    """
+    Build the sparse inputs from raw rows.
+
+    interactions:  (user_id, course_id, course_progress)
+    preferences:   (user_id, topic_id)
+    course_topics: (course_id, topic_id) for built courses only
+
+    Returns ``(user_ids, course_ids, X, P, T)`` where X is users x courses
+    (implicit feedback weights), P is users x topics and T is topics x courses
+    (per-topic popularity in [0, 1]).
+    """
+    # numpy and scipy are only needed by the offline job; keep them out of web process imports
+    import numpy as np
+    from scipy import sparse
+
+    course_topics = list(course_topics)
+    course_ids = np.array([c for c, _ in course_topics], dtype=np.int64)
+    course_index = {c: i for i, c in enumerate(course_ids.tolist())}
+    topic_ids = sorted({t for _, t in course_topics})
+    topic_index = {t: i for i, t in enumerate(topic_ids)}
+
+    user_index = {}
+    rows, cols, vals = [], [], []
+    for user_id, course_id, progress in interactions:
+        col = course_index.get(course_id)
+        if col is None:
+            continue
+        rows.append(user_index.setdefault(user_id, len(user_index)))
+        cols.append(col)
+        vals.append(1.0 + (progress or 0) / 100.0)
+
+    pref_rows, pref_cols = [], []
+    for user_id, topic_id in preferences:
+        col = topic_index.get(topic_id)
+        if col is None:
+            continue
+        pref_rows.append(user_index.setdefault(user_id, len(user_index)))
+        pref_cols.append(col)
+
+    n_users, n_courses, n_topics = len(user_index), len(course_ids), len(topic_ids)
+    X = sparse.csr_matrix(
+        (np.asarray(vals, dtype=np.float32), (rows, cols)),
+        shape=(n_users, n_courses),
+    )
+    X.sum_duplicates()
+    P = sparse.csr_matrix(
+        (np.ones(len(pref_rows), dtype=np.float32), (pref_rows, pref_cols)),
+        shape=(n_users, n_topics),
+    )
+    P.data[:] = 1.0  # duplicate preference rows collapse to a single flag
+
+    # Popularity of each course relative to the most popular course of its topic
+    popularity = np.asarray((X > 0).sum(axis=0), dtype=np.float32).ravel() + 1.0
+    course_topic_cols = np.array([topic_index[t] for _, t in course_topics], dtype=np.int64)
+    topic_max = np.zeros(n_topics, dtype=np.float32)
+    np.maximum.at(topic_max, course_topic_cols, popularity)
+    T = sparse.csr_matrix(
+        (popularity / topic_max[course_topic_cols], (course_topic_cols, np.arange(n_courses))),
+        shape=(n_topics, n_courses),
+    )
+
+    user_ids = np.empty(n_users, dtype=np.int64)
+    for user_id, idx in user_index.items():
+        user_ids[idx] = user_id
+    return user_ids, course_ids, X, P, T
+
+
+def item_similarity(X: "sparse.csr_matrix") -> "sparse.csr_matrix":
+    """
+    Cosine similarity between course columns, with the diagonal removed.
+    """
+    import numpy as np
+
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    Xn = X.multiply(1.0 / norms).tocsc()
+    S = (Xn.T @ Xn).tocsr()
+    S.setdiag(0)
+    S.eliminate_zeros()
+    return S
+
+
+def compute_recommendations(
+    interactions: Iterable[tuple],
+    preferences: Iterable[tuple],
+    course_topics: Iterable[tuple],
+    top_k: int = TOP_K,
+) -> dict:
+    """
+    Return ``{user_id: [course_id, ...]}`` ordered by descending score.
+    """
+    import numpy as np
+
+    user_ids, course_ids, X, P, T = build_matrices(interactions, preferences, course_topics)
+    if X.shape[0] == 0 or X.shape[1] == 0:
+        return {}
+
+    S = item_similarity(X)
+    recommendations = {}
+
+    for start in range(0, X.shape[0], USER_CHUNK):
+        stop = min(start + USER_CHUNK, X.shape[0])
+        X_chunk = X[start:stop]
+        scores = (X_chunk @ S + PREFERENCE_WEIGHT * (P[start:stop] @ T)).tocsr()
+
+        # Never recommend what the user already interacted with
+        seen = (X_chunk > 0).astype(np.float32)
+        scores = (scores - scores.multiply(seen)).tocsr()
+        scores.eliminate_zeros()
+
+        for offset in range(stop - start):
+            lo, hi = scores.indptr[offset], scores.indptr[offset + 1]
+            if lo == hi:
+                continue
+            row_scores = scores.data[lo:hi]
+            row_cols = scores.indices[lo:hi]
+            if len(row_scores) > top_k:
+                best = np.argpartition(-row_scores, top_k - 1)[:top_k]
+            else:
+                best = np.arange(len(row_scores))
+            best = best[np.argsort(-row_scores[best], kind="stable")]
+            recommendations[int(user_ids[start + offset])] = course_ids[row_cols[best]].tolist()
+
+    return recommendations
+
+
+def store(recommendations: dict, built_at: str) -> None:
+    """
+    Write the new per-user lists and delete those of users left out of this
+    build, whose lists would otherwise be served until they expire.
+    """
+    redis_client = redis_db.get_redis_client()
+    stale_keys = set(redis_client.scan_iter(match=CF_USER_KEY.format(user_id="*"), count=1000))
+
+    pipe = redis_client.pipeline(transaction=False)
+    for i, (user_id, course_ids) in enumerate(recommendations.items(), 1):
+        key = _user_key(user_id)
+        stale_keys.discard(key)
+        pipe.set(key, json.dumps(course_ids), ex=CF_TTL_SECONDS)
+        if i % 1000 == 0:
+            pipe.execute()
+    pipe.set(CF_BUILT_AT_KEY, built_at)
+    pipe.execute()
+
+    stale_keys = list(stale_keys)
+    for start in range(0, len(stale_keys), 1000):
+        redis_client.delete(*stale_keys[start:start + 1000])
+    if stale_keys:
+        log.info("Deleted %d stale collaborative filtering lists", len(stale_keys))
+
+
+def lookup(user_id: int) -> Optional[list]:
+    """
+    Precomputed course ids for the user, or ``None`` if there are none.
+    """
+    try:
+        raw = redis_db.get_redis_client().get(_user_key(user_id))
+    except redis_db.RedisError as exc:
+        log.warning("Collaborative filtering lookup failed: %s", exc)
+        return None
+    return json.loads(raw) if raw else None
@@ -0,0 +1,233 @@
+"""
+Compression of the generated subsection markdown stored in Mongo.
+
+With ``CONTENT_COMPRESSION`` set to ``zstd`` or ``zlib``, ``course_store``
+replaces each subsection's ``content`` (and pre-rendered ``html``) with
+``content_z`` (the compressed UTF-8) and a ``codec`` tag when a course is
+written, and restores ``content`` when it is read, so the rest of the app
+only sees text. Subsections written without compression keep plain
+``content`` and are returned as stored.
+
+A subsection is a few KB, too little for a compressor to learn much from
+its own input. zstd can start from a dictionary trained on the catalog
+instead (``python -m benchmarks.content_compression train``); dictionaries
+live in the ``content_dictionaries`` collection and new content uses the
+one named by ``CONTENT_DICTIONARY_ID``. Each subsection records the
+dictionary it was compressed with and dictionaries are never deleted, so
+older content stays readable after the setting changes.
+"""
+
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+from app.services.metrics import CONTENT_DECODE_SECONDS
+from config import get_content_compression_settings
+
+settings = get_content_compression_settings()
+
+NONE = "none"
+ZLIB = "zlib"
+ZSTD = "zstd"
+CODECS = (NONE, ZLIB, ZSTD)
+
+# Content is written once and read on every view: favour ratio over speed
+DEFAULT_LEVELS = {ZLIB: 9, ZSTD: 19}
+
+DICTIONARY_COLLECTION = "content_dictionaries"
+
+# Subsection fields holding generated text: the markdown and its pre-rendered HTML
+TEXT_FIELDS = ("content", "html")
+_STORED_KEYS = tuple(f"{field}_z" for field in TEXT_FIELDS) + ("codec", "dict_id")
+
+# dict_id -> ZstdCompressionDict; dictionaries are immutable once stored
+_dictionaries = {}
+_dictionaries_lock = threading.Lock()
+# zstd (de)compressors must not be shared between threads
+_local = threading.local()
+
+
+def _zstd():
+    # Only needed when zstd is configured or found in stored data
+    import zstandard
+
+    return zstandard
+
+
+def level_for(codec: str, level: int = None) -> int:
+    return level if level is not None else DEFAULT_LEVELS.get(codec, 0)
+
+
+# ─────────────────────────────────────────────
+# DICTIONARIES
+# ─────────────────────────────────────────────
+def get_dictionary(mongo_db, dict_id: int):
+    dictionary = _dictionaries.get(dict_id)
+    if dictionary is not None:
+        return dictionary
+    doc = mongo_db[DICTIONARY_COLLECTION].find_one({"dict_id": dict_id}, {"_id": 0, "data": 1})
+    if doc is None:
+        raise LookupError(f"Compression dictionary {dict_id} not found in {DICTIONARY_COLLECTION}")
+    dictionary = _zstd().ZstdCompressionDict(bytes(doc["data"]))
+    with _dictionaries_lock:
+        return _dictionaries.setdefault(dict_id, dictionary)
+
+
+def train_dictionary(mongo_db, samples: list, size: int) -> int:
+    """
+    Train a zstd dictionary on ``samples`` (markdown strings), store it and
+    return its id.
+    """
+    from bson import Binary
+
+    zstandard = _zstd()
+    dictionary = zstandard.train_dictionary(size, [sample.encode("utf-8") for sample in samples])
+    dict_id = dictionary.dict_id()
+    mongo_db[DICTIONARY_COLLECTION].replace_one(
+        {"dict_id": dict_id},
+        {
+            "dict_id": dict_id,
+            "data": Binary(dictionary.as_bytes()),
+            "size": len(dictionary.as_bytes()),
+            "samples": len(samples),
+            "created_at": datetime.now(timezone.utc),
+        },
+        upsert=True,
+    )
+    return dict_id
+
+
+def _thread_codecs() -> dict:
+    if not hasattr(_local, "codecs"):
+        _local.codecs = {}
+    return _local.codecs
+
+
+def _compressor(mongo_db, level: int, dict_id: int):
+    codecs = _thread_codecs()
+    key = ("compress", level, dict_id)
+    if key not in codecs:
+        dictionary = get_dictionary(mongo_db, dict_id) if dict_id else None
+        codecs[key] = _zstd().ZstdCompressor(level=level, dict_data=dictionary)
+    return codecs[key]
+
+
+def _decompressor(mongo_db, dict_id: int):
+    codecs = _thread_codecs()
+    key = ("decompress", dict_id)
+    if key not in codecs:
+        dictionary = get_dictionary(mongo_db, dict_id) if dict_id else None
+        codecs[key] = _zstd().ZstdDecompressor(dict_data=dictionary)
+    return codecs[key]
+
+
+# ─────────────────────────────────────────────
+# SUBSECTIONS
+# ─────────────────────────────────────────────
+def compress(mongo_db, text: str, codec: str, level: int = None, dict_id: int = 0,
+             field: str = "content") -> dict:
+    """
+    Stored fields replacing ``field`` for one subsection.
+    """
+    # Write path only; pymongo (and bson with it) is loaded by the first Mongo client
+    from bson import Binary
+
+    raw = text.encode("utf-8")
+    if codec == ZLIB:
+        return {f"{field}_z": Binary(zlib.compress(raw, level_for(codec, level))), "codec": ZLIB}
+    if codec == ZSTD:
+        compressed = _compressor(mongo_db, level_for(codec, level), dict_id).compress(raw)
+        return {f"{field}_z": Binary(compressed), "codec": ZSTD, "dict_id": dict_id}
+    return {field: text}
+
+
+def decompress(mongo_db, subsection: dict, field: str = "content") -> str:
+    if f"{field}_z" not in subsection:
+        return subsection.get(field)
+    data = bytes(subsection[f"{field}_z"])
+    if subsection["codec"] == ZLIB:
+        return zlib.decompress(data).decode("utf-8")
+    if subsection["codec"] == ZSTD:
+        return _decompressor(mongo_db, subsection.get("dict_id", 0)).decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown content codec {subsection['codec']!r}")
+
+
+def _plain(mongo_db, subsection: dict) -> dict:
+    decoded = {key: value for key, value in subsection.items() if key not in _STORED_KEYS}
+    for field in TEXT_FIELDS:
+        if f"{field}_z" in subsection:
+            decoded[field] = decompress(mongo_db, subsection, field)
+    return decoded
+
+
+# ─────────────────────────────────────────────
+# SECTIONS AND COURSES
+# ─────────────────────────────────────────────
+def encode_section(mongo_db, section: dict, codec: str = None) -> dict:
+    codec = codec or settings.CONTENT_COMPRESSION
+    if codec == NONE:
+        return section
+    subsections = []
+    for subsection in section.get("subsections", []):
+        if _is_compressed_subsection(subsection):
+            subsections.append(subsection)
+            continue
+        stored = {key: value for key, value in subsection.items() if key not in TEXT_FIELDS}
+        for field in TEXT_FIELDS:
+            if field in subsection:
+                stored.update(compress(
+                    mongo_db, subsection[field] or "", codec, settings.CONTENT_COMPRESSION_LEVEL,
+                    settings.CONTENT_DICTIONARY_ID if codec == ZSTD else 0, field=field,
+                ))
+        subsections.append(stored)
+    return {**section, "subsections": subsections}
+
+
+def encode_course(mongo_db, course_details: dict, codec: str = None) -> dict:
+    """
+    Copy of ``course_details`` with subsection text compressed per the settings.
+    """
+    codec = codec or settings.CONTENT_COMPRESSION
+    if codec not in CODECS:
+        raise ValueError(f"Unknown content codec {codec!r}; expected one of {CODECS}")
+    if codec == NONE:
+        return course_details
+    return {
+        **course_details,
+        "sections": [encode_section(mongo_db, section, codec) for section in course_details.get("sections", [])],
+    }
+
+
+def _is_compressed_subsection(subsection: dict) -> bool:
+    return "codec" in subsection
+
+
+def _is_compressed(section: dict) -> bool:
+    return any(_is_compressed_subsection(subsection) for subsection in section.get("subsections", []))
+
+
+def _decoded(mongo_db, section: dict) -> dict:
+    return {**section, "subsections": [_plain(mongo_db, sub) for sub in section.get("subsections", [])]}
+
+
+def decode_section(mongo_db, section: dict) -> dict:
+    if not _is_compressed(section):
+        return section
+    started = time.perf_counter()
+    decoded = _decoded(mongo_db, section)
+    CONTENT_DECODE_SECONDS.observe(time.perf_counter() - started)
+    return decoded
+
+
+def decode_course(mongo_db, course_details: dict) -> dict:
+    sections = course_details.get("sections", [])
+    if not any(_is_compressed(section) for section in sections):
+        return course_details
+    started = time.perf_counter()
+    decoded = {
+        **course_details,
+        "sections": [_decoded(mongo_db, section) if _is_compressed(section) else section for section in sections],
+    }
+    CONTENT_DECODE_SECONDS.observe(time.perf_counter() - started)
+    return decoded
@@ -0,0 +1,119 @@
+"""
+Pre-serialized, pre-compressed course documents.
+
+Course content never changes once ``mark_course_as_built`` runs, so the JSON
+for ``course_details`` is rendered and compressed once at build time and kept
+in the Mongo ``course_blobs`` collection.
+
+The blob is stored as a raw deflate stream of the JSON *without* its closing
+brace, flushed but not finished. Per-user fields (quiz status, progress) are
+appended at request time as a tiny second deflate block, and a gzip header
+and trailer are wrapped around both, so the stored bytes are served as-is.
+"""
+
+import json
+import struct
+import zlib
+
+BLOB_COLLECTION = "course_blobs"
+CONTENT_ENCODING = "gzip"
+
+# Fixed 10 byte gzip header: magic, deflate, no flags, no mtime, no xfl, unknown OS
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+
+def render_course_blob(course_id: int, course_details: dict) -> dict:
+    """
+    Build the Mongo document holding the compressed JSON of ``course_details``.
+    """
+    # Build time only; pymongo (and bson with it) is loaded by the first Mongo client
+    from bson import Binary
+
+    body = json.dumps(course_details, ensure_ascii=False, separators=(",", ":"))
+    prefix = body[:-1].encode("utf-8")  # drop the closing "}"
+
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = compressor.compress(prefix) + compressor.flush(zlib.Z_FULL_FLUSH)
+
+    return {
+        "course_id": course_id,
+        "encoding": CONTENT_ENCODING,
+        "section_count": len(course_details.get("sections", [])),
+        "body": Binary(deflated),
+        "crc": zlib.crc32(prefix),
+        "size": len(prefix),
+    }
+
+
+def save_course_blob(mongo_db, course_id: int, course_details: dict) -> dict:
+    blob = render_course_blob(course_id, course_details)
+    mongo_db[BLOB_COLLECTION].replace_one({"course_id": course_id}, blob, upsert=True)
+    return blob
+
+
+def load_course_blob(mongo_db, course_id: int):
+    return mongo_db[BLOB_COLLECTION].find_one({"course_id": course_id}, {"_id": 0})
+
+
+def delete_course_blob(mongo_db, course_id: int) -> None:
+    mongo_db[BLOB_COLLECTION].delete_one({"course_id": course_id})
+
+
+def user_fields_suffix(quiz_status: dict, course_progress: int) -> bytes:
+    """
+    JSON tail that closes the stored prefix with the per-user fields.
+    """
+    tail = json.dumps(
+        {"quiz_status": quiz_status, "course_progress": course_progress},
+        separators=(",", ":"),
+    )
+    return ("," + tail[1:]).encode("utf-8")
+
+
+def gzip_body(blob: dict, suffix: bytes) -> bytes:
+    """
+    Splice the stored deflate stream and the per-user suffix into one gzip member.
+    """
+    compressor = zlib.compressobj(1, zlib.DEFLATED, -zlib.MAX_WBITS)
+    tail = compressor.compress(suffix) + compressor.flush(zlib.Z_FINISH)
+
+    crc = zlib.crc32(suffix, blob["crc"])
+    size = (blob["size"] + len(suffix)) & 0xFFFFFFFF
+    return b"".join(
+        (_GZIP_HEADER, bytes(blob["body"]), tail, struct.pack("<II", crc, size))
+    )
+
+
+def plain_body(blob: dict, suffix: bytes) -> bytes:
+    """
+    Uncompressed JSON for clients that do not accept gzip.
+    """
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    return decompressor.decompress(bytes(blob["body"])) + suffix
+
+
+def _quality(params: str) -> float:
+    for param in params.split(";"):
+        name, _, value = param.strip().partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Whether ``Accept-Encoding`` allows gzip. An explicit ``gzip`` entry
+    wins over ``*``; ``q=0`` (in any spelling) refuses.
+    """
+    wildcard = None
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if coding == CONTENT_ENCODING:
+            return _quality(params) > 0
+        if coding == "*" and wildcard is None:
+            wildcard = _quality(params) > 0
+    return bool(wildcard)
@@ -0,0 +1,357 @@
+"""
+Generated course content in Mongo, in one of two layouts.
+
+``document`` (the original): one ``courses`` document per course, holding
+``course_details`` with every section's full markdown. The document grows
+with the course toward the 16MB BSON limit and every read fetches all of it.
+
+``sectioned``: a small ``course_headers`` document (title, level, outline)
+plus one ``course_sections`` document per section, keyed by
+``(course_id, section_index)``. Reading one section fetches one section; no
+document holds more than one section's content.
+
+``COURSE_STORAGE_LAYOUT`` picks the layout new courses are written in. Reads
+try that layout first and fall back to the other, so existing courses can be
+moved with ``python -m app.db.migrations course-layout <layout>`` while the
+app is serving.
+
+Each subsection holds its markdown (``content``) and, for courses built
+since pre-rendering, the HTML rendered from it (``html``). Readers ask for
+one of the two and the other is left out of the query. Both are compressed
+on write and decompressed on read by ``content_codec``; callers always pass
+and receive text.
+"""
+
+import logging
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterator, Optional
+
+from app.services import content_codec, markdown_render
+from config import get_course_storage_settings
+
+log = logging.getLogger(__name__)
+
+settings = get_course_storage_settings()
+
+DOCUMENT = "document"
+SECTIONED = "sectioned"
+LAYOUTS = (DOCUMENT, SECTIONED)
+
+# Subsection text to read: the markdown or its pre-rendered HTML
+CONTENT = "content"
+HTML = "html"
+
+DOCUMENT_COLLECTION = "courses"
+HEADER_COLLECTION = "course_headers"
+SECTION_COLLECTION = "course_sections"
+
+# Header fields that are not part of course_details
+_HEADER_ONLY = ("_id", "course_id", "section_count", "outline")
+_SECTION_KEYS = ("_id", "course_id", "section_index")
+
+
+def _layout(layout: Optional[str]) -> str:
+    layout = layout or settings.COURSE_STORAGE_LAYOUT
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown course storage layout {layout!r}; expected one of {LAYOUTS}")
+    return layout
+
+
+def _read_order() -> tuple:
+    primary = _layout(None)
+    return (primary,) + tuple(layout for layout in LAYOUTS if layout != primary)
+
+
+# ─────────────────────────────────────────────
+# SECTIONED DOCUMENTS
+# ─────────────────────────────────────────────
+def split_course(course_id: int, course_details: dict) -> tuple:
+    """
+    ``(header, [section, ...])`` documents for the sectioned layout.
+    """
+    sections = course_details.get("sections", [])
+    header = {key: value for key, value in course_details.items() if key != "sections"}
+    header.update(
+        course_id=course_id,
+        section_count=len(sections),
+        outline=[
+            {
+                "section_title": section.get("section_title"),
+                "subsection_titles": [sub.get("title") for sub in section.get("subsections", [])],
+            }
+            for section in sections
+        ],
+    )
+    return header, [
+        {"course_id": course_id, "section_index": index, **section}
+        for index, section in enumerate(sections)
+    ]
+
+
+def join_course(header: dict, sections: list) -> dict:
+    details = {key: value for key, value in header.items() if key not in _HEADER_ONLY}
+    details["sections"] = [
+        {key: value for key, value in section.items() if key not in _SECTION_KEYS}
+        for section in sorted(sections, key=itemgetter("section_index"))
+    ]
+    return details
+
+
+# ─────────────────────────────────────────────
+# WRITES
+# ─────────────────────────────────────────────
+def save_course(mongo_db, course_id: int, course_details: dict, layout: str = None) -> None:
+    # pymongo is imported where it is used: callers pass in a Database, so it
+    # is loaded by then, and the web tier does not import it at startup
+    from pymongo import ReplaceOne
+
+    course_details = content_codec.encode_course(mongo_db, course_details)
+    if _layout(layout) == DOCUMENT:
+        mongo_db[DOCUMENT_COLLECTION].replace_one(
+            {"course_id": course_id},
+            {"course_id": course_id, "course_details": course_details},
+            upsert=True,
+        )
+        return
+
+    header, sections = split_course(course_id, course_details)
+    # Sections first: a course is readable once its header exists
+    if sections:
+        mongo_db[SECTION_COLLECTION].bulk_write(
+            [
+                ReplaceOne({"course_id": course_id, "section_index": section["section_index"]}, section, upsert=True)
+                for section in sections
+            ],
+            ordered=False,
+        )
+    mongo_db[SECTION_COLLECTION].delete_many(
+        {"course_id": course_id, "section_index": {"$gte": len(sections)}}
+    )
+    mongo_db[HEADER_COLLECTION].replace_one({"course_id": course_id}, header, upsert=True)
+
+
+def insert_courses(mongo_db, courses: list, layout: str = None) -> None:
+    """
+    Bulk insert of new ``(course_id, course_details)`` pairs (seeding).
+    """
+    if not courses:
+        return
+    courses = [(course_id, content_codec.encode_course(mongo_db, details)) for course_id, details in courses]
+    if _layout(layout) == DOCUMENT:
+        mongo_db[DOCUMENT_COLLECTION].insert_many(
+            [{"course_id": course_id, "course_details": details} for course_id, details in courses],
+            ordered=False,
+        )
+        return
+
+    headers, sections = [], []
+    for course_id, details in courses:
+        header, course_sections = split_course(course_id, details)
+        headers.append(header)
+        sections += course_sections
+    if sections:
+        mongo_db[SECTION_COLLECTION].insert_many(sections, ordered=False)
+    mongo_db[HEADER_COLLECTION].insert_many(headers, ordered=False)
+
+
+def delete_course(mongo_db, course_id: int, layout: str) -> None:
+    if _layout(layout) == DOCUMENT:
+        mongo_db[DOCUMENT_COLLECTION].delete_one({"course_id": course_id})
+        return
+    mongo_db[HEADER_COLLECTION].delete_one({"course_id": course_id})
+    mongo_db[SECTION_COLLECTION].delete_many({"course_id": course_id})
+
+
+# ─────────────────────────────────────────────
+# READS
+# ─────────────────────────────────────────────
+def _skip(text_field: Optional[str], prefix: str) -> dict:
+    """
+    Projection leaving out the other text fields, so that reading the HTML
+    does not also transfer the markdown and vice versa.
+    """
+    if text_field is None:
+        return {}
+    return {
+        f"{prefix}{name}": 0
+        for field in content_codec.TEXT_FIELDS if field != text_field
+        for name in (field, f"{field}_z")
+    }
+
+
+def _only(section: dict, text_field: str) -> dict:
+    others = [field for field in content_codec.TEXT_FIELDS if field != text_field]
+    return {
+        **section,
+        "subsections": [
+            {key: value for key, value in subsection.items() if key not in others}
+            for subsection in section.get("subsections", [])
+        ],
+    }
+
+
+def _lacks_html(sections: list) -> bool:
+    return any("html" not in sub for section in sections for sub in section.get("subsections", []))
+
+
+def _rendered(section_or_course: dict) -> dict:
+    # Built before pre-rendering and not yet backfilled: render now
+    if "sections" in section_or_course:
+        details = markdown_render.render_course(section_or_course)
+        return {**details, "sections": [_only(section, HTML) for section in details["sections"]]}
+    return _only(markdown_render.render_course({"sections": [section_or_course]})["sections"][0], HTML)
+
+
+def _load_document(mongo_db, course_id: int, text_field: Optional[str]) -> Optional[dict]:
+    doc = mongo_db[DOCUMENT_COLLECTION].find_one(
+        {"course_id": course_id},
+        {"_id": 0, "course_id": 0, **_skip(text_field, "course_details.sections.subsections.")},
+    )
+    return doc["course_details"] if doc else None
+
+
+def _load_sectioned(mongo_db, course_id: int, text_field: Optional[str]) -> Optional[dict]:
+    from pymongo import ASCENDING
+
+    header = mongo_db[HEADER_COLLECTION].find_one({"course_id": course_id}, {"_id": 0})
+    if header is None:
+        return None
+    sections = mongo_db[SECTION_COLLECTION].find(
+        {"course_id": course_id}, {"_id": 0, **_skip(text_field, "subsections.")}
+    ).sort("section_index", ASCENDING)
+    return join_course(header, list(sections))
+
+
+def load_course(mongo_db, course_id: int, text_field: str = CONTENT) -> Optional[dict]:
+    """
+    The full ``course_details`` of a course, whichever layout holds it, with
+    each subsection's ``text_field`` (markdown ``content`` or ``html``).
+    """
+    for layout in _read_order():
+        loader = _load_document if layout == DOCUMENT else _load_sectioned
+        details = loader(mongo_db, course_id, text_field)
+        if details is not None:
+            details = content_codec.decode_course(mongo_db, details)
+            if text_field == HTML and _lacks_html(details["sections"]):
+                return _rendered(load_course(mongo_db, course_id, CONTENT))
+            return details
+    return None
+
+
+def load_section(mongo_db, course_id: int, section_index: int, text_field: str = CONTENT) -> Optional[dict]:
+    """
+    One section (``section_title``, ``subsections``) without the rest of the course.
+    """
+    section = None
+    for layout in _read_order():
+        if layout == SECTIONED:
+            section = mongo_db[SECTION_COLLECTION].find_one(
+                {"course_id": course_id, "section_index": section_index},
+                {**{key: 0 for key in _SECTION_KEYS}, **_skip(text_field, "subsections.")},
+            )
+        else:
+            # $slice makes the server return a single element of the array
+            doc = mongo_db[DOCUMENT_COLLECTION].find_one(
+                {"course_id": course_id},
+                {"_id": 0, "course_details.sections": {"$slice": [section_index, 1]}},
+            )
+            sections = doc["course_details"].get("sections", []) if doc else []
+            section = sections[0] if sections else None
+        if section is not None:
+            break
+    if section is None:
+        return None
+
+    section = _only(content_codec.decode_section(mongo_db, section), text_field)
+    if text_field == HTML and _lacks_html([section]):
+        return _rendered(load_section(mongo_db, course_id, section_index, CONTENT))
+    return section
+
+
+def _iter_document(mongo_db, text_field: Optional[str] = None) -> Iterator[tuple]:
+    projection = {"_id": 0, **_skip(text_field, "course_details.sections.subsections.")}
+    for doc in mongo_db[DOCUMENT_COLLECTION].find({}, projection):
+        yield doc["course_id"], doc["course_details"]
+
+
+def _iter_sectioned(mongo_db, text_field: Optional[str] = None) -> Iterator[tuple]:
+    from pymongo import ASCENDING
+
+    headers = {
+        header["course_id"]: header
+        for header in mongo_db[HEADER_COLLECTION].find({}, {"_id": 0})
+    }
+    # One pass over the (course_id, section_index) index instead of a query per course
+    sections = mongo_db[SECTION_COLLECTION].find({}, {"_id": 0, **_skip(text_field, "subsections.")}).sort(
+        [("course_id", ASCENDING), ("section_index", ASCENDING)]
+    )
+    for course_id, course_sections in groupby(sections, key=itemgetter("course_id")):
+        header = headers.pop(course_id, None)
+        if header is not None:
+            yield course_id, join_course(header, list(course_sections))
+    for course_id, header in headers.items():
+        yield course_id, join_course(header, [])
+
+
+def iter_courses(mongo_db) -> Iterator[tuple]:
+    """
+    ``(course_id, course_details)`` with markdown for every stored course,
+    each once even while a migration has it in both layouts.
+    """
+    seen = set()
+    for layout in _read_order():
+        iterate = _iter_document if layout == DOCUMENT else _iter_sectioned
+        for course_id, details in iterate(mongo_db, CONTENT):
+            if course_id not in seen:
+                seen.add(course_id)
+                yield course_id, content_codec.decode_course(mongo_db, details)
+
+
+# ─────────────────────────────────────────────
+# MIGRATION
+# ─────────────────────────────────────────────
+def migrate(mongo_db, target: str, drop_source: bool = False) -> int:
+    """
+    Copy every course stored in the other layout into ``target``; with
+    ``drop_source`` the originals are removed once copied. Courses already in
+    ``target`` are skipped, so an interrupted run can simply be restarted.
+    """
+    target = _layout(target)
+    source = SECTIONED if target == DOCUMENT else DOCUMENT
+    iterate = _iter_document if source == DOCUMENT else _iter_sectioned
+    present = {
+        doc["course_id"]
+        for doc in mongo_db[DOCUMENT_COLLECTION if target == DOCUMENT else HEADER_COLLECTION].find(
+            {}, {"_id": 0, "course_id": 1}
+        )
+    }
+
+    migrated = 0
+    for course_id, details in iterate(mongo_db):
+        if course_id not in present:
+            save_course(mongo_db, course_id, content_codec.decode_course(mongo_db, details), layout=target)
+            migrated += 1
+        if drop_source:
+            delete_course(mongo_db, course_id, layout=source)
+        if migrated and migrated % 500 == 0:
+            log.info("Migrated %d courses to the %s layout", migrated, target)
+    return migrated
+
+
+def rewrite(mongo_db) -> int:
+    """
+    Store every course again, in the layout that holds it, so that content
+    written before a ``CONTENT_COMPRESSION`` change is encoded the new way
+    and courses built before pre-rendering get their HTML.
+    """
+    rewritten = 0
+    for layout in LAYOUTS:
+        iterate = _iter_document if layout == DOCUMENT else _iter_sectioned
+        for course_id, details in iterate(mongo_db):
+            details = markdown_render.render_course(content_codec.decode_course(mongo_db, details))
+            save_course(mongo_db, course_id, details, layout=layout)
+            rewritten += 1
+            if rewritten % 500 == 0:
+                log.info("Rewrote %d courses", rewritten)
+    return rewritten
@@ -0,0 +1,285 @@
+"""
+Incrementally maintained admin dashboard figures.
+
+Counters are updated in Redis next to the writes that change them (user,
+topic and quiz creation, quiz passes, enrollments), so ``/dashboard/stats``
+reads a handful of keys instead of counting and grouping whole tables.
+
+Counters can drift when rows disappear via database-level cascades, so the
+nightly ``reconcile_dashboard_rollups`` Celery beat job recomputes everything
+from SQL. It builds the figures under ``RECONCILE_PREFIX`` keys while the live
+keys keep serving and counting, then renames them over the live keys. Updates
+made while it runs are also appended to ``JOURNAL_KEY`` and replayed onto the
+rebuilt keys before the swap, so they are not lost. Until the first
+reconciliation, ``snapshot`` returns ``None`` and the dashboard queries SQL
+directly.
+"""
+
+import json
+import logging
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from app.db import redis_db
+
+log = logging.getLogger(__name__)
+
+COUNTERS_KEY = "dashboard:counters"
+TOPIC_ATTEMPTS_KEY = "dashboard:topic_attempts"
+TOPIC_USERS_KEY = "dashboard:topic_users:{topic_id}"
+TOPIC_TITLES_KEY = "dashboard:topic_titles"
+SIGNUPS_KEY = "dashboard:signups"
+READY_KEY = "dashboard:ready"
+
+# Reconciliation: rebuilt keys are the live names under this prefix
+RECONCILE_PREFIX = "dashboard:reconcile:"
+RECONCILING_KEY = "dashboard:reconciling"
+JOURNAL_KEY = "dashboard:journal"
+RECONCILE_SECONDS = 60 * 60
+
+USERS = "users"
+TOPICS = "topics"
+QUIZZES = "quizzes"
+PASSED_QUIZZES = "passed_quizzes"
+
+ENROLL = "enroll"
+
+# Count a user towards a topic only the first time they enroll in one of its courses
+_ENROLL_SCRIPT = redis_db.register_script(
+    """
+    if redis.call('SADD', KEYS[1], ARGV[1]) == 1 then
+        redis.call('ZINCRBY', KEYS[2], 1, ARGV[2])
+    end
+    """
+)
+
+# Journal an update while a reconciliation is running
+_JOURNAL_SCRIPT = redis_db.register_script(
+    """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        redis.call('RPUSH', KEYS[2], ARGV[1])
+        redis.call('EXPIRE', KEYS[2], ARGV[2])
+    end
+    """
+)
+
+# KEYS: journal, reconciling flag, ready flag, then ARGV[2] (rebuilt, live)
+# pairs, then live keys with no rebuilt counterpart. Swaps only if the
+# journal still has ARGV[1] entries, i.e. every update has been replayed.
+_SWAP_SCRIPT = redis_db.register_script(
+    """
+    if redis.call('LLEN', KEYS[1]) ~= tonumber(ARGV[1]) then
+        return 0
+    end
+    local pairs = tonumber(ARGV[2])
+    for i = 0, pairs - 1 do
+        local rebuilt, live = KEYS[4 + 2 * i], KEYS[5 + 2 * i]
+        if redis.call('EXISTS', rebuilt) == 1 then
+            redis.call('RENAME', rebuilt, live)
+        else
+            redis.call('DEL', live)
+        end
+    end
+    for i = 4 + 2 * pairs, #KEYS do
+        redis.call('DEL', KEYS[i])
+    end
+    redis.call('DEL', KEYS[1], KEYS[2])
+    redis.call('SET', KEYS[3], 1)
+    return 1
+    """
+)
+
+
+def _topic_users_key(topic_id: int) -> str:
+    return TOPIC_USERS_KEY.format(topic_id=topic_id)
+
+
+def _rebuilt(key: str) -> str:
+    return RECONCILE_PREFIX + key
+
+
+def _safely(action: str, fn) -> None:
+    try:
+        fn()
+    except redis_db.RedisError as exc:
+        log.warning("Dashboard rollup %s failed: %s", action, exc)
+
+
+def _run(pipe, ops: list, rename=lambda key: key) -> None:
+    for command, key, *args in ops:
+        if command == ENROLL:
+            attempts_key, *args = args
+            _ENROLL_SCRIPT(keys=[rename(key), rename(attempts_key)], args=args, client=pipe)
+        else:
+            pipe.execute_command(command, rename(key), *args)
+
+
+def _apply(action: str, ops: list) -> None:
+    """
+    Run ``[(command, key, *args), ...]`` atomically on the live keys, and
+    journal them if a reconciliation is running.
+    """
+    def apply():
+        pipe = redis_db.get_redis_client().pipeline()
+        _run(pipe, ops)
+        _JOURNAL_SCRIPT(
+            keys=[RECONCILING_KEY, JOURNAL_KEY], args=[json.dumps(ops), RECONCILE_SECONDS], client=pipe
+        )
+        pipe.execute()
+
+    _safely(action, apply)
+
+
+def user_created(created_on: date) -> None:
+    _apply("user_created", [
+        ("HINCRBY", COUNTERS_KEY, USERS, 1),
+        ("HINCRBY", SIGNUPS_KEY, created_on.isoformat(), 1),
+    ])
+
+
+def user_deleted() -> None:
+    _apply("user_deleted", [("HINCRBY", COUNTERS_KEY, USERS, -1)])
+
+
+def topic_saved(topic_id: int, title: str, created: bool = False) -> None:
+    ops = [("HSET", TOPIC_TITLES_KEY, topic_id, title)]
+    if created:
+        ops.append(("HINCRBY", COUNTERS_KEY, TOPICS, 1))
+    _apply("topic_saved", ops)
+
+
+def topic_deleted(topic_id: int) -> None:
+    _apply("topic_deleted", [
+        ("HINCRBY", COUNTERS_KEY, TOPICS, -1),
+        ("HDEL", TOPIC_TITLES_KEY, topic_id),
+        ("ZREM", TOPIC_ATTEMPTS_KEY, topic_id),
+        ("DEL", _topic_users_key(topic_id)),
+    ])
+
+
+def quizzes_added(count: int = 1) -> None:
+    _apply("quizzes_added", [("HINCRBY", COUNTERS_KEY, QUIZZES, count)])
+
+
+def quiz_passed() -> None:
+    _apply("quiz_passed", [("HINCRBY", COUNTERS_KEY, PASSED_QUIZZES, 1)])
+
+
+def enrollment(user_id: int, topic_id: int) -> None:
+    _apply("enrollment", [
+        (ENROLL, _topic_users_key(topic_id), TOPIC_ATTEMPTS_KEY, user_id, topic_id),
+    ])
+
+
+def begin_reconcile() -> None:
+    """
+    Start journaling updates; call before reading the figures from SQL.
+    """
+    redis_client = redis_db.get_redis_client()
+    leftovers = list(redis_client.scan_iter(match=RECONCILE_PREFIX + "*"))
+    pipe = redis_client.pipeline(transaction=True)
+    if leftovers:
+        # From a reconciliation that died before its swap
+        pipe.delete(*leftovers)
+    pipe.delete(JOURNAL_KEY)
+    pipe.set(RECONCILING_KEY, 1, ex=RECONCILE_SECONDS)
+    pipe.execute()
+
+
+def replace_all(
+    counters: dict,
+    topic_titles: dict,
+    topic_user_pairs: Iterable[tuple],
+    signups: dict,
+) -> None:
+    """
+    Swap in figures recomputed from SQL since ``begin_reconcile``, plus the
+    updates journaled meanwhile.
+
+    Updates that landed between ``begin_reconcile`` and the SQL reads are in
+    both; for enrollments the topic user sets absorb that, for the plain
+    counters it is at most the handful of events of that window.
+    """
+    users_by_topic = {}
+    for topic_id, user_id in topic_user_pairs:
+        users_by_topic.setdefault(topic_id, []).append(user_id)
+
+    redis_client = redis_db.get_redis_client()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(_rebuilt(COUNTERS_KEY), mapping=counters)
+    if topic_titles:
+        pipe.hset(_rebuilt(TOPIC_TITLES_KEY), mapping=topic_titles)
+    if signups:
+        pipe.hset(_rebuilt(SIGNUPS_KEY), mapping=signups)
+    for topic_id, user_ids in users_by_topic.items():
+        pipe.sadd(_rebuilt(_topic_users_key(topic_id)), *user_ids)
+        pipe.zadd(_rebuilt(TOPIC_ATTEMPTS_KEY), {topic_id: len(user_ids)})
+    pipe.execute()
+
+    topic_keys = {_topic_users_key(topic_id) for topic_id in users_by_topic}
+    replayed = 0
+    while True:
+        entries = redis_client.lrange(JOURNAL_KEY, replayed, -1)
+        pipe = redis_client.pipeline(transaction=False)
+        for entry in entries:
+            ops = json.loads(entry)
+            _run(pipe, ops, rename=_rebuilt)
+            topic_keys.update(key for _, key, *_ in ops if key.startswith(TOPIC_USERS_KEY.format(topic_id="")))
+        pipe.execute()
+        replayed += len(entries)
+
+        live_topic_keys = set(redis_client.scan_iter(match=TOPIC_USERS_KEY.format(topic_id="*")))
+        pairs = [COUNTERS_KEY, TOPIC_ATTEMPTS_KEY, TOPIC_TITLES_KEY, SIGNUPS_KEY, *topic_keys]
+        keys = [JOURNAL_KEY, RECONCILING_KEY, READY_KEY]
+        for key in pairs:
+            keys += [_rebuilt(key), key]
+        keys += live_topic_keys - topic_keys
+        if _SWAP_SCRIPT(keys=keys, args=[replayed, len(pairs)]):
+            return
+        # More updates were journaled since the last read: replay those too
+
+
+def _topics(pairs: list, titles: dict) -> list:
+    return [
+        (int(topic_id), titles.get(topic_id) or "", int(score))
+        for topic_id, score in pairs
+    ]
+
+
+def snapshot(today: date, days: int = 7, top: int = 3) -> Optional[dict]:
+    """
+    Everything the admin dashboard shows, in two Redis round trips.
+    """
+    start = today - timedelta(days=days - 1)
+    dates = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    try:
+        redis_client = redis_db.get_redis_client()
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.exists(READY_KEY)
+        pipe.hgetall(COUNTERS_KEY)
+        pipe.zrevrange(TOPIC_ATTEMPTS_KEY, 0, top - 1, withscores=True)
+        pipe.zrange(TOPIC_ATTEMPTS_KEY, 0, top - 1, withscores=True)
+        pipe.hmget(SIGNUPS_KEY, dates)
+        ready, counters, most, least, signups = pipe.execute()
+        if not ready:
+            return None
+        topic_ids = list({topic_id for topic_id, _ in most + least})
+        titles = dict(zip(topic_ids, redis_client.hmget(TOPIC_TITLES_KEY, topic_ids))) if topic_ids else {}
+    except redis_db.RedisError as exc:
+        log.warning("Dashboard rollups unavailable: %s", exc)
+        return None
+
+    quiz_count = int(counters.get(QUIZZES, 0))
+    passed = int(counters.get(PASSED_QUIZZES, 0))
+    return {
+        "user_count": int(counters.get(USERS, 0)),
+        "topic_count": int(counters.get(TOPICS, 0)),
+        "most_attempted": _topics(most, titles),
+        "least_attempted": _topics(least, titles),
+        "quiz_count": quiz_count,
+        "passed_quizzes": passed,
+        "completion_rate": round(passed / quiz_count * 100, 2) if quiz_count else 0,
+        "daily_new_users": [
+            {"date": day, "count": int(count or 0)} for day, count in zip(dates, signups)
+        ],
+    }
@@ -19,7 +19,8 @@ import base64
 import logging
 import os
 import sys
-import textwrap
+import threading
+import time
 from email.message import EmailMessage
 from pathlib import Path
 from typing import Final
@@ -30,6 +31,9 @@ from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from app.services.email_templates import registration_message, reset_message
+from config import get_backend_settings
+
 # ─────────────────────────────────────────────────────────────
 # CONFIG
 # ─────────────────────────────────────────────────────────────
@@ -41,6 +45,10 @@ TOKEN_FILE = BASE_DIR / "token.json"  # Will be created after first auth
 # Optional: override port via env (handy if 8080 busy)
 AUTH_PORT = int(os.getenv("GOOGLE_AUTH_PORT", "8080"))
 
+# EMAIL_BACKEND=stub logs messages instead of sending them (load tests, offline dev)
+BACKENDS = get_backend_settings()
+STUB_EMAIL = BACKENDS.EMAIL_BACKEND == "stub"
+
 log = logging.getLogger("gmail_mailer")
 logging.basicConfig(
     level=logging.INFO,
@@ -81,10 +89,56 @@ def _load_creds() -> Credentials:
 # ─────────────────────────────────────────────────────────────
 # GMAIL SERVICE
 # ─────────────────────────────────────────────────────────────
+# One discovery client per process. Building it re-reads token.json and
+# constructs the API surface (hundreds of ms), so it is reused and only the
+# access token is refreshed when it expires. httplib2 is not thread safe; the
+# email worker runs prefork, so each process owns its own client.
+_creds: Credentials | None = None
+_service = None
+_service_lock = threading.Lock()
+
+RETRYABLE_STATUSES: Final[frozenset[int]] = frozenset({429, 500, 502, 503, 504})
+
+
+def _refresh_if_expired(creds: Credentials) -> None:
+    if creds.valid:
+        return
+    log.info("Access token expired – refreshing …")
+    try:
+        creds.refresh(Request())
+    except RefreshError as exc:
+        raise RuntimeError(
+            "Refresh token invalid or revoked – "
+            "regenerate token.json offline and redeploy."
+        ) from exc
+    TOKEN_FILE.write_text(creds.to_json())
+
+
 def _gmail_service():
-    creds = _load_creds()
-    # cache_discovery=False avoids writing to ~/.cache on some serverless platforms
-    return build("gmail", "v1", credentials=creds, cache_discovery=False)
+    global _creds, _service
+    with _service_lock:
+        if _service is None:
+            _creds = _load_creds()
+            # cache_discovery=False avoids writing to ~/.cache on some serverless platforms
+            _service = build("gmail", "v1", credentials=_creds, cache_discovery=False)
+        else:
+            _refresh_if_expired(_creds)
+        return _service
+
+
+def reset_service() -> None:
+    """Drop the cached client (e.g. in a freshly forked worker process)."""
+    global _creds, _service
+    with _service_lock:
+        _creds = None
+        _service = None
+
+
+def is_transient(exc: Exception) -> bool:
+    """Whether a send failure is worth retrying: rate limits, 5xx, network errors."""
+    if isinstance(exc, HttpError):
+        return exc.resp.status in RETRYABLE_STATUSES
+    return isinstance(exc, (OSError, TimeoutError))
 
 
 # ─────────────────────────────────────────────────────────────
@@ -102,14 +156,31 @@ def _compose_raw_message(to_email: str, subject: str, body: str) -> str:
     return base64.urlsafe_b64encode(msg.as_bytes()).decode()
 
 
+def _send_request(service, raw_message: str):
+    return service.users().messages().send(userId="me", body={"raw": raw_message})
+
+
 def _send_raw(raw_message: str):
-    service = _gmail_service()
-    return (
-        service.users()
-        .messages()
-        .send(userId="me", body={"raw": raw_message})
-        .execute()
-    )
+    return _send_request(_gmail_service(), raw_message).execute()
+
+
+def _stub_send(to_email: str, subject: str) -> str:
+    if BACKENDS.STUB_LATENCY_MS:
+        time.sleep(BACKENDS.STUB_LATENCY_MS / 1000)
+    log.info("📭 [stub] Email to %s not sent: %s", to_email, subject)
+    return "stub"
+
+
+def deliver(to_email: str, subject: str, body: str) -> str:
+    """
+    Send one email and return the Gmail message id. Raises on failure so the
+    Celery email task can decide whether to retry.
+    """
+    if STUB_EMAIL:
+        return _stub_send(to_email, subject)
+    resp = _send_raw(_compose_raw_message(to_email, subject, body))
+    log.info("📤 Email sent to %s. Message ID: %s", to_email, resp.get("id"))
+    return resp.get("id")
 
 
 # ─────────────────────────────────────────────────────────────
@@ -119,10 +190,8 @@ def send_mail(to_email: str, subject: str, body: str) -> bool:
     """
     Send a plain-text email. Returns True if sent, False otherwise.
     """
-    raw = _compose_raw_message(to_email, subject, body)
     try:
-        resp = _send_raw(raw)
-        log.info("📤 Email sent to %s. Message ID: %s", to_email, resp.get("id"))
+        deliver(to_email, subject, body)
         return True
     except HttpError as api_err:
         log.error("❌ Gmail API error: %s", api_err)
@@ -131,46 +200,11 @@ def send_mail(to_email: str, subject: str, body: str) -> bool:
     return False
 
 
-# Domain templates (trim indentation w/ textwrap.dedent to keep code readable)
-RESET_TEMPLATE = textwrap.dedent("""\
-    Hello {user_name},
-
-    You requested to reset your password.
-
-    🔒 Code: {code}
-
-    ⚡ This code will expire in 10 minutes.
-
-    If you did not request a password reset, please ignore this email.
-
-    Thank you,
-    Smart Learning Companion Team
-""")
-
-REG_TEMPLATE = textwrap.dedent("""\
-    Hello {user_name},
-
-    Thank you for registering with Smart Learning Companion.
-
-    Here is your registration verification code:
-
-    🔒 Code: {code}
-
-    ⚡ This code will expire in 10 minutes.
-
-    If you did not request a registration, please ignore this email.
-
-    Thank you,
-    Smart Learning Companion Team
-""")
-
-
 def send_email(recipient_email: str, code: str, user_name: str) -> bool:
     """
     Password reset email (kept name from your original code).
     """
-    subject = f"Your Account Reset Code {code}"
-    body = RESET_TEMPLATE.format(user_name=user_name, code=code)
+    subject, body = reset_message(code, user_name)
     return send_mail(recipient_email, subject, body)
 
 
@@ -178,8 +212,7 @@ def send_registration_email(recipient_email: str, code: str, user_name: str) ->
     """
     Registration verification email (kept name from your original code).
     """
-    subject = f"Your Registration Verification Code {code}"
-    body = REG_TEMPLATE.format(user_name=user_name, code=code)
+    subject, body = registration_message(code, user_name)
     return send_mail(recipient_email, subject, body)
 
 
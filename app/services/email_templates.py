@@ -0,0 +1,58 @@
+"""
+Email subjects and bodies.
+
+Kept apart from ``email_helper`` so the web tier can render messages without
+importing the Google API client; delivery happens on the email worker.
+"""
+
+import textwrap
+
+# Domain templates (trim indentation w/ textwrap.dedent to keep code readable)
+RESET_TEMPLATE = textwrap.dedent("""\
+    Hello {user_name},
+
+    You requested to reset your password.
+
+    🔒 Code: {code}
+
+    ⚡ This code will expire in 10 minutes.
+
+    If you did not request a password reset, please ignore this email.
+
+    Thank you,
+    Smart Learning Companion Team
+""")
+
+REG_TEMPLATE = textwrap.dedent("""\
+    Hello {user_name},
+
+    Thank you for registering with Smart Learning Companion.
+
+    Here is your registration verification code:
+
+    🔒 Code: {code}
+
+    ⚡ This code will expire in 10 minutes.
+
+    If you did not request a registration, please ignore this email.
+
+    Thank you,
+    Smart Learning Companion Team
+""")
+
+
+def reset_message(code: str, user_name: str) -> tuple[str, str]:
+    """
+    (subject, body) of the password reset email.
+    """
+    return f"Your Account Reset Code {code}", RESET_TEMPLATE.format(user_name=user_name, code=code)
+
+
+def registration_message(code: str, user_name: str) -> tuple[str, str]:
+    """
+    (subject, body) of the registration verification email.
+    """
+    return (
+        f"Your Registration Verification Code {code}",
+        REG_TEMPLATE.format(user_name=user_name, code=code),
+    )
@@ -0,0 +1,104 @@
+"""
+Build-time rendering of generated course markdown to sanitized HTML.
+
+Course content never changes once built, so ``create_course_for_topic``
+renders every subsection once, after generation, and stores the HTML next
+to the markdown (``html`` beside ``content``). ``GET /courses/{course_id}``
+with ``format=html`` then serves it as-is instead of every client parsing
+and highlighting the markdown on every view.
+
+Fenced code blocks are highlighted with Pygments into ``<span class=..>``
+tokens inside ``<div class="highlight">``; ``stylesheet()`` returns the
+matching CSS. The generated HTML is passed through an allow-list sanitizer
+(nh3), since the markdown comes from a model and may contain raw HTML.
+"""
+
+import threading
+from functools import lru_cache
+
+HIGHLIGHT_CLASS = "highlight"
+PYGMENTS_STYLE = "default"
+
+EXTENSIONS = ["fenced_code", "codehilite", "tables", "sane_lists"]
+EXTENSION_CONFIGS = {
+    # No lexer guessing: untagged blocks stay plain rather than mis-highlighted
+    "codehilite": {"css_class": HIGHLIGHT_CLASS, "guess_lang": False},
+    # Column alignment as align="..." rather than a style attribute, which the sanitizer strips
+    "tables": {"use_align_attribute": True},
+}
+
+ALLOWED_TAGS = {
+    "a", "abbr", "b", "blockquote", "br", "code", "del", "div", "em", "h1", "h2", "h3", "h4",
+    "h5", "h6", "hr", "i", "img", "kbd", "li", "ol", "p", "pre", "span", "strong", "sub", "sup",
+    "table", "tbody", "td", "th", "thead", "tr", "ul",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "title"},
+    "code": {"class"},
+    "div": {"class"},
+    "span": {"class"},
+    "td": {"align"},
+    "th": {"align"},
+    "ol": {"start"},
+}
+URL_SCHEMES = {"http", "https", "mailto"}
+
+# Markdown instances keep per-document state and are not thread-safe
+_local = threading.local()
+
+
+def _converter() -> "markdown.Markdown":
+    if not hasattr(_local, "converter"):
+        # Rendering happens at build time; keep markdown and Pygments out of web startup
+        import markdown
+
+        _local.converter = markdown.Markdown(extensions=EXTENSIONS, extension_configs=EXTENSION_CONFIGS)
+    return _local.converter
+
+
+def sanitize(html: str) -> str:
+    import nh3
+
+    return nh3.clean(
+        html,
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        url_schemes=URL_SCHEMES,
+        link_rel="noopener noreferrer nofollow",
+    )
+
+
+def render(text: str) -> str:
+    converter = _converter()
+    try:
+        return sanitize(converter.convert(text or ""))
+    finally:
+        converter.reset()
+
+
+def render_course(course_details: dict, rendered: dict = None) -> dict:
+    """
+    Copy of ``course_details`` with ``html`` added to every subsection that
+    lacks it. ``rendered`` optionally caches markdown -> HTML across calls.
+    """
+    rendered = {} if rendered is None else rendered
+    sections = []
+    for section in course_details.get("sections", []):
+        subsections = []
+        for subsection in section.get("subsections", []):
+            if "html" not in subsection:
+                text = subsection.get("content") or ""
+                if text not in rendered:
+                    rendered[text] = render(text)
+                subsection = {**subsection, "html": rendered[text]}
+            subsections.append(subsection)
+        sections.append({**section, "subsections": subsections})
+    return {**course_details, "sections": sections}
+
+
+@lru_cache
+def stylesheet() -> str:
+    from pygments.formatters import HtmlFormatter
+
+    return HtmlFormatter(style=PYGMENTS_STYLE).get_style_defs(f".{HIGHLIGHT_CLASS}")
@@ -0,0 +1,136 @@
+"""
+Redis counters in front of the ``analytics_daily`` / ``analytics_hourly`` tables.
+
+Every signup, enrollment, progress update and quiz pass used to upsert the
+same metric/day and metric/hour rows inside the request transaction, so
+concurrent writers queued on those row locks until commit. Events now
+``HINCRBY`` a Redis hash instead, and the ``flush_analytics_counters`` Celery
+beat job folds the accumulated counts into the tables in one statement per
+table.
+
+Counts live in ``PENDING_KEY`` until a flush starts, then in ``FLUSHING_KEY``
+until the flush commits. A failed flush leaves ``FLUSHING_KEY`` in place and
+the next one adds the new counts to it and retries. The flush lock carries a
+random token and is renewed right before the commit, so a flush whose lock
+expired rolls back instead of committing counts a newer flush also took.
+"""
+
+import logging
+import secrets
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.db import redis_db
+
+log = logging.getLogger(__name__)
+
+PENDING_KEY = "analytics:pending"
+FLUSHING_KEY = "analytics:flushing"
+FLUSH_LOCK_KEY = "analytics:flush_lock"
+FLUSH_LOCK_SECONDS = 120
+
+DAY = "day"
+HOUR = "hour"
+
+# Add pending counts to the flushing hash and hand back the result
+_TAKE_SCRIPT = redis_db.register_script(
+    """
+    local entries = redis.call('HGETALL', KEYS[1])
+    for i = 1, #entries, 2 do
+        redis.call('HINCRBY', KEYS[2], entries[i], entries[i + 1])
+    end
+    redis.call('DEL', KEYS[1])
+    return redis.call('HGETALL', KEYS[2])
+    """
+)
+
+# The lock holds its owner's token; only the owner may renew or release it,
+# so a flush that outlived FLUSH_LOCK_SECONDS cannot free a newer flush's lock
+_RENEW_LOCK_SCRIPT = redis_db.register_script(
+    """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('EXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+)
+
+_RELEASE_LOCK_SCRIPT = redis_db.register_script(
+    """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+)
+
+# Drop the committed counts and release the lock, if still the owner
+_DONE_SCRIPT = redis_db.register_script(
+    """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[2], KEYS[1])
+    end
+    return 0
+    """
+)
+
+
+def _field(metric: str, bucket: str, period: str) -> str:
+    return f"{metric}|{bucket}|{period}"
+
+
+def record(metric: str, amount: int = 1, at: datetime = None) -> bool:
+    """
+    Count ``amount`` events of ``metric``. Returns ``False`` if Redis is
+    unavailable, so callers can write the count to Postgres directly.
+    """
+    at = (at or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    hour = at.replace(minute=0, second=0, microsecond=0)
+    try:
+        pipe = redis_db.get_redis_client().pipeline(transaction=False)
+        pipe.hincrby(PENDING_KEY, _field(metric, DAY, hour.date().isoformat()), amount)
+        pipe.hincrby(PENDING_KEY, _field(metric, HOUR, hour.isoformat()), amount)
+        pipe.execute()
+    except redis_db.RedisError as exc:
+        log.warning("Analytics counter update failed: %s", exc)
+        return False
+    return True
+
+
+def take_for_flush() -> Optional[tuple]:
+    """
+    Claim the counts for flushing as ``(token, {(metric, bucket, period): count})``;
+    ``None`` if another flush holds the lock. ``token`` identifies this flush's
+    lock for ``hold_flush_lock``, ``flush_done`` and ``flush_failed``.
+    """
+    token = secrets.token_hex(16)
+    if not redis_db.get_redis_client().set(FLUSH_LOCK_KEY, token, nx=True, ex=FLUSH_LOCK_SECONDS):
+        return None
+    raw = _TAKE_SCRIPT(keys=[PENDING_KEY, FLUSHING_KEY])
+    counts = {}
+    for field, value in zip(raw[0::2], raw[1::2]):
+        metric, bucket, period = field.split("|")
+        if bucket == DAY:
+            period = datetime.fromisoformat(period).date()
+        else:
+            period = datetime.fromisoformat(period)
+        counts[(metric, bucket, period)] = int(value)
+    return token, counts
+
+
+def hold_flush_lock(token: str) -> bool:
+    """
+    Renew the lock for another ``FLUSH_LOCK_SECONDS`` if ``token`` still owns
+    it. ``False`` means the lock expired and another flush may have taken the
+    same counts, so this one must not commit them.
+    """
+    return bool(_RENEW_LOCK_SCRIPT(keys=[FLUSH_LOCK_KEY], args=[token, FLUSH_LOCK_SECONDS]))
+
+
+def flush_done(token: str) -> None:
+    _DONE_SCRIPT(keys=[FLUSH_LOCK_KEY, FLUSHING_KEY], args=[token])
+
+
+def flush_failed(token: str) -> None:
+    # Leave FLUSHING_KEY in place; the next flush adds to it and retries
+    _RELEASE_LOCK_SCRIPT(keys=[FLUSH_LOCK_KEY], args=[token])
@@ -0,0 +1,238 @@
+"""
+Prometheus metrics for the API, Postgres, Mongo and Celery.
+
+With several uvicorn workers (or Celery's prefork children) every process has
+its own counters. Set ``PROMETHEUS_MULTIPROC_DIR`` to an empty directory
+before the processes start: prometheus_client then backs every metric with a
+file per process there and ``registry`` aggregates all of them, whichever
+worker serves the scrape. Without it, metrics are kept in memory for the
+single process. The API and the Celery workers serve metrics on their own
+ports (``API_METRICS_PORT``, ``CELERY_METRICS_PORT``), never on the public
+API port.
+
+Per-request database cost is collected in a ``RequestStats`` held in a
+context variable: the SQLAlchemy engine events and the pymongo command
+listener (through ``observe_mongo_command``) add to it, and the middleware
+observes it when the response is done.
+Starlette copies the context into the threadpool that runs sync endpoints,
+so queries made there are attributed to the right request.
+"""
+
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    multiprocess,
+    start_http_server,
+)
+from sqlalchemy import event
+
+from app.db import database
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 200)
+TASK_BUCKETS = (0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled.", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency.", ["method", "route"]
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being handled.", ["method"],
+    multiprocess_mode="livesum",
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL statements executed per request.", ["route"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request.", ["route"]
+)
+REQUEST_MONGO_SECONDS = Histogram(
+    "http_request_mongo_seconds", "Time spent in Mongo commands per request.", ["route"]
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "SQL statement latency.", ["statement"]
+)
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongo_command_duration_seconds", "Mongo command latency.", ["command"]
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "Mongo commands that failed.", ["command"]
+)
+CONTENT_DECODE_SECONDS = Histogram(
+    "course_content_decode_seconds", "Time to decompress the stored content of a course or section.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+CELERY_TASK_SECONDS = Histogram(
+    "celery_task_duration_seconds", "Celery task run time.", ["task", "state"],
+    buckets=TASK_BUCKETS,
+)
+
+
+class RequestStats:
+    __slots__ = ("db_queries", "db_seconds", "mongo_seconds")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.mongo_seconds = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+# ─────────────────────────────────────────────
+# POSTGRES
+# ─────────────────────────────────────────────
+def _statement_kind(statement: str) -> str:
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    if keyword in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+        return keyword
+    return "OTHER"
+
+
+@event.listens_for(database.engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started_at = time.perf_counter()
+
+
+@event.listens_for(database.engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started_at
+    DB_QUERY_SECONDS.labels(_statement_kind(statement)).observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+
+
+# ─────────────────────────────────────────────
+# MONGO
+# ─────────────────────────────────────────────
+def observe_mongo_command(command: str, seconds: float, failed: bool = False) -> None:
+    """
+    Called by the command listener in ``mongo_monitoring``, which is
+    registered on the client in ``mongo_db.get_mongo_client``.
+    """
+    MONGO_COMMAND_SECONDS.labels(command).observe(seconds)
+    if failed:
+        MONGO_COMMAND_FAILURES.labels(command).inc()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.mongo_seconds += seconds
+
+
+# ─────────────────────────────────────────────
+# CELERY
+# ─────────────────────────────────────────────
+def observe_task(task_name: str, state: str, seconds: float) -> None:
+    CELERY_TASK_SECONDS.labels(task_name, state or "UNKNOWN").observe(seconds)
+
+
+# ─────────────────────────────────────────────
+# HTTP
+# ─────────────────────────────────────────────
+def route_template(scope) -> str:
+    """
+    Path template of the route that handled the request (/courses/{course_id}),
+    never the raw path. The router records it in the scope, so this is only
+    known once the request has been routed.
+    """
+    route = scope.get("route")
+    return getattr(route, "path_format", None) or getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class PrometheusMiddleware:
+    """
+    Pure ASGI middleware: times each HTTP request by route template, tracks
+    in-flight requests per method and observes the request's SQL and Mongo cost.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        in_progress = HTTP_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - started_at)
+            HTTP_REQUESTS.labels(method, route, str(status["code"])).inc()
+            REQUEST_DB_QUERIES.labels(route).observe(stats.db_queries)
+            REQUEST_DB_SECONDS.labels(route).observe(stats.db_seconds)
+            REQUEST_MONGO_SECONDS.labels(route).observe(stats.mongo_seconds)
+            in_progress.dec()
+            _request_stats.reset(token)
+
+
+# ─────────────────────────────────────────────
+# EXPOSITION
+# ─────────────────────────────────────────────
+def registry() -> CollectorRegistry:
+    """
+    Registry to expose: the aggregate of every process in multiprocess mode.
+    """
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    collector_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collector_registry)
+    return collector_registry
+
+
+def serve(port: int):
+    """
+    Serve ``/metrics`` on ``port``, apart from the public API, so route
+    templates, query counts and pool state are only reachable by the scraper.
+
+    With several workers only the first to bind the port serves it; in
+    multiprocess mode its registry aggregates every worker. Returns the
+    server, or ``None`` if another worker already holds the port.
+    """
+    try:
+        server, _ = start_http_server(port, registry=registry())
+    except OSError:
+        return None
+    return server
+
+
+def mark_process_dead(pid: int) -> None:
+    """
+    Drop a finished process's live gauges so in-flight counts do not stick.
+    """
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,63 @@
+"""
+One-time verification codes in Redis.
+
+Each pending code is a single hash keyed by purpose and email, expiring on its
+own after ``OTP_TTL_SECONDS``. Issuing a new code replaces the previous one.
+Verification is one atomic script call: it compares the code, counts wrong
+attempts and burns the code once it succeeds or ``MAX_ATTEMPTS`` is reached.
+
+Functions raise ``redis.RedisError`` so ``crud`` can fall back to the
+Postgres tables.
+"""
+
+from app.db import redis_db
+
+OTP_KEY = "otp:{purpose}:{email}"
+OTP_TTL_SECONDS = 10 * 60
+MAX_ATTEMPTS = 5
+
+REGISTRATION = "register"
+PASSWORD_RESET = "reset"
+
+VERIFIED = "verified"
+INVALID = "invalid"
+EXPIRED = "expired"
+LOCKED = "locked"
+
+_VERIFY_SCRIPT = redis_db.register_script(
+    """
+    local stored = redis.call('HGET', KEYS[1], 'code')
+    if not stored then
+        return 'expired'
+    end
+    if stored == ARGV[1] then
+        redis.call('DEL', KEYS[1])
+        return 'verified'
+    end
+    if redis.call('HINCRBY', KEYS[1], 'attempts', 1) >= tonumber(ARGV[2]) then
+        redis.call('DEL', KEYS[1])
+        return 'locked'
+    end
+    return 'invalid'
+    """
+)
+
+
+def _key(purpose: str, email: str) -> str:
+    return OTP_KEY.format(purpose=purpose, email=email.strip().lower())
+
+
+def issue(purpose: str, email: str, code: str) -> None:
+    key = _key(purpose, email)
+    pipe = redis_db.get_redis_client().pipeline()
+    pipe.delete(key)
+    pipe.hset(key, mapping={"code": code, "attempts": 0})
+    pipe.expire(key, OTP_TTL_SECONDS)
+    pipe.execute()
+
+
+def verify(purpose: str, email: str, code: str) -> str:
+    """
+    Return ``VERIFIED``, ``INVALID``, ``EXPIRED`` (no live code) or ``LOCKED``.
+    """
+    return _VERIFY_SCRIPT(keys=[_key(purpose, email)], args=[code, MAX_ATTEMPTS])
@@ -0,0 +1,96 @@
+"""
+Connection pool utilization across processes.
+
+Every uvicorn and Celery process has its own Postgres and Mongo pools, so a
+single process cannot see the whole picture. Each process publishes its
+snapshot to a Redis hash at most every ``PUBLISH_INTERVAL_SECONDS``, piggy
+backing on Postgres checkouts once ``install`` has been called at process
+startup, and ``collect`` reads all of them. Idle
+processes stop publishing and age out after ``STALE_AFTER_SECONDS``.
+"""
+
+import json
+import logging
+import os
+import socket
+import time
+
+from sqlalchemy import event
+
+from app.db import database, mongo_db, redis_db
+
+log = logging.getLogger(__name__)
+
+STATS_KEY = "pools:stats"
+PUBLISH_INTERVAL_SECONDS = 15
+STALE_AFTER_SECONDS = 120
+
+_last_published = 0.0
+
+
+def _process_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def snapshot() -> dict:
+    return {
+        "process": _process_id(),
+        "at": time.time(),
+        "postgres": database.pool_status(),
+        "mongo": mongo_db.pool_status(),
+    }
+
+
+def publish() -> None:
+    global _last_published
+    _last_published = time.monotonic()
+    try:
+        redis_db.get_redis_client().hset(STATS_KEY, _process_id(), json.dumps(snapshot()))
+    except redis_db.RedisError as exc:
+        log.warning("Pool stats publish failed: %s", exc)
+
+
+def _publish_on_checkout(dbapi_connection, connection_record, connection_proxy):
+    if time.monotonic() - _last_published >= PUBLISH_INTERVAL_SECONDS:
+        publish()
+
+
+def install(engine) -> None:
+    if not event.contains(engine, "checkout", _publish_on_checkout):
+        event.listen(engine, "checkout", _publish_on_checkout)
+
+
+def collect() -> dict:
+    """
+    Live snapshots of every process plus totals; prunes stale entries.
+    """
+    publish()
+    try:
+        raw = redis_db.get_redis_client().hgetall(STATS_KEY)
+    except redis_db.RedisError as exc:
+        log.warning("Pool stats unavailable, reporting this process only: %s", exc)
+        raw = {_process_id(): json.dumps(snapshot())}
+    cutoff = time.time() - STALE_AFTER_SECONDS
+    processes, stale = [], []
+    for process, payload in raw.items():
+        stats = json.loads(payload)
+        if stats["at"] < cutoff:
+            stale.append(process)
+        else:
+            processes.append(stats)
+    if stale:
+        try:
+            redis_db.get_redis_client().hdel(STATS_KEY, *stale)
+        except redis_db.RedisError:
+            pass
+
+    totals = {
+        "postgres_checked_out": sum(p["postgres"].get("checked_out", 0) for p in processes),
+        "postgres_capacity": sum(
+            p["postgres"].get("size", 0) + p["postgres"].get("max_overflow", 0) for p in processes
+        ),
+        "mongo_checked_out": sum(p["mongo"]["checked_out"] for p in processes),
+        "mongo_open": sum(p["mongo"]["open"] for p in processes),
+    }
+    processes.sort(key=lambda p: p["process"])
+    return {"processes": processes, "totals": totals}
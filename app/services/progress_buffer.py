@@ -0,0 +1,118 @@
+"""
+Write-behind buffer for course progress.
+
+Progress pings arrive many times a minute per active learner. With
+``PROGRESS_WRITE_BEHIND`` enabled, each ping only updates a Redis hash that
+keeps the highest progress seen per (user, course). A Celery beat job moves
+the hash aside and writes it to Postgres as one batched upsert.
+
+Entries live in ``PENDING_KEY`` until a flush starts, then in ``FLUSHING_KEY``
+until the flush commits. Reads merge both.
+"""
+
+import logging
+from typing import Iterable, Optional
+
+from app.db import redis_db
+
+log = logging.getLogger(__name__)
+
+PENDING_KEY = "progress:pending"
+FLUSHING_KEY = "progress:flushing"
+FLUSH_LOCK_KEY = "progress:flush_lock"
+FLUSH_LOCK_SECONDS = 120
+
+# Keep the monotonic max of the new value, the pending value and the in-flight value,
+# and return that max
+_RECORD_SCRIPT = redis_db.register_script(
+    """
+    local new = tonumber(ARGV[2])
+    local pending = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '-1')
+    local flushing = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '-1')
+    if new > pending and new > flushing then
+        redis.call('HSET', KEYS[1], ARGV[1], new)
+        return new
+    end
+    return math.max(pending, flushing)
+    """
+)
+
+# Merge pending into the flushing hash (max per field) and hand back the result
+_TAKE_SCRIPT = redis_db.register_script(
+    """
+    local entries = redis.call('HGETALL', KEYS[1])
+    for i = 1, #entries, 2 do
+        local current = tonumber(redis.call('HGET', KEYS[2], entries[i]) or '-1')
+        if tonumber(entries[i + 1]) > current then
+            redis.call('HSET', KEYS[2], entries[i], entries[i + 1])
+        end
+    end
+    redis.call('DEL', KEYS[1])
+    return redis.call('HGETALL', KEYS[2])
+    """
+)
+
+
+def _field(user_id: int, course_id: int) -> str:
+    return f"{user_id}:{course_id}"
+
+
+def record(user_id: int, course_id: int, progress: int) -> int:
+    """
+    Buffer a progress value and return the highest buffered value for the
+    pair. Raises ``redis.RedisError`` so callers can write through.
+    """
+    return int(
+        _RECORD_SCRIPT(keys=[PENDING_KEY, FLUSHING_KEY], args=[_field(user_id, course_id), progress])
+    )
+
+
+def pending_progress(pairs: Iterable[tuple]) -> dict:
+    """
+    Unflushed progress for the given ``(user_id, course_id)`` pairs.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return {}
+    fields = [_field(user_id, course_id) for user_id, course_id in pairs]
+    try:
+        pipe = redis_db.get_redis_client().pipeline(transaction=False)
+        pipe.hmget(PENDING_KEY, fields)
+        pipe.hmget(FLUSHING_KEY, fields)
+        pending, flushing = pipe.execute()
+    except redis_db.RedisError as exc:
+        log.warning("Progress buffer read failed: %s", exc)
+        return {}
+
+    merged = {}
+    for pair, a, b in zip(pairs, pending, flushing):
+        values = [int(v) for v in (a, b) if v is not None]
+        if values:
+            merged[pair] = max(values)
+    return merged
+
+
+def take_for_flush() -> Optional[dict]:
+    """
+    Claim the buffer for flushing; ``None`` if another flush holds the lock.
+    """
+    if not redis_db.get_redis_client().set(FLUSH_LOCK_KEY, 1, nx=True, ex=FLUSH_LOCK_SECONDS):
+        return None
+    raw = _TAKE_SCRIPT(keys=[PENDING_KEY, FLUSHING_KEY])
+    entries = {}
+    for field, value in zip(raw[0::2], raw[1::2]):
+        user_id, course_id = field.split(":")
+        entries[(int(user_id), int(course_id))] = int(value)
+    return entries
+
+
+def flush_done() -> None:
+    pipe = redis_db.get_redis_client().pipeline()
+    pipe.delete(FLUSHING_KEY)
+    pipe.delete(FLUSH_LOCK_KEY)
+    pipe.execute()
+
+
+def flush_failed() -> None:
+    # Leave FLUSHING_KEY in place; the next flush merges into it and retries
+    redis_db.get_redis_client().delete(FLUSH_LOCK_KEY)
@@ -0,0 +1,54 @@
+"""
+Per-course quiz cache.
+
+Quizzes never change after ``create_course_for_topic`` generates them, so the
+whole course's quizzes are stored in Redis, grouped by section index, as soon
+as generation finishes. Opening a course then costs one cached read instead
+of two queries per section.
+"""
+
+import json
+import logging
+from typing import Iterable, Optional
+
+from app.db import redis_db
+
+log = logging.getLogger(__name__)
+
+QUIZ_KEY = "quiz:course:{course_id}"
+# Entries are immutable; the TTL only bounds memory for rarely opened courses
+QUIZ_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def _key(course_id: int) -> str:
+    return QUIZ_KEY.format(course_id=course_id)
+
+
+def store(course_id: int, sections: dict) -> None:
+    """
+    ``sections`` maps section index to the list of quiz payloads.
+    """
+    payload = json.dumps({str(index): quizzes for index, quizzes in sections.items()})
+    try:
+        redis_db.get_redis_client().set(_key(course_id), payload, ex=QUIZ_TTL_SECONDS)
+    except redis_db.RedisError as exc:
+        log.warning("Quiz cache write failed for course %s: %s", course_id, exc)
+
+
+def load(course_id: int) -> Optional[dict]:
+    try:
+        raw = redis_db.get_redis_client().get(_key(course_id))
+    except redis_db.RedisError as exc:
+        log.warning("Quiz cache read failed for course %s: %s", course_id, exc)
+        return None
+    return json.loads(raw) if raw else None
+
+
+def delete(course_ids: Iterable[int]) -> None:
+    keys = [_key(course_id) for course_id in course_ids]
+    if not keys:
+        return
+    try:
+        redis_db.get_redis_client().delete(*keys)
+    except redis_db.RedisError as exc:
+        log.warning("Quiz cache delete failed: %s", exc)
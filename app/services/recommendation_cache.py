@@ -0,0 +1,104 @@
+"""
+Per-user recommendation result cache.
+
+A user's recommendations only change when they enroll, change their topic
+preferences, or when the catalog changes. The full list is computed once,
+cached in Redis with a TTL and paged over, so repeat page loads neither
+recompute nor reshuffle it.
+
+User-level events bump that user's generation and delete their entry.
+Catalog-wide events bump a global generation number, which expires every
+entry at once in O(1). A list is only stored if neither generation moved
+while it was being computed, so a request racing an enrollment cannot put
+back a list from before it.
+"""
+
+import json
+import logging
+from typing import Optional
+
+from app.db import redis_db
+
+log = logging.getLogger(__name__)
+
+CACHE_KEY = "reco:cache:user:{user_id}"
+GENERATION_KEY = "reco:cache:generation"
+USER_GENERATION_KEY = "reco:cache:generation:user:{user_id}"
+CACHE_TTL_SECONDS = 15 * 60
+# Outlives any computation that could still be holding an older value
+USER_GENERATION_TTL_SECONDS = 2 * CACHE_TTL_SECONDS
+CACHE_SIZE = 96
+
+# Store the entry only if both generations are still the ones it was computed at
+_PUT_SCRIPT = redis_db.register_script(
+    """
+    if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[1])
+        or tonumber(redis.call('GET', KEYS[3]) or '0') ~= tonumber(ARGV[2]) then
+        return 0
+    end
+    redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[4])
+    return 1
+    """
+)
+
+
+def _key(user_id: int) -> str:
+    return CACHE_KEY.format(user_id=user_id)
+
+
+def _user_generation_key(user_id: int) -> str:
+    return USER_GENERATION_KEY.format(user_id=user_id)
+
+
+def get(user_id: int) -> tuple:
+    """
+    Return ``(courses, generation)``; ``courses`` is ``None`` on a miss.
+
+    Pass the generation back to ``put`` so a list computed before a catalog
+    change or one of the user's own changes is never stored as current.
+    """
+    try:
+        raw, global_generation, user_generation = redis_db.get_redis_client().mget(
+            _key(user_id), GENERATION_KEY, _user_generation_key(user_id)
+        )
+    except redis_db.RedisError as exc:
+        log.warning("Recommendation cache read failed: %s", exc)
+        return None, None
+    generation = [int(global_generation or 0), int(user_generation or 0)]
+    if not raw:
+        return None, generation
+    entry = json.loads(raw)
+    if entry["generation"] != generation:
+        return None, generation
+    return entry["courses"], generation
+
+
+def put(user_id: int, courses: list, generation: Optional[list]) -> None:
+    if generation is None:
+        return
+    entry = json.dumps({"generation": generation, "courses": courses}, default=str)
+    try:
+        _PUT_SCRIPT(
+            keys=[_key(user_id), GENERATION_KEY, _user_generation_key(user_id)],
+            args=[generation[0], generation[1], entry, CACHE_TTL_SECONDS],
+        )
+    except redis_db.RedisError as exc:
+        log.warning("Recommendation cache write failed: %s", exc)
+
+
+def invalidate_user(user_id: int) -> None:
+    try:
+        pipe = redis_db.get_redis_client().pipeline(transaction=True)
+        pipe.incr(_user_generation_key(user_id))
+        pipe.expire(_user_generation_key(user_id), USER_GENERATION_TTL_SECONDS)
+        pipe.delete(_key(user_id))
+        pipe.execute()
+    except redis_db.RedisError as exc:
+        log.warning("Recommendation cache invalidation failed for user %s: %s", user_id, exc)
+
+
+def invalidate_all() -> None:
+    try:
+        redis_db.get_redis_client().incr(GENERATION_KEY)
+    except redis_db.RedisError as exc:
+        log.warning("Recommendation cache generation bump failed: %s", exc)
@@ -0,0 +1,110 @@
+"""
+Precomputed recommendation candidate pools.
+
+Every built course id lives in a Redis set for its topic and in one global
+set. Recommendations sample from those sets with SRANDMEMBER, which costs
+O(k) no matter how large the catalog is, instead of ``ORDER BY random()``
+over all matching rows.
+
+Pools are filled incrementally from ``crud.mark_course_as_built`` and fully
+rebuilt by the ``rebuild_recommendation_pools`` Celery task. Until the first
+rebuild has finished, ``sample`` returns ``None`` and callers use SQL.
+"""
+
+import logging
+import random
+from typing import Iterable, Optional
+
+from app.db import redis_db
+
+log = logging.getLogger(__name__)
+
+GLOBAL_POOL_KEY = "reco:pool:global"
+TOPIC_POOL_KEY = "reco:pool:topic:{topic_id}"
+POOL_READY_KEY = "reco:pool:ready"
+
+
+def _topic_key(topic_id: int) -> str:
+    return TOPIC_POOL_KEY.format(topic_id=topic_id)
+
+
+def add_course(course_id: int, topic_id: int) -> None:
+    try:
+        pipe = redis_db.get_redis_client().pipeline()
+        pipe.sadd(GLOBAL_POOL_KEY, course_id)
+        pipe.sadd(_topic_key(topic_id), course_id)
+        pipe.execute()
+    except redis_db.RedisError as exc:
+        log.warning("Could not add course %s to recommendation pools: %s", course_id, exc)
+
+
+def remove_topic(topic_id: int, course_ids: Iterable[int]) -> None:
+    course_ids = list(course_ids)
+    try:
+        pipe = redis_db.get_redis_client().pipeline()
+        if course_ids:
+            pipe.srem(GLOBAL_POOL_KEY, *course_ids)
+        pipe.delete(_topic_key(topic_id))
+        pipe.execute()
+    except redis_db.RedisError as exc:
+        log.warning("Could not drop topic %s from recommendation pools: %s", topic_id, exc)
+
+
+def rebuild(rows: Iterable[tuple]) -> int:
+    """
+    Replace every pool with the given ``(course_id, topic_id)`` rows.
+    """
+    by_topic = {}
+    for course_id, topic_id in rows:
+        by_topic.setdefault(topic_id, []).append(course_id)
+
+    redis_client = redis_db.get_redis_client()
+    stale_keys = set(redis_client.scan_iter(match=TOPIC_POOL_KEY.format(topic_id="*")))
+
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(GLOBAL_POOL_KEY, *stale_keys)
+    for topic_id, course_ids in by_topic.items():
+        pipe.sadd(_topic_key(topic_id), *course_ids)
+        pipe.sadd(GLOBAL_POOL_KEY, *course_ids)
+    pipe.set(POOL_READY_KEY, 1)
+    pipe.execute()
+
+    return sum(len(ids) for ids in by_topic.values())
+
+
+def sample(
+    k: int, topic_ids: Optional[list] = None, exclude_ids: Iterable[int] = ()
+) -> Optional[list]:
+    """
+    Pick up to ``k`` distinct course ids, uniformly per pool, skipping ``exclude_ids``.
+
+    ``topic_ids=None`` samples the global pool. Returns ``None`` when the pools
+    are not ready or Redis is unavailable.
+    """
+    if k <= 0:
+        return []
+    exclude = set(exclude_ids)
+    keys = [GLOBAL_POOL_KEY] if topic_ids is None else [_topic_key(t) for t in set(topic_ids)]
+    if not keys:
+        return []
+
+    # Over-draw by the exclusion size so enough survive the filter
+    count = k + len(exclude)
+    try:
+        pipe = redis_db.get_redis_client().pipeline(transaction=False)
+        pipe.exists(POOL_READY_KEY)
+        for key in keys:
+            pipe.srandmember(key, count)
+        ready, *members = pipe.execute()
+    except redis_db.RedisError as exc:
+        log.warning("Recommendation pools unavailable: %s", exc)
+        return None
+
+    if not ready:
+        return None
+
+    candidates = list({int(m) for batch in members for m in batch} - exclude)
+    if len(candidates) > k:
+        return random.sample(candidates, k)
+    random.shuffle(candidates)
+    return candidates
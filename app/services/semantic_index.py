@@ -0,0 +1,217 @@
+"""
+In-process semantic index over course text.
+
+No embedding model or external service: each course is a sublinear TF-IDF
+vector over its title, description and generated content. A fixed random
+Gaussian matrix projects it to ``DIM`` dimensions, and rows are L2 normalised
+so a dot product is cosine similarity.
+
+The ``build_semantic_index`` Celery job computes the matrix and publishes it
+to Redis as raw float32 bytes. Web processes load it lazily into one
+contiguous NumPy array, pick up newer versions every ``REFRESH_SECONDS``, and
+answer top-K queries with a single mat-vec (well under a millisecond for a
+10k-course catalog).
+"""
+
+import logging
+import re
+import threading
+import time
+from typing import Iterable, NamedTuple, Optional
+
+from app.db import redis_db
+
+log = logging.getLogger(__name__)
+
+INDEX_KEY = "semantic:index"
+DIM = 256
+MIN_TOKEN_LENGTH = 3
+REFRESH_SECONDS = 30
+PROJECTION_SEED = 20240531
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    """
+    the and for are but not you all any can had her was one our out has have
+    this that with from they will would there their what about which when your
+    into more some than then them these also its how use using used like just
+    such each other only may can't it's over very well
+    """.split()
+)
+
+
+def tokenize(text: str) -> list:
+    return [
+        token
+        for token in _TOKEN_RE.findall((text or "").lower())
+        if len(token) >= MIN_TOKEN_LENGTH and token not in _STOPWORDS
+    ]
+
+
+def course_text(title: str, description: str, course_details: Optional[dict]) -> str:
+    parts = [title or "", description or ""]
+    for section in (course_details or {}).get("sections", []):
+        parts.append(section.get("section_title", ""))
+        for sub in section.get("subsections", []):
+            parts.append(sub.get("title", ""))
+            parts.append(sub.get("content", ""))
+    return "\n".join(parts)
+
+
+def build_vectors(texts: list) -> "np.ndarray":
+    """
+    Project TF-IDF vectors of ``texts`` to a ``len(texts) x DIM`` float32 matrix.
+    """
+    # Build side only (Celery); web processes just load the published matrix
+    import numpy as np
+    from scipy import sparse
+
+    vocabulary = {}
+    rows, cols, vals = [], [], []
+    for row, text in enumerate(texts):
+        counts = {}
+        for token in tokenize(text):
+            col = vocabulary.setdefault(token, len(vocabulary))
+            counts[col] = counts.get(col, 0) + 1
+        rows.extend([row] * len(counts))
+        cols.extend(counts.keys())
+        vals.extend(counts.values())
+
+    n_docs, n_terms = len(texts), len(vocabulary)
+    if n_docs == 0 or n_terms == 0:
+        return np.zeros((n_docs, DIM), dtype=np.float32)
+
+    tf = sparse.csr_matrix(
+        (np.asarray(vals, dtype=np.float32), (rows, cols)), shape=(n_docs, n_terms)
+    )
+    tf.data = 1.0 + np.log(tf.data)
+    df = np.bincount(tf.indices, minlength=n_terms)
+    idf = (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+    tfidf = tf.multiply(idf).tocsr()
+
+    rng = np.random.default_rng(PROJECTION_SEED)
+    projection = rng.standard_normal((n_terms, DIM), dtype=np.float32)
+    vectors = np.ascontiguousarray(tfidf @ projection, dtype=np.float32)
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    return vectors
+
+
+def publish(course_ids: list, vectors: "np.ndarray", version: str) -> None:
+    import numpy as np
+
+    ids = np.asarray(course_ids, dtype=np.int64)
+    redis_db.get_redis_binary_client().hset(
+        INDEX_KEY,
+        mapping={
+            "version": version,
+            "dim": vectors.shape[1] if vectors.ndim == 2 else DIM,
+            "ids": ids.tobytes(),
+            "vectors": np.ascontiguousarray(vectors, dtype=np.float32).tobytes(),
+        },
+    )
+
+
+class _Snapshot(NamedTuple):
+    vectors: "np.ndarray"
+    ids: "np.ndarray"
+    row_by_id: dict
+
+
+class SemanticIndex:
+    """
+    Read side of the index, shared by all requests of a process.
+
+    A refresh publishes a new immutable ``_Snapshot`` with one attribute
+    assignment; each query reads ``self._snapshot`` once, so it never mixes
+    the vectors of one version with the ids of another. NumPy is imported by
+    the first refresh that finds an index, not when the web app starts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self._snapshot: Optional[_Snapshot] = None
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < REFRESH_SECONDS:
+            return
+        with self._lock:
+            if now - self._checked_at < REFRESH_SECONDS:
+                return
+            self._checked_at = now
+            try:
+                redis_client = redis_db.get_redis_binary_client()
+                version = redis_client.hget(INDEX_KEY, "version")
+                if version is None or version == self._version:
+                    return
+                version, dim, ids, vectors = redis_client.hmget(
+                    INDEX_KEY, ["version", "dim", "ids", "vectors"]
+                )
+            except redis_db.RedisError as exc:
+                log.warning("Semantic index refresh failed: %s", exc)
+                return
+            import numpy as np
+
+            ids = np.frombuffer(ids, dtype=np.int64)
+            self._snapshot = _Snapshot(
+                vectors=np.frombuffer(vectors, dtype=np.float32).reshape(len(ids), int(dim)),
+                ids=ids,
+                row_by_id={course_id: row for row, course_id in enumerate(ids.tolist())},
+            )
+            self._version = version
+
+    @staticmethod
+    def _top_k(snapshot: _Snapshot, query: "np.ndarray", k: int, exclude: set) -> list:
+        import numpy as np
+
+        scores = snapshot.vectors @ query
+        take = min(len(scores), k + len(exclude))
+        if take <= 0:
+            return []
+        best = np.argpartition(-scores, take - 1)[:take]
+        best = best[np.argsort(-scores[best])]
+        results = []
+        for row in best:
+            course_id = int(snapshot.ids[row])
+            if course_id in exclude:
+                continue
+            results.append((course_id, float(scores[row])))
+            if len(results) == k:
+                break
+        return results
+
+    def similar(self, course_id: int, k: int = 10) -> list:
+        """
+        ``[(course_id, cosine), ...]`` most similar to ``course_id``.
+        """
+        self._refresh()
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+        row = snapshot.row_by_id.get(course_id)
+        if row is None:
+            return []
+        return self._top_k(snapshot, snapshot.vectors[row], k, {course_id})
+
+    def similar_to_many(self, course_ids: Iterable[int], k: int = 10, exclude: Iterable[int] = ()) -> list:
+        """
+        Neighbours of the centroid of ``course_ids`` (e.g. a user's enrollments).
+        """
+        self._refresh()
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+        course_ids = list(course_ids)
+        rows = [snapshot.row_by_id[c] for c in course_ids if c in snapshot.row_by_id]
+        if not rows:
+            return []
+        centroid = snapshot.vectors[rows].mean(axis=0)
+        return self._top_k(snapshot, centroid, k, set(course_ids) | set(exclude))
+
+
+semantic_index = SemanticIndex()
@@ -0,0 +1,202 @@
+"""
+Per-request SQL profiler and N+1 detector, for development and CI.
+
+Enabled with ``SQL_PROFILE=true``. Every SQL statement a request issues is
+reduced to a fingerprint (parameters, literals and IN-lists stripped) and
+counted. A fingerprint repeated ``SQL_PROFILE_REPEAT_THRESHOLD`` times within
+one request is an N+1 candidate: the same query shape issued once per row,
+typically a lazy relationship walked during serialization.
+
+Per endpoint (``"GET /topics/{topic_id}/courses"``) the profiler keeps the
+worst request seen. ``write_report`` dumps it to
+``SQL_PROFILE_DIR/sql_profile.<pid>.json`` (one file per process, written on
+shutdown); ``python -m benchmarks.sql_budget`` merges those files and checks
+them against the per-endpoint budgets in ``sql_budgets.json``.
+
+With ``SQL_PROFILE_BUDGETS`` pointing at a budget file, a request that goes
+over its endpoint's budget raises ``QueryBudgetExceeded`` once it completes,
+which makes a TestClient-driven test fail at the offending call.
+"""
+
+import json
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from hashlib import sha1
+from typing import Optional
+
+from sqlalchemy import event
+
+from app.services.metrics import route_template
+from config import get_sql_profiler_settings
+
+settings = get_sql_profiler_settings()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+# ─────────────────────────────────────────────
+# FINGERPRINTS
+# ─────────────────────────────────────────────
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+|:\w+|\?")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(statement: str) -> str:
+    sql = _STRING.sub("?", statement)
+    sql = _PARAM.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    # IN (?, ?, ?) has one shape whatever the list length
+    sql = _LIST.sub("(?...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def fingerprint(statement: str) -> tuple:
+    """
+    ``(short hash, normalized sql)``.
+    """
+    normalized = normalize(statement)
+    return sha1(normalized.encode()).hexdigest()[:12], normalized
+
+
+# ─────────────────────────────────────────────
+# COLLECTION
+# ─────────────────────────────────────────────
+class RequestProfile:
+    __slots__ = ("counts", "statements", "seconds")
+
+    def __init__(self):
+        self.counts = Counter()
+        self.statements = {}
+        self.seconds = 0.0
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def repeated(self) -> list:
+        return [
+            key for key, count in self.counts.items()
+            if count >= settings.SQL_PROFILE_REPEAT_THRESHOLD
+        ]
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("sql_profile", default=None)
+
+# "METHOD /route" -> aggregate; updated on the event loop thread only
+_endpoints = {}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._profile_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    if profile is None:
+        return
+    key, normalized = fingerprint(statement)
+    profile.counts[key] += 1
+    profile.statements.setdefault(key, normalized)
+    profile.seconds += time.perf_counter() - context._profile_started_at
+
+
+def install(engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def record(endpoint: str, profile: RequestProfile) -> None:
+    entry = _endpoints.setdefault(endpoint, {
+        "requests": 0,
+        "total_queries": 0,
+        "max_queries": 0,
+        "max_seconds": 0.0,
+        "n_plus_one": {},
+    })
+    entry["requests"] += 1
+    entry["total_queries"] += profile.total
+    entry["max_queries"] = max(entry["max_queries"], profile.total)
+    entry["max_seconds"] = max(entry["max_seconds"], profile.seconds)
+    for key in profile.repeated():
+        previous = entry["n_plus_one"].get(key)
+        if previous is None or profile.counts[key] > previous["max_per_request"]:
+            entry["n_plus_one"][key] = {
+                "max_per_request": profile.counts[key],
+                "sql": profile.statements[key],
+            }
+
+
+def report() -> dict:
+    return {
+        endpoint: {
+            **entry,
+            "mean_queries": round(entry["total_queries"] / entry["requests"], 2),
+        }
+        for endpoint, entry in sorted(_endpoints.items())
+    }
+
+
+def write_report(directory: str = None) -> str:
+    directory = directory or settings.SQL_PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"sql_profile.{os.getpid()}.json")
+    with open(path, "w") as f:
+        json.dump(report(), f, indent=2)
+    return path
+
+
+def reset() -> None:
+    _endpoints.clear()
+
+
+def load_budgets(path: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+# ─────────────────────────────────────────────
+# MIDDLEWARE
+# ─────────────────────────────────────────────
+class SqlProfilerMiddleware:
+    """
+    Pure ASGI middleware: profiles each request's SQL and, when budgets are
+    configured, fails requests that exceed theirs.
+    """
+
+    def __init__(self, app, budgets: dict = None):
+        self.app = app
+        self.budgets = budgets if budgets is not None else load_budgets(settings.SQL_PROFILE_BUDGETS)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            endpoint = f"{scope['method']} {route_template(scope)}"
+            record(endpoint, profile)
+
+        budget = self.budgets.get(endpoint)
+        if budget is not None and profile.total > budget:
+            repeated = ", ".join(
+                f"{profile.counts[key]}x {profile.statements[key][:120]}" for key in profile.repeated()
+            )
+            raise QueryBudgetExceeded(
+                f"{endpoint} issued {profile.total} SQL statements (budget {budget})"
+                + (f"; repeated: {repeated}" if repeated else "")
+            )
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+content_compression.py
+──────────────────────
+Train zstd dictionaries for generated course content and measure how well
+each codec compresses it and what decoding costs.
+
+    python -m benchmarks.content_compression stats --courses 500
+    python -m benchmarks.content_compression train --samples 20000 --size 112640
+    python -m benchmarks.content_compression stats --dictionary-id <id>
+
+``stats`` samples subsections from the stored catalog and, per codec and
+level, prints the compression ratio, encode and decode time per subsection
+and per course, and decode throughput. It also prints the Mongo collection
+sizes: ``size`` is the uncompressed BSON that has to fit in WiredTiger's
+cache, ``storage`` is what is on disk after block compression.
+
+``train`` trains a dictionary on a sample of subsections, stores it in
+``content_dictionaries`` and prints its id and the ratio it reaches on
+held-out subsections. To use it for new content, set
+``CONTENT_COMPRESSION=zstd`` and ``CONTENT_DICTIONARY_ID=<id>``; run
+``python -m app.db.migrations course-content`` to re-encode existing courses.
+"""
+
+import argparse
+import random
+import time
+from itertools import islice
+
+from app.db.mongo_db import get_mongo_db
+from app.services import content_codec, course_store
+
+# (codec, level)
+VARIANTS = (
+    (content_codec.ZLIB, 6),
+    (content_codec.ZLIB, 9),
+    (content_codec.ZSTD, 3),
+    (content_codec.ZSTD, 19),
+)
+
+
+def sample_subsections(mongo_db, courses: int) -> tuple:
+    """
+    ``([markdown, ...], number of courses read)``.
+    """
+    texts, read = [], 0
+    for _, details in islice(course_store.iter_courses(mongo_db), courses):
+        read += 1
+        texts += [
+            subsection["content"]
+            for section in details.get("sections", [])
+            for subsection in section.get("subsections", [])
+            if subsection.get("content")
+        ]
+    return texts, read
+
+
+def measure(mongo_db, texts: list, codec: str, level: int, dict_id: int = 0, repeat: int = 3) -> dict:
+    raw_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    started = time.perf_counter()
+    stored = [content_codec.compress(mongo_db, text, codec, level, dict_id) for text in texts]
+    encode_seconds = time.perf_counter() - started
+
+    decode_seconds = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for subsection in stored:
+            content_codec.decompress(mongo_db, subsection)
+        decode_seconds = min(decode_seconds, time.perf_counter() - started)
+
+    stored_bytes = sum(len(subsection["content_z"]) for subsection in stored)
+    return {
+        "codec": codec,
+        "level": level,
+        "dict_id": dict_id,
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "ratio": raw_bytes / stored_bytes,
+        "encode_us": encode_seconds / len(texts) * 1e6,
+        "decode_us": decode_seconds / len(texts) * 1e6,
+        "decode_mb_s": raw_bytes / decode_seconds / 1e6,
+    }
+
+
+def print_measurements(rows: list, subsections_per_course: float) -> None:
+    print(f"{'codec':6} {'level':>5} {'dictionary':>11} {'ratio':>6} {'stored KB':>10}"
+          f" {'enc µs/sub':>11} {'dec µs/sub':>11} {'dec µs/course':>14} {'dec MB/s':>9}")
+    for row in rows:
+        print(
+            f"{row['codec']:6} {row['level']:5d} {row['dict_id'] or '-':>11} {row['ratio']:6.2f}"
+            f" {row['stored_bytes'] / 1024:10.0f} {row['encode_us']:11.1f} {row['decode_us']:11.1f}"
+            f" {row['decode_us'] * subsections_per_course:14.0f} {row['decode_mb_s']:9.0f}"
+        )
+
+
+def print_collections(mongo_db) -> None:
+    print(f"\n{'collection':24} {'documents':>10} {'avg doc KB':>11} {'size MB':>9} {'storage MB':>11}")
+    existing = set(mongo_db.list_collection_names())
+    for name in (course_store.DOCUMENT_COLLECTION, course_store.HEADER_COLLECTION,
+                 course_store.SECTION_COLLECTION, "course_blobs"):
+        if name not in existing:
+            continue
+        stats = mongo_db.command("collStats", name)
+        if not stats.get("count"):
+            continue
+        print(
+            f"{name:24} {stats['count']:10d} {stats.get('avgObjSize', 0) / 1024:11.1f}"
+            f" {stats['size'] / 1e6:9.1f} {stats['storageSize'] / 1e6:11.1f}"
+        )
+
+
+def stats(args) -> None:
+    mongo_db = get_mongo_db()
+    texts, courses = sample_subsections(mongo_db, args.courses)
+    if not texts:
+        raise SystemExit("No course content found: build or seed some courses first.")
+    raw_kb = sum(len(text.encode("utf-8")) for text in texts) / 1024
+    print(f"{len(texts)} subsections from {courses} courses, {raw_kb:.0f} KB of markdown\n")
+
+    rows = [measure(mongo_db, texts, codec, level, repeat=args.repeat) for codec, level in VARIANTS]
+    dict_id = args.dictionary_id or content_codec.settings.CONTENT_DICTIONARY_ID
+    if dict_id:
+        rows += [
+            measure(mongo_db, texts, content_codec.ZSTD, level, dict_id, repeat=args.repeat)
+            for level in (3, 19)
+        ]
+    print_measurements(rows, len(texts) / courses)
+    print_collections(mongo_db)
+
+
+def train(args) -> None:
+    mongo_db = get_mongo_db()
+    texts, courses = sample_subsections(mongo_db, args.courses)
+    rng = random.Random(args.seed)
+    rng.shuffle(texts)
+    holdout = texts[:max(1, int(len(texts) * args.holdout))]
+    samples = texts[len(holdout):][:args.samples]
+    if len(samples) < 100:
+        raise SystemExit(f"Only {len(samples)} training subsections found; need at least 100.")
+
+    started = time.perf_counter()
+    dict_id = content_codec.train_dictionary(mongo_db, samples, args.size)
+    print(f"Trained dictionary {dict_id} ({args.size} bytes) on {len(samples)} subsections "
+          f"from {courses} courses in {time.perf_counter() - started:.1f}s\n")
+
+    print(f"On {len(holdout)} held-out subsections:")
+    print_measurements(
+        [
+            measure(mongo_db, holdout, content_codec.ZSTD, 19),
+            measure(mongo_db, holdout, content_codec.ZSTD, 19, dict_id),
+        ],
+        len(texts) / courses,
+    )
+    print(f"\nUse it with CONTENT_COMPRESSION=zstd CONTENT_DICTIONARY_ID={dict_id}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("stats", "train"))
+    parser.add_argument("--courses", type=int, default=2000, help="Courses to sample subsections from.")
+    parser.add_argument("--samples", type=int, default=20000, help="Training subsections (train).")
+    parser.add_argument("--size", type=int, default=112640, help="Dictionary size in bytes (train).")
+    parser.add_argument("--holdout", type=float, default=0.1, help="Share of subsections kept for evaluation.")
+    parser.add_argument("--dictionary-id", type=int, default=0, help="Also measure zstd with this dictionary.")
+    parser.add_argument("--repeat", type=int, default=3, help="Decode passes; the fastest is reported.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        train(args)
+    else:
+        stats(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+import_budget.py
+────────────────
+Measure the cold import time of the web application and fail when it goes
+over budget or pulls in modules that belong to the worker tier.
+
+Run from the project root with the same environment as the web service:
+
+    python -m benchmarks.import_budget --budget-ms 800 --runs 5
+
+Each run is a fresh interpreter (`python -X importtime -c "import app.main"`)
+and is timed by the cumulative import time of the target alone, not the
+interpreter's own startup. The fastest run is compared with the budget: a
+busy or shared machine only ever adds time, so it is the least noisy
+estimate of what importing costs. The median is printed alongside, and the
+slowest packages of the median run are listed so regressions are easy to
+attribute.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+TARGET = "app.main"
+
+# Generation and delivery stack: imported by Celery workers only. numpy, the
+# markdown renderer and the Mongo and Redis clients are loaded on first use by
+# the services that need them
+FORBIDDEN = (
+    "openai",
+    "tqdm",
+    "loguru",
+    "pymongo",
+    "redis",
+    "numpy",
+    "scipy",
+    "markdown",
+    "pygments",
+    "nh3",
+    "googleapiclient",
+    "app.celery.tasks",
+    "app.celery.email_tasks",
+)
+
+
+def _parse_importtime(stderr: str) -> list:
+    """
+    ``[(depth, module, cumulative_us), ...]`` in import (pre-)order.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, name.strip(), int(cumulative_us)))
+    # -X importtime reports a module after its children; reverse for parent-first order
+    return entries[::-1]
+
+
+def per_package(entries: list) -> dict:
+    """
+    Cumulative import time per top-level package, counted where the package is
+    first entered from a different package (so nested imports are not double counted).
+    """
+    totals, stack = {}, []
+    for depth, name, cumulative_us in entries:
+        package = name.split(".")[0]
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        if not stack or stack[-1][1] != package:
+            totals[package] = totals.get(package, 0) + cumulative_us
+        stack.append((depth, package))
+    return totals
+
+
+def measure(target: str) -> tuple:
+    """
+    One cold import. Returns ``(total_us, {package: us}, forbidden_found)``.
+    """
+    probe = (
+        f"import {target}, sys; "
+        f"print(','.join(m for m in {FORBIDDEN!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {target} failed:\n{result.stderr}")
+
+    entries = _parse_importtime(result.stderr)
+    total_us = sum(us for depth, name, us in entries if depth == 0 and name == target)
+    forbidden = [m for m in result.stdout.strip().split(",") if m]
+    return total_us, per_package(entries), forbidden
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default=TARGET, help="Module to import.")
+    parser.add_argument("--budget-ms", type=float, default=800.0, help="Maximum import time of the fastest run.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time.")
+    parser.add_argument("--top", type=int, default=15, help="Slowest packages to list.")
+    args = parser.parse_args()
+
+    runs = sorted((measure(args.target) for _ in range(args.runs)), key=lambda run: run[0])
+    total_us, packages, forbidden = runs[len(runs) // 2]
+    fastest_ms = runs[0][0] / 1000
+    median_ms = statistics.median(run[0] for run in runs) / 1000
+
+    print(
+        f"{args.target}: fastest {fastest_ms:.0f} ms, median {median_ms:.0f} ms over {args.runs} runs"
+        f" (budget {args.budget_ms:.0f} ms)"
+    )
+    print("\nSlowest packages (median run, cumulative from where each package is first entered):")
+    for name, us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if fastest_ms > args.budget_ms:
+        failures.append(f"import time {fastest_ms:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+    forbidden = sorted({module for run in runs for module in run[2]})
+    if forbidden:
+        failures.append(f"modules that must load on first use imported: {', '.join(forbidden)}")
+    if failures:
+        print("\nFAIL: " + "; ".join(failures))
+        raise SystemExit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+loadtest.py
+───────────
+Drive the learner and admin flows against a running API and report latency
+percentiles, throughput and error rate per endpoint.
+
+Start the stack with the external services stubbed and seed it first:
+
+    AI_BACKEND=stub EMAIL_BACKEND=stub docker-compose up -d
+    docker-compose run --rm web python -m benchmarks.seed --scale medium --reset
+    python -m benchmarks.loadtest --base-url http://127.0.0.1:8004 \\
+        --users 50 --admins 2 --duration 120 --learners 5000 --out medium.json
+
+Each virtual user logs in as a seeded account, then issues weighted requests
+until the run ends, logging in again every ``--session-requests``. Requests
+made during ``--warmup`` are not counted. ``--compare`` prints the change in
+p95 and throughput per endpoint against an earlier ``--out`` file, so runs
+before and after a change to ``views.py`` / ``crud.py`` can be compared.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from benchmarks.seed import ADMIN_EMAIL, PASSWORD, learner_email
+
+LOGIN = "POST /log_in"
+
+# (endpoint label, weight)
+LEARNER_ACTIONS = (
+    ("GET /topics", 10),
+    ("GET /courses/{course_id}", 25),
+    ("GET /courses/{course_id}/quizzes", 15),
+    ("PUT /courses/update_progress", 15),
+    ("GET /recommendations", 15),
+    ("GET /mycourses", 10),
+    ("GET /courses/{course_id}/similar", 5),
+    ("POST /courses/{course_id}/sections/{section_index}/quiz-complete", 5),
+)
+ADMIN_ACTIONS = (
+    ("GET /dashboard/stats", 40),
+    ("GET /analytics/timeseries", 30),
+    ("GET /topics", 15),
+    ("GET /admin/pool-stats", 10),
+    ("GET /users", 5),
+)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.counting = False
+
+    def record(self, endpoint: str, seconds: float, ok: bool) -> None:
+        if not self.counting:
+            return
+        self.latencies.setdefault(endpoint, []).append(seconds * 1000)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    # Nearest rank
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(stats: Stats, seconds: float) -> dict:
+    endpoints = {}
+    for endpoint, values in sorted(stats.latencies.items()):
+        values = sorted(values)
+        errors = stats.errors.get(endpoint, 0)
+        endpoints[endpoint] = {
+            "requests": len(values),
+            "errors": errors,
+            "error_rate": errors / len(values),
+            "rps": len(values) / seconds,
+            "p50_ms": percentile(values, 0.50),
+            "p95_ms": percentile(values, 0.95),
+            "p99_ms": percentile(values, 0.99),
+            "max_ms": values[-1],
+        }
+    requests = sum(entry["requests"] for entry in endpoints.values())
+    errors = sum(entry["errors"] for entry in endpoints.values())
+    return {
+        "seconds": seconds,
+        "requests": requests,
+        "errors": errors,
+        "error_rate": errors / requests if requests else 0.0,
+        "rps": requests / seconds,
+        "endpoints": endpoints,
+    }
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, rng: random.Random, email: str,
+                 actions: tuple, catalog: list, session_requests: int, think_ms: int):
+        self.client = client
+        self.stats = stats
+        self.rng = rng
+        self.email = email
+        self.labels = [label for label, _ in actions]
+        self.weights = [weight for _, weight in actions]
+        self.catalog = catalog
+        self.session_requests = session_requests
+        self.think_ms = think_ms
+        self.headers = {}
+        self.user_id = None
+
+    async def _call(self, endpoint: str, method: str, path: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, headers=self.headers, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(endpoint, time.perf_counter() - started, ok=False)
+            return None
+        self.stats.record(endpoint, time.perf_counter() - started, ok=response.status_code < 400)
+        return response
+
+    async def login(self) -> bool:
+        self.headers = {}
+        response = await self._call(LOGIN, "POST", "/log_in", data={"username": self.email, "password": PASSWORD})
+        if response is None or response.status_code != 200:
+            return False
+        body = response.json()
+        self.headers = {"Authorization": f"Bearer {body['access_token']}"}
+        self.user_id = body["user"]["id"]
+        return True
+
+    def _request(self, endpoint: str) -> tuple:
+        """
+        ``(method, path, kwargs)`` for one weighted action.
+        """
+        course_id = self.rng.choice(self.catalog)
+        if endpoint == "GET /topics":
+            return "GET", "/topics", {}
+        if endpoint == "GET /courses/{course_id}":
+            return "GET", f"/courses/{course_id}", {}
+        if endpoint == "GET /courses/{course_id}/quizzes":
+            return "GET", f"/courses/{course_id}/quizzes", {}
+        if endpoint == "PUT /courses/update_progress":
+            return "PUT", "/courses/update_progress", {
+                "json": {"course_id": course_id, "progress": self.rng.randint(0, 100)}
+            }
+        if endpoint == "GET /recommendations":
+            return "GET", "/recommendations", {"params": {"user_id": self.user_id, "limit": 12}}
+        if endpoint == "GET /mycourses":
+            return "GET", "/mycourses", {"params": {"user_id": self.user_id}}
+        if endpoint == "GET /courses/{course_id}/similar":
+            return "GET", f"/courses/{course_id}/similar", {"params": {"limit": 10}}
+        if endpoint == "POST /courses/{course_id}/sections/{section_index}/quiz-complete":
+            return "POST", f"/courses/{course_id}/sections/{self.rng.randint(0, 3)}/quiz-complete", {}
+        if endpoint == "GET /dashboard/stats":
+            return "GET", "/dashboard/stats", {}
+        if endpoint == "GET /analytics/timeseries":
+            end = datetime.now(timezone.utc)
+            return "GET", "/analytics/timeseries", {"params": {
+                "metric": self.rng.choice(("signups", "enrollments", "quiz_passes")),
+                "start": (end - timedelta(days=30)).isoformat(),
+                "end": end.isoformat(),
+                "granularity": "day",
+            }}
+        if endpoint == "GET /admin/pool-stats":
+            return "GET", "/admin/pool-stats", {}
+        if endpoint == "GET /users":
+            return "GET", "/users", {}
+        raise ValueError(endpoint)
+
+    async def run(self, deadline: float) -> None:
+        made = 0
+        while time.monotonic() < deadline:
+            if made % self.session_requests == 0 and not await self.login():
+                await asyncio.sleep(1)
+                continue
+            endpoint = self.rng.choices(self.labels, self.weights)[0]
+            method, path, kwargs = self._request(endpoint)
+            await self._call(endpoint, method, path, **kwargs)
+            made += 1
+            if self.think_ms:
+                await asyncio.sleep(self.rng.uniform(0, 2 * self.think_ms) / 1000)
+
+
+async def discover_catalog(client: httpx.AsyncClient) -> list:
+    response = await client.post("/log_in", data={"username": ADMIN_EMAIL, "password": PASSWORD})
+    response.raise_for_status()
+    token = response.json()["access_token"]
+    courses = await client.get("/courses", headers={"Authorization": f"Bearer {token}"})
+    courses.raise_for_status()
+    catalog = [course["id"] for course in courses.json()]
+    if not catalog:
+        raise SystemExit("No built courses found: seed the database first (python -m benchmarks.seed).")
+    return catalog
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.users + args.admins)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        catalog = await discover_catalog(client)
+        stats = Stats()
+        rng = random.Random(args.seed)
+        learners = rng.sample(range(args.learners), min(args.users, args.learners))
+        users = [
+            VirtualUser(client, stats, random.Random(rng.random()), learner_email(index),
+                        LEARNER_ACTIONS, catalog, args.session_requests, args.think_ms)
+            for index in learners
+        ] + [
+            VirtualUser(client, stats, random.Random(rng.random()), ADMIN_EMAIL,
+                        ADMIN_ACTIONS, catalog, args.session_requests, args.think_ms)
+            for _ in range(args.admins)
+        ]
+
+        started = time.monotonic()
+        deadline = started + args.warmup + args.duration
+
+        async def start(user, delay):
+            await asyncio.sleep(delay)
+            await user.run(deadline)
+
+        async def open_window():
+            await asyncio.sleep(args.warmup)
+            stats.counting = True
+
+        ramp = [args.ramp_up * index / len(users) for index in range(len(users))]
+        await asyncio.gather(open_window(), *(start(user, delay) for user, delay in zip(users, ramp)))
+        return summarize(stats, time.monotonic() - started - args.warmup)
+
+
+def print_report(result: dict, previous: dict = None) -> None:
+    header = f"{'endpoint':66} {'reqs':>7} {'rps':>7} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    if previous:
+        header += f" {'Δp95':>8} {'Δrps':>7}"
+    print(header)
+    for endpoint, entry in result["endpoints"].items():
+        line = (
+            f"{endpoint[:66]:66} {entry['requests']:7d} {entry['rps']:7.1f} {entry['error_rate'] * 100:6.2f}"
+            f" {entry['p50_ms']:8.1f} {entry['p95_ms']:8.1f} {entry['p99_ms']:8.1f} {entry['max_ms']:8.1f}"
+        )
+        before = (previous or {}).get("endpoints", {}).get(endpoint)
+        if before:
+            p95_change = (entry["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            rps_change = (entry["rps"] - before["rps"]) / before["rps"] * 100
+            line += f" {p95_change:+7.1f}% {rps_change:+6.1f}%"
+        print(line)
+    print(
+        f"\n{result['requests']} requests in {result['seconds']:.1f}s: "
+        f"{result['rps']:.1f} req/s, error rate {result['error_rate'] * 100:.2f}%"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8004")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent learner sessions.")
+    parser.add_argument("--admins", type=int, default=1, help="Concurrent admin sessions.")
+    parser.add_argument("--learners", type=int, default=200, help="Seeded learner accounts to draw from.")
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds.")
+    parser.add_argument("--warmup", type=float, default=10, help="Unmeasured seconds before the window.")
+    parser.add_argument("--ramp-up", type=float, default=5, help="Seconds over which sessions start.")
+    parser.add_argument("--think-ms", type=int, default=0, help="Mean pause between a session's requests.")
+    parser.add_argument("--session-requests", type=int, default=50, help="Requests per login.")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--label", default="", help="Free text stored in --out, e.g. the scale and commit.")
+    parser.add_argument("--out", help="Write the results as JSON.")
+    parser.add_argument("--compare", help="Earlier --out file to diff against.")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_report(result, previous)
+
+    if args.out:
+        result["label"] = args.label
+        result["args"] = {key: value for key, value in vars(args).items() if key not in ("out", "compare")}
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+query_plans.py
+──────────────
+Query plan regression suite for ``app/db/crud.py``.
+
+Runs the crud functions against a *seeded* database (``python -m
+benchmarks.seed``), captures every SQL statement they issue and re-runs each
+one under ``EXPLAIN (ANALYZE, BUFFERS)`` with the same parameters. Writes
+happen inside a transaction that is rolled back, but side effects outside
+Postgres (Redis counters and caches) are not, so use a scratch stack:
+
+    python -m benchmarks.query_plans check               # fail on regressions
+    python -m benchmarks.query_plans update              # accept current plans
+    python -m benchmarks.query_plans check --only get_enrolled_courses -v
+
+``check`` fails when a plan
+
+* sequentially scans a large table (``--large-table-rows`` estimated rows)
+  the case does not expect to read in full,
+* underestimates a node's row count by more than ``--row-factor`` (the
+  misestimate that turns hash joins into nested loops; overestimates are
+  routine under a LIMIT),
+* takes longer than the case's time limit (``--max-ms`` by default), or
+* differs in shape (node types, relations, indexes) from the baseline
+  committed in ``benchmarks/query_plans.json``.
+
+Baselines depend on the data, so record them at the scale CI seeds: the
+committed file comes from ``python -m benchmarks.seed --scale large --reset``,
+all migrations applied and ``VACUUM ANALYZE``. ``check`` exits non-zero when
+the file or a case's baseline is missing. After an intended change, run
+``update`` and commit the file so that the plan change shows up in review.
+"""
+
+import argparse
+import difflib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Callable
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session
+
+from app.db import crud, models
+from config import get_progress_buffer_settings
+
+DEFAULT_BASELINES = os.path.join(os.path.dirname(__file__), "query_plans.json")
+EXPLAIN = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+
+# Time limit for cases that read a large table in full by design
+FULL_SCAN_MS = 5000
+
+
+@dataclass
+class Case:
+    name: str
+    run: Callable
+    # Large tables this query is expected to scan in full
+    allow_seq_scan: frozenset = field(default_factory=frozenset)
+    max_ms: float = None
+
+
+def _consume(result):
+    # Streaming queries are only planned, not drained
+    if hasattr(result, "__iter__") and hasattr(result, "yield_per"):
+        return next(iter(result), None)
+    return result
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _update_progress_write_through(db, fx):
+    # The write-behind path only reads Postgres; plan the synchronous upsert
+    settings = get_progress_buffer_settings()
+    write_behind = settings.PROGRESS_WRITE_BEHIND
+    settings.PROGRESS_WRITE_BEHIND = False
+    try:
+        return crud.update_course_progress(db, fx.user_id, fx.course_id, 100)
+    finally:
+        settings.PROGRESS_WRITE_BEHIND = write_behind
+
+
+# Stand-in for generated content: only its text reaches the search vector
+COURSE_DETAILS = {
+    "sections": [
+        {
+            "section_title": "Getting started",
+            "subsections": [{"title": "Overview", "content": "What this course covers and how to use it."}],
+        },
+    ],
+}
+
+
+CASES = [
+    # Users
+    Case("get_user", lambda db, fx: crud.get_user(db, fx.user_id)),
+    Case("get_user_by_id", lambda db, fx: crud.get_user_by_id(db, fx.user_id)),
+    Case("get_user_by_email", lambda db, fx: crud.get_user_by_email(db, fx.email)),
+    Case("authenticate_user", lambda db, fx: crud.authenticate_user(db, fx.email, "not-the-password")),
+    Case("get_all_users", lambda db, fx: crud.get_all_users(db), allow_seq_scan=frozenset({"users"})),
+    Case("get_user_selected_topics", lambda db, fx: crud.get_user_selected_topics(db, fx.user_id)),
+    Case("get_user_interests", lambda db, fx: crud.get_user_interests(db, fx.user_id)),
+    Case("add_user_topic_preferences",
+         lambda db, fx: crud.add_user_topic_preferences(db, fx.user_id, [fx.new_topic_id])),
+    Case("get_pending_code_by_email", lambda db, fx: crud.get_pending_code_by_email(db, fx.email)),
+    Case("get_pending_code_by_user", lambda db, fx: crud.get_pending_code_by_user(db, fx.user_id)),
+    # Catalog
+    Case("get_all_topics", lambda db, fx: crud.get_all_topics.__wrapped__(db)),
+    Case("get_all_courses", lambda db, fx: crud.get_all_courses.__wrapped__(db)),
+    Case("get_topic_by_id", lambda db, fx: crud.get_topic_by_id.__wrapped__(db, fx.topic_id)),
+    Case("get_course_by_id", lambda db, fx: crud.get_course_by_id.__wrapped__(db, fx.course_id)),
+    Case("course_exists", lambda db, fx: crud.course_exists(db, fx.course_id)),
+    Case("get_built_courses_by_ids", lambda db, fx: crud.get_built_courses_by_ids(db, fx.course_ids)),
+    Case("get_built_course_topic_pairs", lambda db, fx: crud.get_built_course_topic_pairs(db)),
+    Case("get_built_course_summaries", lambda db, fx: crud.get_built_course_summaries(db)),
+    Case("get_topic_titles", lambda db, fx: crud.get_topic_titles(db)),
+    Case("search_courses", lambda db, fx: crud.search_courses(db, fx.search_query)),
+    Case("index_course_for_search",
+         lambda db, fx: crud.index_course_for_search(db, fx.course_id, COURSE_DETAILS)),
+    Case("mark_course_as_built", lambda db, fx: crud.mark_course_as_built(db, fx.course_id, COURSE_DETAILS)),
+    # Enrollments and progress
+    Case("get_enrolled_courses", lambda db, fx: crud.get_enrolled_courses(db, fx.user_id)),
+    Case("get_user_interested_topics", lambda db, fx: crud.get_user_interested_topics(db, fx.user_id)),
+    Case("get_topic_ids_from_enrolled_courses",
+         lambda db, fx: crud.get_topic_ids_from_enrolled_courses(db, fx.user_id)),
+    Case("get_user_course_ids", lambda db, fx: crud.get_user_course_ids(db, fx.user_id)),
+    Case("get_completed_courses", lambda db, fx: crud.get_completed_courses(db, fx.user_id)),
+    Case("get_course_interaction", lambda db, fx: crud.get_course_interaction(db, fx.course_id, fx.user_id)),
+    Case("get_recommended_courses", lambda db, fx: crud.get_recommended_courses(db, fx.user_id)),
+    Case("get_courses_by_topics",
+         lambda db, fx: crud.get_courses_by_topics(db, [fx.topic_id], fx.course_ids)),
+    Case("get_random_courses", lambda db, fx: crud.get_random_courses(db)),
+    Case("create_course_interaction",
+         lambda db, fx: crud.create_course_interaction(db, fx.user_id, fx.new_course_id)),
+    Case("update_course_progress", _update_progress_write_through),
+    Case("flush_course_progress",
+         lambda db, fx: crud.flush_course_progress(
+             db, {(fx.user_id, fx.course_id): 100, (fx.user_id, fx.new_course_id): 1})),
+    Case("get_interaction_rows", lambda db, fx: _consume(crud.get_interaction_rows(db)),
+         allow_seq_scan=frozenset({"course_interactions"}), max_ms=FULL_SCAN_MS),
+    Case("get_topic_preference_rows", lambda db, fx: _consume(crud.get_topic_preference_rows(db)),
+         allow_seq_scan=frozenset({"user_topic_preference"}), max_ms=FULL_SCAN_MS),
+    Case("get_topic_user_pairs", lambda db, fx: _consume(crud.get_topic_user_pairs(db)),
+         allow_seq_scan=frozenset({"course_interactions"}), max_ms=FULL_SCAN_MS),
+    # Quizzes
+    Case("get_course_quiz_sections", lambda db, fx: crud.get_course_quiz_sections(db, fx.course_id)),
+    Case("section_quiz_exists",
+         lambda db, fx: crud.section_quiz_exists.__wrapped__(db, fx.course_id, fx.section_index)),
+    Case("get_passed_quiz_section", lambda db, fx: crud.get_passed_quiz_section(db, fx.user_id, fx.course_id)),
+    Case("mark_quiz_passed",
+         lambda db, fx: crud.mark_quiz_passed(db, fx.user_id, fx.course_id, fx.section_index)),
+    # Admin analytics
+    Case("get_users_count", lambda db, fx: crud.get_users_count(db), allow_seq_scan=frozenset({"users"})),
+    Case("get_topics_count", lambda db, fx: crud.get_topics_count(db)),
+    Case("get_quizzes_count", lambda db, fx: crud.get_quizzes_count(db),
+         allow_seq_scan=frozenset({"section_quizzes"})),
+    Case("get_quizzes_completion_stats", lambda db, fx: crud.get_quizzes_completion_stats(db),
+         allow_seq_scan=frozenset({"section_quizzes", "course_section_quiz_progress"}), max_ms=FULL_SCAN_MS),
+    Case("get_topic_attempt_counts", lambda db, fx: crud.get_topic_attempt_counts(db, limit=3),
+         allow_seq_scan=frozenset({"course_interactions"}), max_ms=FULL_SCAN_MS),
+    Case("get_topic_attempt_counts_least", lambda db, fx: crud.get_topic_attempt_counts(db, limit=3, least=True),
+         allow_seq_scan=frozenset({"course_interactions"}), max_ms=FULL_SCAN_MS),
+    Case("get_daily_new_users_last_7_days", lambda db, fx: crud.get_daily_new_users_last_7_days(db)),
+    Case("get_daily_new_users", lambda db, fx: crud.get_daily_new_users(db)),
+    Case("record_metric", lambda db, fx: crud.record_metric(db, models.AnalyticsMetric.enrollments)),
+    Case("get_metric_series_hour",
+         lambda db, fx: crud.get_metric_series(
+             db, models.AnalyticsMetric.enrollments, _now() - timedelta(hours=48), _now(), "hour")),
+    Case("get_metric_series_month",
+         lambda db, fx: crud.get_metric_series(
+             db, models.AnalyticsMetric.enrollments, (_now() - timedelta(days=365)).date(), _now().date(),
+             "month")),
+]
+
+
+# ─────────────────────────────────────────────
+# FIXTURES
+# ─────────────────────────────────────────────
+def load_fixtures(conn) -> SimpleNamespace:
+    """
+    Representative arguments: the most active learner and the most enrolled
+    built course, so the plans are the expensive ones.
+    """
+    def scalar(sql, **params):
+        return conn.execute(text(sql), params).scalar()
+
+    user_id = scalar(
+        "SELECT user_id FROM course_interactions GROUP BY user_id ORDER BY count(*) DESC LIMIT 1"
+    )
+    course_id = scalar(
+        "SELECT ci.course_id FROM course_interactions ci JOIN courses c ON c.id = ci.course_id "
+        "WHERE c.is_detail_created_by_ai GROUP BY ci.course_id ORDER BY count(*) DESC LIMIT 1"
+    )
+    if user_id is None or course_id is None:
+        raise SystemExit("No enrollments found: seed the database first (python -m benchmarks.seed).")
+
+    section_index = scalar(
+        "SELECT min(section_index) FROM section_quizzes WHERE course_id = :course_id", course_id=course_id
+    )
+    return SimpleNamespace(
+        user_id=user_id,
+        email=scalar("SELECT email FROM users WHERE id = :user_id", user_id=user_id),
+        course_id=course_id,
+        topic_id=scalar("SELECT topic_id FROM courses WHERE id = :course_id", course_id=course_id),
+        section_index=section_index if section_index is not None else 0,
+        course_ids=list(conn.execute(text(
+            "SELECT id FROM courses WHERE is_detail_created_by_ai ORDER BY id LIMIT 20"
+        )).scalars()),
+        new_course_id=scalar(
+            "SELECT id FROM courses c WHERE is_detail_created_by_ai AND NOT EXISTS ("
+            "SELECT 1 FROM course_interactions ci WHERE ci.user_id = :user_id AND ci.course_id = c.id"
+            ") ORDER BY id LIMIT 1",
+            user_id=user_id,
+        ) or course_id,
+        new_topic_id=scalar(
+            "SELECT id FROM topics t WHERE NOT EXISTS ("
+            "SELECT 1 FROM user_topic_preference p WHERE p.user_id = :user_id AND p.topic_id = t.id"
+            ") ORDER BY id LIMIT 1",
+            user_id=user_id,
+        ) or scalar("SELECT topic_id FROM courses WHERE id = :course_id", course_id=course_id),
+        search_query=scalar("SELECT split_part(course_title, ' ', 1) FROM courses WHERE id = :course_id",
+                            course_id=course_id) or "data",
+    )
+
+
+def table_sizes(conn) -> dict:
+    return dict(conn.execute(text(
+        "SELECT relname, reltuples::bigint FROM pg_class "
+        "WHERE relkind IN ('r', 'p') AND relnamespace = 'public'::regnamespace"
+    )).all())
+
+
+# ─────────────────────────────────────────────
+# CAPTURE AND EXPLAIN
+# ─────────────────────────────────────────────
+def capture(engine, conn, case: Case, fixtures) -> list:
+    """
+    Run one case in a rolled-back transaction; returns the EXPLAIN output of
+    each statement it issued.
+    """
+    statements = []
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    outer = conn.begin()
+    try:
+        db = Session(bind=conn, join_transaction_mode="create_savepoint")
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            case.run(db, fixtures)
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+            db.close()
+
+        plans = []
+        for statement, parameters in statements:
+            if statement.lstrip().split(None, 1)[0].upper() in ("SAVEPOINT", "RELEASE", "ROLLBACK"):
+                continue
+            savepoint = conn.begin_nested()
+            cursor = conn.connection.cursor()
+            try:
+                cursor.execute(EXPLAIN + statement, parameters)
+                plans.append(cursor.fetchone()[0][0])
+            finally:
+                cursor.close()
+                savepoint.rollback()
+        return plans
+    finally:
+        outer.rollback()
+
+
+def nodes(plan: dict, depth: int = 0):
+    yield depth, plan
+    for child in plan.get("Plans", ()):
+        yield from nodes(child, depth + 1)
+
+
+def shape(plan: dict) -> list:
+    lines = []
+    for depth, node in nodes(plan["Plan"]):
+        line = node["Node Type"]
+        if node.get("Join Type") and node["Join Type"] != "Inner":
+            line += f" ({node['Join Type']})"
+        if node.get("Relation Name"):
+            line += f" on {node['Relation Name']}"
+        if node.get("Index Name"):
+            line += f" using {node['Index Name']}"
+        lines.append("  " * depth + line)
+    return lines
+
+
+def problems(case: Case, plans: list, sizes: dict, args) -> list:
+    if not plans:
+        # The case returned before querying (an early exit or a cache hit)
+        return ["no statements captured"]
+    found = []
+    for number, plan in enumerate(plans, 1):
+        for _, node in nodes(plan["Plan"]):
+            relation = node.get("Relation Name")
+            if node["Node Type"] == "Seq Scan" and relation not in case.allow_seq_scan:
+                rows = sizes.get(relation, 0)
+                if rows >= args.large_table_rows:
+                    found.append(f"statement {number}: Seq Scan on {relation} (~{rows:,} rows)")
+
+            if node.get("Actual Loops"):
+                estimated, actual = node["Plan Rows"], node["Actual Rows"]
+                if actual >= args.row_floor and actual > max(estimated, 1) * args.row_factor:
+                    found.append(
+                            f"statement {number}: {node['Node Type']}"
+                            f"{' on ' + relation if relation else ''} estimated {estimated:,} rows, got {actual:,}"
+                        )
+
+    limit = case.max_ms or args.max_ms
+    elapsed = sum(plan["Execution Time"] for plan in plans)
+    if elapsed > limit:
+        found.append(f"{elapsed:.1f} ms > {limit:g} ms")
+    return found
+
+
+# ─────────────────────────────────────────────
+# ENTRY POINT
+# ─────────────────────────────────────────────
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("check", "update"))
+    parser.add_argument("--database-url", help="Defaults to the application's database.")
+    parser.add_argument("--baselines", default=DEFAULT_BASELINES, help="Committed plan shapes per case.")
+    parser.add_argument("--only", action="append", help="Run only this case (repeatable).")
+    parser.add_argument("--large-table-rows", type=int, default=10000,
+                        help="Tables with at least this many rows must not be sequentially scanned.")
+    parser.add_argument("--row-factor", type=float, default=100,
+                        help="Largest tolerated ratio of actual to estimated rows.")
+    parser.add_argument("--row-floor", type=int, default=1000,
+                        help="Ignore misestimates of fewer actual rows than this.")
+    parser.add_argument("--max-ms", type=float, default=250, help="Default execution time limit per case.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every plan shape.")
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from app.db.database import engine
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+    elif args.command == "check":
+        raise SystemExit(f"No plan baselines at {args.baselines}: run update against a seeded database and commit it.")
+
+    cases = [case for case in CASES if not args.only or case.name in args.only]
+    failures = []
+    shapes = {}
+    with engine.connect() as conn:
+        fixtures = load_fixtures(conn)
+        sizes = table_sizes(conn)
+        conn.rollback()
+        print(f"{len(cases)} cases, user {fixtures.user_id}, course {fixtures.course_id}:")
+
+        for case in cases:
+            started = time.perf_counter()
+            plans = capture(engine, conn, case, fixtures)
+            shapes[case.name] = [shape(plan) for plan in plans]
+            found = problems(case, plans, sizes, args)
+
+            expected = baselines.get(case.name)
+            if args.command == "check" and expected is not None and expected != shapes[case.name]:
+                diff = difflib.unified_diff(
+                    [line for statement in expected for line in statement + ["--"]],
+                    [line for statement in shapes[case.name] for line in statement + ["--"]],
+                    "baseline", "current", lineterm="",
+                )
+                found.append("plan changed:\n      " + "\n      ".join(diff))
+
+            execution = sum(plan["Execution Time"] for plan in plans)
+            status = "FAIL" if found else "ok"
+            print(f"  {status:4} {case.name:40} {len(plans):2d} stmts {execution:9.2f} ms"
+                  f"  ({(time.perf_counter() - started) * 1000:.0f} ms total)")
+            if args.verbose:
+                for statement in shapes[case.name]:
+                    print("         " + "\n         ".join(statement))
+            for problem in found:
+                print(f"         {problem}")
+            failures.extend(f"{case.name}: {problem.splitlines()[0]}" for problem in found)
+
+    if args.command == "update":
+        baselines.update(shapes)
+        with open(args.baselines, "w") as f:
+            json.dump(dict(sorted(baselines.items())), f, indent=2)
+            f.write("\n")
+        print(f"\nWrote {len(shapes)} plan baselines to {args.baselines}")
+        return
+
+    missing = [case.name for case in cases if case.name not in baselines]
+    failures.extend(f"{name}: no baseline (run update)" for name in missing)
+    if failures:
+        print("\nFAIL:\n  " + "\n  ".join(failures))
+        raise SystemExit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
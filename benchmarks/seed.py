@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+seed.py
+───────
+Generate a synthetic, production-shaped dataset in Postgres and Mongo, at a
+named scale, for load tests and query-plan checks.
+
+Run inside the web container against a scratch database:
+
+    docker-compose run --rm web python -m benchmarks.seed --scale medium --reset
+    docker-compose run --rm web python -m benchmarks.seed --scale xlarge --reset --skip-derived
+
+Every learner can log in as ``load<N>@loadtest.example.com`` and the admin as
+``admin@loadtest.example.com``, all with ``PASSWORD``. Data is generated from
+``--seed``, so the same scale, seed and distributions give the same database.
+
+Distributions:
+  * course and topic popularity is Zipfian (``--zipf-s``): a few courses hold
+    most enrollments, as in production;
+  * enrollments per learner are geometric with mean ``--enrollments``
+    (most learners take a few courses, a long tail takes many);
+  * progress follows Beta(``--progress-alpha``, ``--progress-beta``) in steps
+    of 5; values below 1 give the U shape of real courses (many never start,
+    many finish);
+  * passed section quizzes follow progress, recorded for ``--quiz-sample`` of
+    the enrollments.
+
+Rows are streamed with COPY in chunks; for the large tables, secondary
+indexes and foreign key / unique constraints are dropped during the load and
+recreated afterwards, which is much faster than maintaining them row by row.
+Mongo documents are written with ``insert_many``, in the layout set by
+``COURSE_STORAGE_LAYOUT``. After loading, the tasks that derive search
+documents, recommendation pools, collaborative filtering, dashboard rollups
+and the semantic index run once (``--skip-derived`` to skip).
+"""
+
+import argparse
+import csv
+import io
+import json
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import select, text
+
+from app.db import models
+from app.db.database import engine
+from app.db.mongo_db import get_mongo_db
+from app.services import ai_stub, course_blob, course_store, markdown_render
+from app.services.password_helper import get_password_hash
+
+PASSWORD = "loadtest-password"
+# Reserved for documentation (RFC 2606) yet accepted by EmailStr, unlike .local/.test
+EMAIL_DOMAIN = "loadtest.example.com"
+ADMIN_EMAIL = f"admin@{EMAIL_DOMAIN}"
+
+SCALES = {
+    "small": {"users": 200, "topics": 10, "courses_per_topic": 5, "enrollments": 3, "sections": 4, "quiz_sample": 1.0},
+    "medium": {"users": 5_000, "topics": 50, "courses_per_topic": 10, "enrollments": 5, "sections": 6, "quiz_sample": 1.0},
+    "large": {"users": 100_000, "topics": 200, "courses_per_topic": 10, "enrollments": 10, "sections": 6, "quiz_sample": 0.5},
+    "xlarge": {"users": 1_000_000, "topics": 500, "courses_per_topic": 20, "enrollments": 50, "sections": 6, "quiz_sample": 0.1},
+}
+SUBSECTIONS = 3
+QUIZ_QUESTIONS = 5
+LEVELS = ("Beginner", "Intermediate", "Advanced")
+CREATED_OVER_HOURS = 90 * 24
+
+# Learners per COPY chunk of enrollments (chunk rows ~ learners * mean enrollments)
+USERS_PER_CHUNK = 20_000
+MONGO_BATCH = 500
+# Distinct subsection texts / quizzes; courses draw from these pools
+CONTENT_POOL = 256
+
+SEEDED_TABLES = (
+    "course_section_quiz_progress",
+    "course_interactions",
+    "section_quizzes",
+    "course_search_documents",
+    "user_topic_preference",
+    "courses",
+    "topics",
+    "password_reset_codes",
+    "analytics_daily",
+    "analytics_hourly",
+    "users",
+)
+MONGO_COLLECTIONS = (
+    course_store.DOCUMENT_COLLECTION,
+    course_store.HEADER_COLLECTION,
+    course_store.SECTION_COLLECTION,
+    course_blob.BLOB_COLLECTION,
+)
+
+
+def learner_email(index: int) -> str:
+    return f"load{index}@{EMAIL_DOMAIN}"
+
+
+# ─────────────────────────────────────────────
+# LOADING
+# ─────────────────────────────────────────────
+def _copy(conn, table: str, columns: tuple, chunks) -> int:
+    """
+    COPY each ``(csv_text, row_count)`` chunk into ``table``; returns the rows loaded.
+    """
+    cursor = conn.connection.cursor()
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    rows = 0
+    for chunk, count in chunks:
+        cursor.copy_expert(sql, io.StringIO(chunk))
+        rows += count
+    return rows
+
+
+def _csv(rows: list) -> tuple:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue(), len(rows)
+
+
+@contextmanager
+def deferred_constraints(conn, table: str):
+    """
+    Drop ``table``'s secondary indexes and its foreign key / unique
+    constraints for a bulk load, then recreate them (validated in one pass).
+    """
+    constraints = conn.execute(text(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = CAST(:table AS regclass) AND contype IN ('f', 'u')"
+    ), {"table": table}).all()
+    indexes = conn.execute(text(
+        "SELECT i.indexname, i.indexdef FROM pg_indexes i "
+        "WHERE i.tablename = :table AND NOT EXISTS ("
+        "  SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)"
+    ), {"table": table}).all()
+
+    for name, _ in constraints:
+        conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"'))
+    for name, _ in indexes:
+        conn.execute(text(f'DROP INDEX "{name}"'))
+    yield
+    for _, definition in indexes:
+        conn.execute(text(definition))
+    for name, definition in constraints:
+        conn.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}'))
+
+
+def reset(conn, mongo_db) -> None:
+    conn.execute(text(f"TRUNCATE {', '.join(SEEDED_TABLES)} RESTART IDENTITY CASCADE"))
+    for collection in MONGO_COLLECTIONS:
+        mongo_db[collection].delete_many({})
+
+
+# ─────────────────────────────────────────────
+# DISTRIBUTIONS
+# ─────────────────────────────────────────────
+def zipf_weights(rng: np.random.Generator, count: int, s: float) -> np.ndarray:
+    """
+    Zipf(s) probabilities over ``count`` items, ranks shuffled so popularity
+    does not follow id order.
+    """
+    weights = 1.0 / np.arange(1, count + 1) ** s
+    return rng.permutation(weights / weights.sum())
+
+
+def draw_pairs(rng: np.random.Generator, users: int, item_p: np.ndarray, mean: float) -> tuple:
+    """
+    ``(user_index, item_index)`` pairs, unique per user: a geometric number of
+    draws from ``item_p`` per user, duplicates dropped.
+    """
+    counts = np.minimum(rng.geometric(1.0 / (mean + 1), size=users) - 1, len(item_p))
+    user_index = np.repeat(np.arange(users), counts)
+    item_index = rng.choice(len(item_p), size=len(user_index), p=item_p)
+    pairs = np.unique(user_index.astype(np.int64) * len(item_p) + item_index)
+    return pairs // len(item_p), pairs % len(item_p)
+
+
+def progress_for(rng: np.random.Generator, count: int, alpha: float, beta: float) -> np.ndarray:
+    return (np.round(rng.beta(alpha, beta, size=count) * 20) * 5).astype(np.int64)
+
+
+def _timestamps(now: datetime) -> list:
+    # One ISO string per hour of history; rows pick an index instead of formatting dates
+    return [(now - timedelta(hours=hour)).isoformat() for hour in range(CREATED_OVER_HOURS)]
+
+
+# ─────────────────────────────────────────────
+# TABLES
+# ─────────────────────────────────────────────
+def seed_users(conn, rng: np.random.Generator, count: int, stamps: list) -> tuple:
+    hashed = get_password_hash(PASSWORD)
+    columns = ("first_name", "last_name", "email", "hashed_password", "role", "is_active", "is_verified", "created_at")
+
+    def chunks():
+        yield _csv([("Load", "Admin", ADMIN_EMAIL, hashed, "admin", True, True, stamps[-1])])
+        for start in range(0, count, 100_000):
+            hours = rng.integers(0, len(stamps), size=min(100_000, count - start)).tolist()
+            yield _csv([
+                ("Load", f"User{index}", learner_email(index), hashed, "user", True, True, stamps[hour])
+                for index, hour in zip(range(start, start + len(hours)), hours)
+            ])
+
+    _copy(conn, "users", columns, chunks())
+    admin_id = conn.execute(select(models.User.id).where(models.User.email == ADMIN_EMAIL)).scalar_one()
+    ids = conn.execute(
+        select(models.User.id).where(models.User.id != admin_id).order_by(models.User.id)
+    ).scalars().all()
+    return admin_id, np.array(ids, dtype=np.int64)
+
+
+def seed_catalog(conn, mongo_db, rng: random.Random, admin_id: int, scale: dict) -> tuple:
+    """
+    Topics, built courses with their Mongo documents and blobs, and quizzes.
+    Returns ``(course_ids, topic_ids)`` as arrays, in course id order.
+    """
+    _copy(conn, "topics", ("title", "description", "created_by_id", "is_published"), [_csv([
+        (f"Topic {index}: {' '.join(rng.sample(ai_stub.WORDS, 2))}",
+         f"Synthetic topic {index} for load testing.", admin_id, True)
+        for index in range(scale["topics"])
+    ])])
+    topic_ids = conn.execute(select(models.Topic.id).order_by(models.Topic.id)).scalars().all()
+
+    _copy(conn, "courses", (
+        "course_title", "course_description", "course_level", "is_published", "is_detail_created_by_ai", "topic_id",
+    ), [_csv([
+        (f"Course {topic_id}.{index}: {' '.join(rng.sample(ai_stub.WORDS, 3))}",
+         f"Synthetic course {index} of topic {topic_id}.", LEVELS[index % len(LEVELS)], True, True, topic_id)
+        for topic_id in topic_ids for index in range(scale["courses_per_topic"])
+    ])])
+    courses = conn.execute(
+        select(models.Course.id, models.Course.topic_id, models.Course.course_title, models.Course.course_level)
+        .order_by(models.Course.id)
+    ).all()
+
+    contents = [ai_stub.section_content(seed) for seed in range(CONTENT_POOL)]
+    rendered = {text: markdown_render.render(text) for text in contents}
+    quiz_pool = [ai_stub.quiz_items(seed)[:QUIZ_QUESTIONS] for seed in range(CONTENT_POOL)]
+
+    def quiz_chunks():
+        for start in range(0, len(courses), MONGO_BATCH):
+            documents, blobs, quizzes = [], [], []
+            for course_id, _, title, level in courses[start:start + MONGO_BATCH]:
+                details = ai_stub.course_details(
+                    title, level, seed=course_id, sections=scale["sections"],
+                    subsections=SUBSECTIONS, contents=contents,
+                )
+                documents.append((course_id, markdown_render.render_course(details, rendered)))
+                blobs.append(course_blob.render_course_blob(course_id, details))
+                quizzes += [
+                    (course_id, section_index, json.dumps(item))
+                    for section_index in range(scale["sections"])
+                    for item in rng.choice(quiz_pool)
+                ]
+            course_store.insert_courses(mongo_db, documents)
+            mongo_db[course_blob.BLOB_COLLECTION].insert_many(blobs, ordered=False)
+            yield _csv(quizzes)
+
+    _copy(conn, "section_quizzes", ("course_id", "section_index", "data"), quiz_chunks())
+    return (
+        np.array([course[0] for course in courses], dtype=np.int64),
+        np.array([course[1] for course in courses], dtype=np.int64),
+    )
+
+
+def seed_preferences(conn, rng: np.random.Generator, user_ids: np.ndarray, topic_ids: np.ndarray, zipf_s: float) -> int:
+    topic_p = zipf_weights(rng, len(topic_ids), zipf_s)
+
+    def chunks():
+        for start in range(0, len(user_ids), USERS_PER_CHUNK):
+            chunk = user_ids[start:start + USERS_PER_CHUNK]
+            users, topics = draw_pairs(rng, len(chunk), topic_p, mean=3)
+            yield "".join(
+                f"{user},{topic}\n" for user, topic in zip(chunk[users].tolist(), topic_ids[topics].tolist())
+            ), len(users)
+
+    with deferred_constraints(conn, "user_topic_preference"):
+        return _copy(conn, "user_topic_preference", ("user_id", "topic_id"), chunks())
+
+
+def seed_activity(conn, rng: np.random.Generator, user_ids: np.ndarray, course_ids: np.ndarray,
+                  scale: dict, args, stamps: list) -> tuple:
+    """
+    Enrollments with progress, and the section quizzes passed so far.
+    Returns ``(enrollments, passed_quizzes)``.
+    """
+    course_p = zipf_weights(rng, len(course_ids), args.zipf_s)
+    sections = scale["sections"]
+    enrollments = passed = 0
+
+    with deferred_constraints(conn, "course_interactions"), \
+            deferred_constraints(conn, "course_section_quiz_progress"):
+        cursor = conn.connection.cursor()
+        for start in range(0, len(user_ids), USERS_PER_CHUNK):
+            chunk = user_ids[start:start + USERS_PER_CHUNK]
+            users, courses = draw_pairs(rng, len(chunk), course_p, args.enrollments)
+            user_col, course_col = chunk[users], course_ids[courses]
+            progress = progress_for(rng, len(users), args.progress_alpha, args.progress_beta)
+            hours = rng.integers(0, len(stamps), size=len(users))
+
+            cursor.copy_expert(
+                "COPY course_interactions (user_id, course_id, course_progress, created_at) "
+                "FROM STDIN WITH (FORMAT csv)",
+                io.StringIO("".join(
+                    f"{user},{course},{pct},{stamps[hour]}\n"
+                    for user, course, pct, hour in zip(
+                        user_col.tolist(), course_col.tolist(), progress.tolist(), hours.tolist()
+                    )
+                )),
+            )
+            enrollments += len(users)
+
+            # Sections passed = share of progress, for a sample of enrollments
+            sampled = rng.random(len(users)) < args.quiz_sample
+            done = progress[sampled] * sections // 100
+            quiz_users = np.repeat(user_col[sampled], done)
+            quiz_courses = np.repeat(course_col[sampled], done)
+            section_index = np.arange(len(quiz_users)) - np.repeat(np.cumsum(done) - done, done)
+            # Hours ago: passed no earlier than the enrollment
+            passed_hours = rng.integers(0, np.repeat(hours[sampled], done) + 1)
+
+            cursor.copy_expert(
+                "COPY course_section_quiz_progress (user_id, course_id, section_index, passed, passed_at) "
+                "FROM STDIN WITH (FORMAT csv)",
+                io.StringIO("".join(
+                    f"{user},{course},{index},t,{stamps[hour]}\n"
+                    for user, course, index, hour in zip(
+                        quiz_users.tolist(), quiz_courses.tolist(), section_index.tolist(), passed_hours.tolist()
+                    )
+                )),
+            )
+            passed += len(quiz_users)
+            print(f"  enrollments: {enrollments:,} rows, quiz progress: {passed:,} rows", end="\r", flush=True)
+        print()
+    return enrollments, passed
+
+
+def derive() -> None:
+    # Imported here: the task module pulls in the whole worker stack
+    from app.celery import tasks
+
+    for task in (
+        tasks.reindex_course_search,
+        tasks.backfill_analytics,
+        tasks.rebuild_recommendation_pools,
+        tasks.build_collaborative_recommendations,
+        tasks.reconcile_dashboard_rollups,
+        tasks.build_semantic_index,
+    ):
+        started = time.perf_counter()
+        task()
+        print(f"  {task.name.rsplit('.', 1)[-1]}: {time.perf_counter() - started:.1f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; same seed, same data.")
+    parser.add_argument("--reset", action="store_true", help="Truncate application tables and Mongo courses first.")
+    parser.add_argument("--skip-derived", action="store_true", help="Do not run the derivation tasks.")
+    overrides = parser.add_argument_group("scale overrides")
+    for key in ("users", "topics", "courses_per_topic", "sections"):
+        overrides.add_argument(f"--{key.replace('_', '-')}", type=int, dest=key)
+    distributions = parser.add_argument_group("distributions")
+    distributions.add_argument("--enrollments", type=float, help="Mean enrollments per learner.")
+    distributions.add_argument("--quiz-sample", type=float, help="Share of enrollments with quiz progress rows.")
+    distributions.add_argument("--zipf-s", type=float, default=1.1, help="Course and topic popularity exponent.")
+    distributions.add_argument("--progress-alpha", type=float, default=0.6)
+    distributions.add_argument("--progress-beta", type=float, default=0.8)
+    args = parser.parse_args()
+
+    scale = dict(SCALES[args.scale])
+    for key in scale:
+        if getattr(args, key, None) is not None:
+            scale[key] = getattr(args, key)
+    args.enrollments, args.quiz_sample = scale["enrollments"], scale["quiz_sample"]
+
+    rng = np.random.default_rng(args.seed)
+    text_rng = random.Random(args.seed)
+    stamps = _timestamps(datetime.now(timezone.utc))
+    mongo_db = get_mongo_db()
+    models.Base.metadata.create_all(bind=engine)
+
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text("SET LOCAL synchronous_commit = off"))
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        if args.reset:
+            reset(conn, mongo_db)
+        elif conn.execute(select(models.User.id).where(models.User.email == ADMIN_EMAIL)).first():
+            raise SystemExit("Load-test data already present; pass --reset to replace it.")
+
+        admin_id, user_ids = seed_users(conn, rng, scale["users"], stamps)
+        print(f"users: {len(user_ids):,} learners + admin ({time.perf_counter() - started:.0f}s)")
+        course_ids, course_topics = seed_catalog(conn, mongo_db, text_rng, admin_id, scale)
+        print(f"catalog: {scale['topics']:,} topics, {len(course_ids):,} courses ({time.perf_counter() - started:.0f}s)")
+        preferences = seed_preferences(conn, rng, user_ids, np.unique(course_topics), args.zipf_s)
+        print(f"topic preferences: {preferences:,} ({time.perf_counter() - started:.0f}s)")
+        enrollments, passed = seed_activity(conn, rng, user_ids, course_ids, scale, args, stamps)
+        print(f"activity: {enrollments:,} enrollments, {passed:,} passed quizzes ({time.perf_counter() - started:.0f}s)")
+
+    with engine.begin() as conn:
+        conn.execute(text("SET LOCAL statement_timeout = 0"))
+        for table in SEEDED_TABLES:
+            conn.execute(text(f"ANALYZE {table}"))
+    print(f"Loaded {args.scale} scale in {time.perf_counter() - started:.1f}s")
+
+    if not args.skip_derived:
+        print("Deriving caches and indexes:")
+        derive()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+sql_budget.py
+─────────────
+Check per-endpoint SQL query budgets against reports from the SQL profiler.
+
+Run the API with ``SQL_PROFILE=true``, drive it (a test suite or
+``loadtest``), stop it so every worker writes its
+``sql_profile/sql_profile.<pid>.json``, then:
+
+    python -m benchmarks.sql_budget check               # fail on regressions
+    python -m benchmarks.sql_budget update              # accept current counts
+
+``check`` fails when an endpoint's worst request issued more statements than
+its budget, or (with ``--fail-on-n-plus-one``) when a statement shape repeats
+within one request. ``update`` writes the observed maxima to the budget file
+so that the change can be reviewed in the diff.
+
+The committed ``benchmarks/sql_budgets.json`` comes from ``loadtest`` (learner
+and admin flows) against ``benchmarks.seed --scale medium``; ``check`` exits
+non-zero without it.
+"""
+
+import argparse
+import glob
+import json
+import os
+
+DEFAULT_REPORT_DIR = "sql_profile"
+DEFAULT_BUDGETS = os.path.join(os.path.dirname(__file__), "sql_budgets.json")
+
+
+def merge_reports(directory: str) -> dict:
+    merged = {}
+    for path in sorted(glob.glob(os.path.join(directory, "sql_profile.*.json"))):
+        with open(path) as f:
+            for endpoint, entry in json.load(f).items():
+                current = merged.setdefault(endpoint, {
+                    "requests": 0, "total_queries": 0, "max_queries": 0, "n_plus_one": {},
+                })
+                current["requests"] += entry["requests"]
+                current["total_queries"] += entry["total_queries"]
+                current["max_queries"] = max(current["max_queries"], entry["max_queries"])
+                for key, repeat in entry["n_plus_one"].items():
+                    known = current["n_plus_one"].get(key)
+                    if known is None or repeat["max_per_request"] > known["max_per_request"]:
+                        current["n_plus_one"][key] = repeat
+    return merged
+
+
+def check(report: dict, budgets: dict, fail_on_n_plus_one: bool, require_budget: bool) -> list:
+    failures = []
+    for endpoint, entry in sorted(report.items()):
+        budget = budgets.get(endpoint)
+        mean = entry["total_queries"] / entry["requests"]
+        marker = ""
+        if budget is None:
+            marker = "  (no budget)"
+            if require_budget:
+                failures.append(f"{endpoint}: no budget")
+        elif entry["max_queries"] > budget:
+            marker = f"  OVER by {entry['max_queries'] - budget}"
+            failures.append(f"{endpoint}: {entry['max_queries']} statements > budget {budget}")
+        budget_text = "-" if budget is None else budget
+        print(f"  {entry['max_queries']:4d} max {mean:7.1f} mean  budget {budget_text:>4}  {endpoint}{marker}")
+
+        for repeat in entry["n_plus_one"].values():
+            print(f"        N+1? {repeat['max_per_request']}x  {repeat['sql'][:150]}")
+            if fail_on_n_plus_one:
+                failures.append(f"{endpoint}: {repeat['max_per_request']}x repeated statement")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("check", "update"))
+    parser.add_argument("--reports", default=DEFAULT_REPORT_DIR, help="Directory of sql_profile.*.json files.")
+    parser.add_argument("--budgets", default=DEFAULT_BUDGETS, help="Budget file (endpoint -> max statements).")
+    parser.add_argument("--fail-on-n-plus-one", action="store_true", help="Fail on repeated statement shapes.")
+    parser.add_argument("--require-budget", action="store_true", help="Fail on endpoints without a budget.")
+    args = parser.parse_args()
+
+    report = merge_reports(args.reports)
+    if not report:
+        raise SystemExit(f"No profiler reports found in {args.reports}/ (was SQL_PROFILE=true?)")
+
+    budgets = {}
+    if os.path.exists(args.budgets):
+        with open(args.budgets) as f:
+            budgets = json.load(f)
+    elif args.command == "check":
+        raise SystemExit(f"No budgets at {args.budgets}: run update after a load test and commit it.")
+
+    if args.command == "update":
+        budgets.update({endpoint: entry["max_queries"] for endpoint, entry in report.items()})
+        with open(args.budgets, "w") as f:
+            json.dump(dict(sorted(budgets.items())), f, indent=2)
+            f.write("\n")
+        print(f"Wrote {len(budgets)} budgets to {args.budgets}")
+        return
+
+    print(f"SQL statements per request ({len(report)} endpoints):")
+    failures = check(report, budgets, args.fail_on_n_plus_one, args.require_budget)
+    if failures:
+        print("\nFAIL:\n  " + "\n  ".join(failures))
+        raise SystemExit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
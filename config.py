@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 from pydantic import Extra
 
 
@@ -42,10 +43,117 @@ class CeleryCredentials(BaseSettings):
         extra = Extra.ignore 
 
 
+class RedisCredentials(BaseSettings):
+    REDIS_URL: str = "redis://redis:6379/1"
+    class Config:
+        env_file = ".env"
+        extra = Extra.ignore 
+
+
+class ProgressBufferSettings(BaseSettings):
+    # Buffer course progress pings in Redis and flush them to Postgres in batches
+    PROGRESS_WRITE_BEHIND: bool = False
+    PROGRESS_FLUSH_INTERVAL_SECONDS: int = 10
+    class Config:
+        env_file = ".env"
+        extra = Extra.ignore 
+
+
+class MetricsSettings(BaseSettings):
+    # Each Celery worker container serves its processes' metrics on this port
+    CELERY_METRICS_PORT: int = 9808
+    # The API serves its metrics here, never on the public API port
+    API_METRICS_PORT: int = 9807
+    class Config:
+        env_file = ".env"
+        extra = Extra.ignore 
+
+
+class SqlProfilerSettings(BaseSettings):
+    # Development / CI only: fingerprint every request's SQL and flag N+1 patterns
+    SQL_PROFILE: bool = False
+    SQL_PROFILE_DIR: str = "sql_profile"
+    SQL_PROFILE_REPEAT_THRESHOLD: int = 3
+    # When set, requests over their endpoint's budget raise QueryBudgetExceeded
+    SQL_PROFILE_BUDGETS: str = ""
+    class Config:
+        env_file = ".env"
+        extra = Extra.ignore 
+
+
+class BackendSettings(BaseSettings):
+    # "stub" swaps OpenAI / Gmail for local stand-ins (load tests, offline development)
+    AI_BACKEND: str = "openai"
+    EMAIL_BACKEND: str = "gmail"
+    # Delay added to every stubbed call, to imitate the real service
+    STUB_LATENCY_MS: int = 0
+    class Config:
+        env_file = ".env"
+        extra = Extra.ignore 
+
+
+class CourseStorageSettings(BaseSettings):
+    # "document": one Mongo document per course; "sectioned": a header plus one document per section
+    COURSE_STORAGE_LAYOUT: str = "document"
+    class Config:
+        env_file = ".env"
+        extra = Extra.ignore 
+
+
+class ContentCompressionSettings(BaseSettings):
+    # Codec for generated subsection markdown in Mongo: "none", "zlib" or "zstd"
+    CONTENT_COMPRESSION: str = "none"
+    # Unset: zlib 9 / zstd 19 (written once, read on every view)
+    CONTENT_COMPRESSION_LEVEL: Optional[int] = None
+    # zstd dictionary from `python -m benchmarks.content_compression train`; 0 for none
+    CONTENT_DICTIONARY_ID: int = 0
+    class Config:
+        env_file = ".env"
+        extra = Extra.ignore 
+
+
 class OpenAICredentails(BaseSettings):
     OPEN_AI_API_KEY: str
 
 
+class DatabasePoolSettings(BaseSettings):
+    # Per process: size pools so (uvicorn workers + celery processes) * (size + overflow) < max_connections
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_CONNECT_TIMEOUT: int = 10
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+    # Behind PgBouncer (transaction pooling): no client-side pool, no startup options
+    DB_PGBOUNCER: bool = False
+    class Config:
+        env_file = ".env"
+        extra = Extra.ignore 
+
+
+class MongoPoolSettings(BaseSettings):
+    MONGO_MAX_POOL_SIZE: int = 50
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: int = 5 * 60 * 1000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 10000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    MONGO_SOCKET_TIMEOUT_MS: int = 30000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    class Config:
+        env_file = ".env"
+        extra = Extra.ignore 
+
+
+class RedisClientSettings(BaseSettings):
+    # Seconds; no command here blocks server-side, so anything slower is a stuck connection
+    REDIS_CONNECT_TIMEOUT: float = 2
+    REDIS_SOCKET_TIMEOUT: float = 5
+    class Config:
+        env_file = ".env"
+        extra = Extra.ignore 
+
+
 class MongoCredentails(BaseSettings):
     MONGO_INITDB_ROOT_USERNAME: str
     MONGO_INITDB_ROOT_PASSWORD: str
@@ -74,6 +182,56 @@ def get_celery_cred():
     return CeleryCredentials()
 
 
+@lru_cache
+def get_redis_cred():
+    return RedisCredentials()
+
+
+@lru_cache
+def get_progress_buffer_settings():
+    return ProgressBufferSettings()
+
+
+@lru_cache
+def get_db_pool_settings():
+    return DatabasePoolSettings()
+
+
+@lru_cache
+def get_mongo_pool_settings():
+    return MongoPoolSettings()
+
+
+@lru_cache
+def get_redis_client_settings():
+    return RedisClientSettings()
+
+
+@lru_cache
+def get_metrics_settings():
+    return MetricsSettings()
+
+
+@lru_cache
+def get_sql_profiler_settings():
+    return SqlProfilerSettings()
+
+
+@lru_cache
+def get_backend_settings():
+    return BackendSettings()
+
+
+@lru_cache
+def get_course_storage_settings():
+    return CourseStorageSettings()
+
+
+@lru_cache
+def get_content_compression_settings():
+    return ContentCompressionSettings()
+
+
 @lru_cache
 def get_open_ai_cred():
     return OpenAICredentails()